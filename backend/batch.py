@@ -0,0 +1,239 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+from backend.constants import DTW, PARAMETER, PARAMETER_UNITS, PARAMETER_VALUE
+
+
+class RecordBatch:
+    """
+    Column oriented collection of records of one record class.
+
+    columns maps each of the record class's keys to a list of values. extras is an
+    optional list with a dict of non key values per row, kept only for record
+    classes with keep_extras. site is the site record the batch belongs to, if
+    any. Batches are built per site by the parameter sources, transformed as a
+    whole and written directly by the persisters. Indexing or iterating a batch
+    yields record objects for code that still works a record at a time
+    """
+
+    def __init__(self, record_klass, columns, extras=None, site=None):
+        self.record_klass = record_klass
+        self.keys = record_klass.keys
+        self.site = site
+
+        n = None
+        for k in self.keys:
+            col = columns.get(k)
+            if col is not None:
+                n = len(col)
+                break
+
+        n = n or 0
+        self.columns = {
+            k: list(columns[k]) if columns.get(k) is not None else [None] * n
+            for k in self.keys
+        }
+        self._n = n
+        self.extras = extras if record_klass.keep_extras else None
+
+    @classmethod
+    def from_dicts(cls, record_klass, dicts, site=None):
+        keys = record_klass.keys
+        columns = {k: [d.get(k) for d in dicts] for k in keys}
+        extras = None
+        if record_klass.keep_extras:
+            keyset = set(keys)
+            extras = [{k: v for k, v in d.items() if k not in keyset} for d in dicts]
+        return cls(record_klass, columns, extras=extras, site=site)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        payload = {k: col[i] for k, col in self.columns.items()}
+        if self.extras is not None and self.extras[i]:
+            payload.update(self.extras[i])
+        return self.record_klass(payload)
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        for i in range(self._n):
+            yield self[i]
+
+    def column(self, key):
+        return self.columns[key]
+
+    def values(self, key):
+        """
+        Values of key for each row, from its column or from the extras. Missing
+        values fall back to the record class's default
+        """
+        col = self.columns.get(key)
+        if col is None:
+            if self.extras is None:
+                col = [None] * self._n
+            else:
+                col = [e.get(key) for e in self.extras]
+
+        default = self.record_klass.defaults.get(key)
+        if default is not None:
+            col = [default if v is None else v for v in col]
+        return col
+
+    def set_column(self, key, values):
+        values = list(values)
+        if len(values) != self._n:
+            raise ValueError(
+                f"column {key} has {len(values)} values, expected {self._n}"
+            )
+        self.columns[key] = values
+
+    def set_values(self, key, values):
+        """
+        Set the values of key for each row, in its column or in the extras
+        """
+        if key in self.columns:
+            self.set_column(key, values)
+        elif self.extras is not None:
+            for e, v in zip(self.extras, values):
+                e[key] = v
+
+    def filter(self, mask):
+        """
+        Return a new batch with the rows where mask is truthy
+        """
+        mask = list(mask)
+        columns = {
+            k: [v for v, m in zip(col, mask) if m] for k, col in self.columns.items()
+        }
+        extras = None
+        if self.extras is not None:
+            extras = [e for e, m in zip(self.extras, mask) if m]
+        return RecordBatch(self.record_klass, columns, extras=extras, site=self.site)
+
+    def sort(self, key):
+        """
+        Return a new batch sorted, stably, by the values of column key
+        """
+        col = self.columns[key]
+        order = sorted(range(self._n), key=col.__getitem__)
+        return self.take(order)
+
+    def take(self, indices):
+        """
+        Return a new batch with the rows at indices, in that order
+        """
+        columns = {k: [c[i] for i in indices] for k, c in self.columns.items()}
+        extras = None
+        if self.extras is not None:
+            extras = [self.extras[i] for i in indices]
+        return RecordBatch(self.record_klass, columns, extras=extras, site=self.site)
+
+    def to_columns(self):
+        """
+        Return the output columns, in keys order, with defaults filled in and
+        rounding applied, the same as each record's to_row
+        """
+        out = []
+        for k, (default, ndigits) in zip(self.keys, self.record_klass._row_plan):
+            col = self.columns[k]
+            if default is not None:
+                col = [default if v is None else v for v in col]
+            if ndigits is not None:
+                col = [v if v is None else round(v, ndigits) for v in col]
+            out.append(col)
+        return out
+
+    def rows(self):
+        return zip(*self.to_columns()) if self._n else iter(())
+
+    def to_arrow(self):
+        return arrow_table(self.keys, self.to_columns())
+
+
+# arrow types of the output keys. anything else is written as a string
+ARROW_FLOAT_KEYS = (
+    "latitude",
+    "longitude",
+    "elevation",
+    "well_depth",
+    "min",
+    "max",
+    "mean",
+    "most_recent_value",
+    DTW,
+    PARAMETER_VALUE,
+)
+ARROW_INT_KEYS = ("nrecords",)
+ARROW_DATE_KEYS = ("date_measured", "most_recent_date")
+# low cardinality keys, written as dictionary encoded columns
+ARROW_DICTIONARY_KEYS = (
+    "source",
+    PARAMETER,
+    PARAMETER_UNITS,
+    "elevation_units",
+    "well_depth_units",
+    "most_recent_units",
+    "horizontal_datum",
+    "vertical_datum",
+)
+
+
+def arrow_table(keys, columns):
+    """
+    Build a pyarrow Table with a typed column per key. Values that can't be
+    converted to the key's type are written as null
+    """
+    import pyarrow as pa
+
+    arrays = [_arrow_array(pa, k, col) for k, col in zip(keys, columns)]
+    return pa.table(arrays, names=list(keys))
+
+
+def _arrow_array(pa, key, values):
+    if key in ARROW_FLOAT_KEYS:
+        return _typed_array(pa, values, pa.float64(), float)
+    elif key in ARROW_INT_KEYS:
+        return _typed_array(pa, values, pa.int64(), int)
+
+    arr = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    if key in ARROW_DATE_KEYS:
+        try:
+            return pa.array([v or None for v in arr.to_pylist()]).cast(pa.date32())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            # partial dates e.g. "2020-01" are kept as strings
+            return arr
+    elif key in ARROW_DICTIONARY_KEYS:
+        return arr.dictionary_encode()
+    return arr
+
+
+def _typed_array(pa, values, arrow_type, func):
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([_coerce(func, v) for v in values], type=arrow_type)
+
+
+def _coerce(func, v):
+    try:
+        return func(v)
+    except (TypeError, ValueError):
+        return None
+
+
+# ============= EOF =============================================
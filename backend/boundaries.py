@@ -0,0 +1,219 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import gzip
+import json
+import os
+import struct
+from datetime import datetime, timezone
+
+import click
+
+from backend import http_client
+
+# New Mexico and its neighbours
+BOUNDARY_STATES = ("NM", "AZ", "CO", "OK", "TX", "UT")
+
+BOUNDARY_STORE_PATH = os.path.join(os.path.dirname(__file__), "data", "boundaries.bin")
+
+GEOCONNEX_URL = "https://reference.geoconnex.us/collections"
+
+MAGIC = b"NMUWDBND"
+FORMAT_VERSION = 1
+
+
+class BoundaryStore:
+    """
+    County and state boundaries with a name index.
+
+    features is a list of dicts with kind ("state" or "county"), state (the
+    two letter abbreviation), statefp and name, and geometries the matching
+    shapely geometries, kept whole (MultiPolygons included).
+
+    Saved as a gzip compressed file: MAGIC, the length of a json header, the
+    header (version, metadata and features with the offset and length of each
+    geometry), then the geometries as WKB
+    """
+
+    def __init__(self, features, geometries, meta=None):
+        self.features = features
+        self.geometries = geometries
+        self.meta = meta or {}
+
+        self._counties = {}
+        self._states = {}
+        for i, f in enumerate(features):
+            if f["kind"] == "state":
+                self._states[f["state"].upper()] = i
+            else:
+                self._counties[(f["state"].upper(), f["name"].lower())] = i
+
+    @classmethod
+    def load(cls, path):
+        import shapely
+
+        with gzip.open(path, "rb") as rfile:
+            data = rfile.read()
+
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a boundary store")
+
+        pos = len(MAGIC)
+        (n,) = struct.unpack(">I", data[pos : pos + 4])
+        pos += 4
+        header = json.loads(data[pos : pos + n].decode("utf-8"))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"unsupported boundary store version {header['version']} in {path}"
+            )
+
+        pos += n
+        features = header.pop("features")
+        wkbs = [
+            data[pos + f["offset"] : pos + f["offset"] + f["length"]] for f in features
+        ]
+        geometries = list(shapely.from_wkb(wkbs))
+        for f in features:
+            del f["offset"], f["length"]
+
+        return cls(features, geometries, header)
+
+    def save(self, path):
+        import shapely
+
+        blobs = []
+        features = []
+        offset = 0
+        for f, g in zip(self.features, self.geometries):
+            wkb = shapely.to_wkb(g)
+            features.append(dict(f, offset=offset, length=len(wkb)))
+            blobs.append(wkb)
+            offset += len(wkb)
+
+        header = dict(self.meta, version=FORMAT_VERSION, features=features)
+        header = json.dumps(header).encode("utf-8")
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with gzip.open(path, "wb") as wfile:
+            wfile.write(MAGIC)
+            wfile.write(struct.pack(">I", len(header)))
+            wfile.write(header)
+            for b in blobs:
+                wfile.write(b)
+
+    def get_county(self, name, state="NM"):
+        i = self._counties.get((state.upper(), name.lower()))
+        if i is not None:
+            return self.geometries[i]
+
+    def get_state(self, state):
+        i = self._states.get(state.upper())
+        if i is not None:
+            return self.geometries[i]
+
+    def statefp(self, state):
+        i = self._states.get(state.upper())
+        if i is not None:
+            return self.features[i]["statefp"]
+
+    def county_names(self, state="NM"):
+        state = state.upper()
+        return sorted(
+            f["name"]
+            for f in self.features
+            if f["kind"] == "county" and f["state"].upper() == state
+        )
+
+
+_store = None
+_warned_missing = False
+
+
+def get_boundary_store():
+    """
+    Return the BoundaryStore at BOUNDARY_STORE_PATH, or None if it has not been
+    built with weave build-boundaries. A missing store is reported once, and
+    lookups then fall back to downloading boundaries from geoconnex
+    """
+    global _store, _warned_missing
+    if _store is None:
+        if not os.path.isfile(BOUNDARY_STORE_PATH):
+            if not _warned_missing:
+                _warned_missing = True
+                click.secho(
+                    f"No boundary store at {BOUNDARY_STORE_PATH}, downloading "
+                    f"boundaries from geoconnex instead. Build the store with "
+                    f"weave build-boundaries",
+                    fg="red",
+                )
+            return
+        _store = BoundaryStore.load(BOUNDARY_STORE_PATH)
+    return _store
+
+
+def build_boundary_store(path=BOUNDARY_STORE_PATH, states=BOUNDARY_STATES):
+    """
+    Download the state and county boundaries of states from geoconnex and save
+    them as a BoundaryStore at path
+    """
+    from shapely.geometry import shape
+
+    resp = http_client.get(
+        f"{GEOCONNEX_URL}/states/items", params={"f": "json", "limit": 100}
+    )
+    all_states = {f["properties"]["STUSPS"].upper(): f for f in resp.json()["features"]}
+
+    features = []
+    geometries = []
+    for state in states:
+        sf = all_states[state.upper()]
+        statefp = sf["properties"]["STATEFP"]
+        features.append(
+            {
+                "kind": "state",
+                "state": state,
+                "statefp": statefp,
+                "name": sf["properties"]["NAME"],
+            }
+        )
+        geometries.append(shape(sf["geometry"]))
+
+        resp = http_client.get(
+            f"{GEOCONNEX_URL}/counties/items",
+            params={"statefp": statefp, "f": "json", "limit": 1000},
+        )
+        for f in resp.json()["features"]:
+            props = f["properties"]
+            features.append(
+                {
+                    "kind": "county",
+                    "state": state,
+                    "statefp": statefp,
+                    "name": props.get("name") or props.get("NAME"),
+                }
+            )
+            geometries.append(shape(f["geometry"]))
+
+    meta = {
+        "source": GEOCONNEX_URL,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "states": list(states),
+    }
+    store = BoundaryStore(features, geometries, meta)
+    store.save(path)
+    return store
+
+
+# ============= EOF =============================================
@@ -15,26 +15,43 @@
 # ===============================================================================
 import json
 import os
+from functools import lru_cache
 
 import click
-import httpx
-from shapely import Polygon, box
+
+from backend import http_client
+from backend.boundaries import get_boundary_store
 
 
 def warning(msg):
     click.secho(msg, fg="red")
 
 
+@lru_cache(maxsize=None)
+def load_json(path):
+    """
+    Read and parse a cached json file once per process
+    """
+    with open(path, "r") as rfile:
+        return json.load(rfile)
+
+
 def cache_path(name):
     return os.path.join(os.path.expanduser("~"), f".sta.{name}.json")
 
 
 def statelookup(shortname):
+    store = get_boundary_store()
+    if store is not None:
+        statefp = store.statefp(shortname)
+        if statefp:
+            return statefp
+
     p = cache_path("states")
     if not os.path.isfile(p):
         click.secho(f"Caching states to {p}")
         url = f"https://reference.geoconnex.us/collections/states/items?f=json"
-        resp = httpx.get(url)
+        resp = http_client.get(url)
         with open(p, "w") as wfile:
             json.dump(resp.json(), wfile)
 
@@ -49,25 +66,34 @@ def statelookup(shortname):
 
 
 def get_state_polygon(state):
+    store = get_boundary_store()
+    if store is not None:
+        poly = store.get_state(state)
+        if poly is not None:
+            return poly
+
     statefp = statelookup(state)
     if statefp:
         p = cache_path(state)
         if not os.path.isfile(p):
             click.secho(f"Caching {state} counties to {p}")
             url = f"https://reference.geoconnex.us/collections/states/items/{statefp}?&f=json"
-            resp = httpx.get(url)
+            resp = http_client.get(url)
 
             obj = resp.json()
             with open(p, "w") as wfile:
                 json.dump(obj, wfile)
 
-        with open(p, "r") as rfile:
-            obj = json.load(rfile)
+        obj = load_json(p)
 
-        return Polygon(obj["geometry"]["coordinates"][0][0])
+        from shapely.geometry import shape
+
+        return shape(obj["geometry"])
 
 
 def get_state_bb(state):
+    from shapely import box
+
     p = get_state_polygon(state)
     return box(*p.bounds).wkt
 
@@ -81,19 +107,24 @@ def get_county_polygon(name, as_wkt=True):
         county = name
         statefp = 35
 
+    store = get_boundary_store()
+    if store is not None:
+        poly = store.get_county(county, state)
+        if poly is not None:
+            return poly.wkt if as_wkt else poly
+
     if statefp:
         p = cache_path(f"{state}.counties")
         if not os.path.isfile(p):
             click.secho(f"Caching {state} counties to {p}")
             url = f"https://reference.geoconnex.us/collections/counties/items?statefp={statefp}&f=json"
-            resp = httpx.get(url)
+            resp = http_client.get(url)
 
             obj = resp.json()
             with open(p, "w") as wfile:
                 json.dump(obj, wfile)
 
-        with open(p, "r") as rfile:
-            obj = json.load(rfile)
+        obj = load_json(p)
 
         county = county.lower()
         for f in obj["features"]:
@@ -106,7 +137,9 @@ def get_county_polygon(name, as_wkt=True):
                 continue
 
             if name.lower() == county:
-                poly = Polygon(f["geometry"]["coordinates"][0][0])
+                from shapely.geometry import shape
+
+                poly = shape(f["geometry"])
                 if as_wkt:
                     return poly.wkt
                 return poly
@@ -0,0 +1,315 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from backend.http_client import LineSplitter
+
+DEFAULT_MAX_SIZE = 1024**3  # 1 GB
+
+
+def default_cache_dir():
+    root = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(root, "nmuwd")
+
+
+def make_key(url, params=None):
+    """
+    Key a request by its url plus its sorted query parameters
+    """
+    if params:
+        items = sorted((str(k), str(v)) for k, v in dict(params).items())
+        url = f"{url}?{urlencode(items)}"
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for an httpx.Response that was served from the cache.
+
+    The body is read from disk on first access, or streamed with iter_lines
+    """
+
+    def __init__(self, url, status_code, path, encoding=None, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.path = path
+        self.encoding = encoding or "utf-8"
+        self.headers = headers or {}
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            with open(self.path, "rb") as rfile:
+                self._content = rfile.read()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_lines(self, chunk_size=65536):
+        splitter = LineSplitter(self.encoding)
+        with open(self.path, "rb") as rfile:
+            while 1:
+                chunk = rfile.read(chunk_size)
+                if not chunk:
+                    break
+                yield from splitter.feed(chunk)
+        yield from splitter.flush()
+
+
+class CacheWriter:
+    """
+    Writes a response body to the cache as it streams in. Nothing is visible in
+    the cache until commit is called
+    """
+
+    def __init__(self, cache, key, resp):
+        self.cache = cache
+        self.key = key
+        self.meta = _make_meta(resp)
+        self.path = cache._body_path(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._size = 0
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        self.meta["size"] = self._size
+        self.cache._commit(self.key, self._tmp, self.meta)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+def _make_meta(resp):
+    return {
+        "url": str(resp.url),
+        "status_code": resp.status_code,
+        "encoding": resp.encoding,
+        "stored_at": time.time(),
+        "size": 0,
+        "headers": {
+            k: resp.headers[k]
+            for k in ("etag", "last-modified", "content-type")
+            if k in resp.headers
+        },
+    }
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful GET responses.
+
+    Each entry is a body file plus a json metadata file. Entries older than the
+    requesting source's ttl are revalidated with If-None-Match/If-Modified-Since
+    when the upstream supplied an ETag or Last-Modified header. The least recently
+    used entries are evicted once the cache grows past max_size bytes
+    """
+
+    def __init__(self, root=None, max_size=DEFAULT_MAX_SIZE, refresh=False):
+        if root is None:
+            root = default_cache_dir()
+
+        self.root = root
+        self.max_size = max_size
+        self.refresh = refresh
+        self._size = None
+        self._lock = threading.Lock()
+
+    # public
+    def lookup(self, url, params=None, ttl=None):
+        """
+        Return (key, cached_response, conditional_headers).
+
+        cached_response is not None when a fresh entry exists. conditional_headers
+        should be sent with the request when the entry exists but is stale
+        """
+        key = make_key(url, params)
+        if self.refresh:
+            return key, None, {}
+
+        meta = self._read_meta(key)
+        if meta is None:
+            return key, None, {}
+
+        if ttl is None or time.time() - meta["stored_at"] < ttl:
+            resp = self._load(key, meta)
+            if resp is not None:
+                return key, resp, {}
+
+        headers = {}
+        etag = meta["headers"].get("etag")
+        if etag:
+            headers["If-None-Match"] = etag
+        last_modified = meta["headers"].get("last-modified")
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        return key, None, headers
+
+    def revalidated(self, key):
+        """
+        Upstream answered 304 Not Modified. Restart the entry's ttl and return it
+        """
+        meta = self._read_meta(key)
+        if meta is None:
+            return
+
+        meta["stored_at"] = time.time()
+        self._write_meta(key, meta)
+        return self._load(key, meta)
+
+    def store(self, key, resp):
+        if resp.status_code != 200:
+            return
+
+        writer = CacheWriter(self, key, resp)
+        try:
+            writer.write(resp.content)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def open_writer(self, key, resp):
+        """
+        Return a CacheWriter for a streamed response, or None if resp should not
+        be cached
+        """
+        if resp.status_code == 200:
+            return CacheWriter(self, key, resp)
+
+    def clear(self):
+        for path in self._iter_bodies():
+            self._remove(path)
+        self._size = 0
+
+    # private
+    def _commit(self, key, tmp, meta):
+        body = self._body_path(key)
+        with self._lock:
+            size = self._current_size()
+            if os.path.isfile(body):
+                size -= os.path.getsize(body)
+
+            os.replace(tmp, body)
+            self._write_meta(key, meta)
+
+            self._size = size + meta["size"]
+            if self._size > self.max_size:
+                self._evict()
+
+    def _load(self, key, meta):
+        path = self._body_path(key)
+        try:
+            # bump the modification time. it is used as the last access time for LRU
+            os.utime(path)
+        except OSError:
+            return
+
+        return CachedResponse(
+            meta["url"],
+            meta["status_code"],
+            path,
+            meta.get("encoding"),
+            meta["headers"],
+        )
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(os.path.getsize(p) for p in self._iter_bodies())
+        return self._size
+
+    def _evict(self):
+        entries = []
+        for path in self._iter_bodies():
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        target = self.max_size * 0.9
+        for _, s, path in entries:
+            if size <= target:
+                break
+            self._remove(path)
+            size -= s
+        self._size = size
+
+    def _remove(self, body):
+        for p in (body, f"{body[: -len('.body')]}.json"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def _iter_bodies(self):
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for f in filenames:
+                if f.endswith(".body"):
+                    yield os.path.join(dirpath, f)
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key), "r") as rfile:
+                return json.load(rfile)
+        except (OSError, ValueError):
+            return
+
+    def _write_meta(self, key, meta):
+        path = self._meta_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._atomic_write(path, json.dumps(meta).encode("utf-8"))
+
+    def _atomic_write(self, path, content):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as wfile:
+            wfile.write(content)
+        os.replace(tmp, path)
+
+    def _body_path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.body")
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+
+# ============= EOF =============================================
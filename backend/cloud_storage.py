@@ -0,0 +1,126 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import gzip
+import os
+import shutil
+
+DEFAULT_STORAGE_URL = "gs://waterdatainitiative/die"
+
+
+def parse_storage_url(url):
+    """
+    Split a gs://bucket/prefix or file:///path url into (scheme, bucket, prefix).
+    For file urls the bucket is the directory and the prefix is empty
+    """
+    scheme, _, rest = url.partition("://")
+    if scheme == "file":
+        return scheme, rest, ""
+    elif scheme == "gs":
+        name, _, prefix = rest.partition("/")
+        return scheme, name, prefix.strip("/")
+
+    raise ValueError(f"unsupported storage url {url}")
+
+
+def open_bucket(url):
+    """
+    Return the bucket of a storage url. The google storage client honors
+    STORAGE_EMULATOR_HOST, so gs:// urls can also point at a local emulator
+    """
+    scheme, name, _ = parse_storage_url(url)
+    if scheme == "file":
+        return LocalBucket(name)
+
+    from google.cloud import storage
+
+    return storage.Client().bucket(name)
+
+
+class BlobStream:
+    """
+    Binary stream into a blob upload, gzip compressed if compress. commit
+    finishes the upload. nbytes counts the uncompressed bytes written
+    """
+
+    def __init__(self, f, compress=False):
+        self._raw = f
+        self._file = gzip.GzipFile(fileobj=f, mode="wb") if compress else f
+        self.nbytes = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self.nbytes += len(data)
+
+    def commit(self):
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+
+
+class LocalBucket:
+    """
+    Filesystem backed stand-in for a google.cloud.storage Bucket, implementing
+    the part of the API used by CloudStoragePersister. Blobs are files under root
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.name = root
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.content_encoding = None
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, self.name)
+
+    def open(self, mode="rb", **kw):
+        if "w" in mode:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return open(self.path, mode)
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.open("wb") as f:
+            f.write(data)
+
+    def download_as_bytes(self):
+        with self.open("rb") as f:
+            return f.read()
+
+    def compose(self, sources):
+        with self.open("wb") as dst:
+            for s in sources:
+                with s.open("rb") as src:
+                    shutil.copyfileobj(src, dst)
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+# ============= EOF =============================================
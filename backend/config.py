@@ -17,52 +17,42 @@ import os
 import sys
 import time
 from datetime import datetime, timedelta
+from typing import Optional
 
 import click
-import shapely.wkt
 
 from .bounding_polygons import get_county_polygon
-from .connectors.ampapi.source import (
-    AMPAPISiteSource,
-    AMPAPIWaterLevelSource,
-    AMPAPIAnalyteSource,
-)
-from .connectors.bor.source import BORSiteSource, BORAnalyteSource
-from .connectors.ckan import (
-    HONDO_RESOURCE_ID,
-    FORT_SUMNER_RESOURCE_ID,
-    ROSWELL_RESOURCE_ID,
-)
-from .connectors.ckan.source import (
-    OSERoswellSiteSource,
-    OSERoswellWaterLevelSource,
-)
-from .connectors.nmenv.source import DWBSiteSource, DWBAnalyteSource
-from .constants import MILLIGRAMS_PER_LITER, WGS84, FEET
-from .connectors.isc_seven_rivers.source import (
-    ISCSevenRiversSiteSource,
-    ISCSevenRiversWaterLevelSource,
-    ISCSevenRiversAnalyteSource,
-)
-from .connectors.st2.source import (
-    ST2SiteSource,
-    PVACDSiteSource,
-    EBIDSiteSource,
-    PVACDWaterLevelSource,
-)
-from .connectors.usgs.source import USGSSiteSource, USGSWaterLevelSource
-from .connectors.wqp.source import WQPSiteSource, WQPAnalyteSource
-
-SOURCE_KEYS = (
-    "ampapi",
-    "wqp",
-    "isc_seven_rivers",
-    "nwis",
-    "ose_roswell",
-    "st2",
-    "bor",
-    "dwb",
-)
+from .cache import ResponseCache, DEFAULT_MAX_SIZE
+from .cloud_storage import DEFAULT_STORAGE_URL
+from .connectors.registry import SOURCE_KEYS, get_entries, load_class, source_keys
+from .constants import MILLIGRAMS_PER_LITER, WGS84, FEET, OUTPUT_FORMATS
+from .http_client import ClientPool, AsyncClientPool
+from .request_policy import RequestPolicy
+
+# connectors are imported when used, see connectors.registry
+
+
+def parse_bbox(bbox):
+    """
+    Return (x1, y1, x2, y2), rounded to 7 decimals, for a "x1 y1,x2 y2" string or
+    a dict with minLng, minLat, maxLng and maxLat
+    """
+    if isinstance(bbox, str):
+        p1, p2 = bbox.split(",")
+        x1, y1 = [float(a) for a in p1.strip().split(" ")]
+        x2, y2 = [float(a) for a in p2.strip().split(" ")]
+    else:
+        x1 = bbox["minLng"]
+        x2 = bbox["maxLng"]
+        y1 = bbox["minLat"]
+        y2 = bbox["maxLat"]
+
+    if x1 > x2:
+        x1, x2 = x2, x1
+    if y1 > y2:
+        y1, y2 = y2, y1
+
+    return round(x1, 7), round(y1, 7), round(x2, 7), round(y2, 7)
 
 
 class Config(object):
@@ -77,6 +67,9 @@ class Config(object):
     bbox: dict  # dict or str
     county: str = ""
     wkt: str = ""
+    # tolerance, in degrees, of the simplified superset of the area sent to
+    # services that filter spatially. 0 sends the area as is
+    pushdown_tolerance: float = 0.01
 
     # sources
     use_source_ampapi: bool = True
@@ -92,6 +85,9 @@ class Config(object):
 
     # output
     use_cloud_storage: bool = False
+    # gs://bucket/prefix, or file:///path for a local directory
+    cloud_storage_url: str = DEFAULT_STORAGE_URL
+    cloud_storage_gzip: bool = False
     output_dir: str = ""
     output_name: str = "output"
     output_horizontal_datum: str = WGS84
@@ -106,6 +102,49 @@ class Config(object):
 
     use_csv: bool = True
     use_geojson: bool = False
+    # newline delimited geojson features
+    use_geojsonseq: bool = False
+    # geopackage, written with geopandas
+    use_gpkg: bool = False
+    use_parquet: bool = False
+    # write csv and geojson output as results arrive instead of at the end of the
+    # run
+    use_streaming: bool = False
+    # write timeseries to one csv with a sites index instead of a file per site
+    use_consolidated_timeseries: bool = False
+
+    # http
+    http2: bool = False
+    http_max_connections: int = 10
+    http_max_keepalive_connections: int = 5
+    http_keepalive_expiry: float = 30
+
+    # request policy. rate_limits maps host to requests per second. None uses
+    # request_policy.DEFAULT_RATE_LIMITS
+    rate_limits: Optional[dict] = None
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 60
+
+    # concurrency
+    max_workers: int = 1
+    use_async: bool = False
+    use_columnar: bool = False
+    max_concurrent_requests: int = 16
+    max_concurrent_requests_per_source: int = 4
+
+    # cache
+    use_cache: bool = False
+    cache_refresh: bool = False
+    cache_dir: str = ""
+    cache_max_size: int = DEFAULT_MAX_SIZE
+
+    _client_pool = None
+    _async_client_pool = None
+    _response_cache = None
+    _request_policy = None
+    _area = None
 
     def __init__(self, model=None, payload=None):
         self.bbox = {}
@@ -119,146 +158,179 @@ class Config(object):
                         self.bbox = model.bbox.model_dump()
 
             if model.sources:
-                for s in SOURCE_KEYS:
+                for s in source_keys():
                     setattr(self, f"use_source_{s}", s in model.sources)
         elif payload:
             self.wkt = payload.get("wkt", "")
             self.county = payload.get("county", "")
             self.output_summary = payload.get("output_summary", False)
             self.output_name = payload.get("output_name", "output")
-            for s in SOURCE_KEYS:
+            for s in source_keys():
                 setattr(self, f"use_source_{s}", s in payload.get("sources", []))
 
     def analyte_sources(self):
-        sources = []
-
-        # if self.use_source_wqp:
-        # sources.append((WQPSiteSource, WQPAnalyteSource))
-        if self.use_source_bor:
-            sources.append((BORSiteSource(), BORAnalyteSource()))
-        if self.use_source_wqp:
-            sources.append((WQPSiteSource(), WQPAnalyteSource()))
-        if self.use_source_isc_seven_rivers:
-            sources.append((ISCSevenRiversSiteSource(), ISCSevenRiversAnalyteSource()))
-        if self.use_source_ampapi:
-            sources.append((AMPAPISiteSource(), AMPAPIAnalyteSource()))
-        if self.use_source_dwb:
-            sources.append((DWBSiteSource(), DWBAnalyteSource()))
-
-        for s, ss in sources:
-            s.set_config(self)
-            ss.set_config(self)
-
-            # s.config = self
-            # ss.config = self
-
-        return sources
+        return self._make_sources("analytes")
 
     def water_level_sources(self):
-        sources = []
-        if self.use_source_ampapi:
-            sources.append((AMPAPISiteSource(), AMPAPIWaterLevelSource()))
-
-        if self.use_source_isc_seven_rivers:
-            sources.append(
-                (ISCSevenRiversSiteSource(), ISCSevenRiversWaterLevelSource())
-            )
+        return self._make_sources("waterlevels")
 
-        if self.use_source_nwis:
-            sources.append((USGSSiteSource(), USGSWaterLevelSource()))
-
-        if self.use_source_ose_roswell:
-            sources.append(
-                (
-                    OSERoswellSiteSource(HONDO_RESOURCE_ID),
-                    OSERoswellWaterLevelSource(HONDO_RESOURCE_ID),
-                )
-            )
-            sources.append(
-                (
-                    OSERoswellSiteSource(FORT_SUMNER_RESOURCE_ID),
-                    OSERoswellWaterLevelSource(FORT_SUMNER_RESOURCE_ID),
-                )
-            )
-            sources.append(
-                (
-                    OSERoswellSiteSource(ROSWELL_RESOURCE_ID),
-                    OSERoswellWaterLevelSource(ROSWELL_RESOURCE_ID),
-                )
-            )
-        if self.use_source_st2:
-            sources.append((PVACDSiteSource(), PVACDWaterLevelSource()))
-            # sources.append((EBIDSiteSource, EBIDWaterLevelSource))
-
-        # if self.use_source_bor:
-        #     sources.append((BORSiteSource(), BORWaterLevelSource()))
+    def site_sources(self):
+        return [
+            load_class(e.site) for e in get_entries("sites") if self._use_source(e.key)
+        ]
+
+    def _make_sources(self, kind):
+        """
+        Return (site source, parameter source) pairs for the enabled sources of
+        kind, configured with this config
+        """
+        sources = []
+        for e in get_entries(kind):
+            if not self._use_source(e.key):
+                continue
 
-        for s, ss in sources:
+            s = load_class(e.site)(*e.args)
+            ss = load_class(e.parameter)(*e.args)
             s.set_config(self)
             ss.set_config(self)
+            sources.append((s, ss))
 
         return sources
 
-    def site_sources(self):
-        sources = []
-        if self.use_source_ampapi:
-            sources.append(AMPAPISiteSource)
-        if self.use_source_isc_seven_rivers:
-            sources.append(ISCSevenRiversSiteSource)
-        if self.use_source_ose_roswell:
-            sources.append(OSERoswellSiteSource)
-        if self.use_source_nwis:
-            sources.append(USGSSiteSource)
-        if self.use_source_st2:
-            sources.append(PVACDSiteSource)
-            sources.append(EBIDSiteSource)
-        if self.use_source_bor:
-            sources.append(BORSiteSource)
-        return sources
+    def _use_source(self, key):
+        # plugin sources are enabled unless turned off
+        return getattr(self, f"use_source_{key}", True)
 
     def bbox_bounding_points(self, bbox=None):
-        if bbox is None:
-            bbox = self.bbox
-
-        if isinstance(bbox, str):
-            p1, p2 = bbox.split(",")
-            x1, y1 = [float(a) for a in p1.strip().split(" ")]
-            x2, y2 = [float(a) for a in p2.strip().split(" ")]
-        else:
-            shp = None
-            if self.county:
-                shp = get_county_polygon(self.county, as_wkt=False)
-            elif self.wkt:
-                shp = shapely.wkt.loads(self.wkt)
-
-            if shp:
-                x1, y1, x2, y2 = shp.bounds
-            else:
-                x1 = bbox["minLng"]
-                x2 = bbox["maxLng"]
-                y1 = bbox["minLat"]
-                y2 = bbox["maxLat"]
-
-        if x1 > x2:
-            x1, x2 = x2, x1
-        if y1 > y2:
-            y1, y2 = y2, y1
-
-        return round(x1, 7), round(y1, 7), round(x2, 7), round(y2, 7)
+        """
+        Return (x1, y1, x2, y2), the bounds of bbox if given, otherwise of the
+        area of interest
+        """
+        if bbox is not None:
+            return parse_bbox(bbox)
+
+        area = self.get_area()
+        if area is None:
+            return parse_bbox(self.bbox)
+        return area.bounds
 
     def bounding_wkt(self):
+        area = self.get_area()
+        if area is not None:
+            return area.wkt
+
+    def pushdown_wkt(self):
+        """
+        Return the WKT to send to services that filter spatially, a simplified
+        superset of the area. Their records are filtered exactly by the
+        transformers
+        """
+        area = self.get_area()
+        if area is not None:
+            return area.pushdown_wkt(self.pushdown_tolerance)
+
+    def get_area(self):
+        """
+        Return the AreaOfInterest of wkt, bbox or county, in that order of
+        precedence, or None if none are set. Resolved once and rebuilt only when
+        wkt, bbox or county change
+        """
+        if not self.has_bounds():
+            return
+
+        bbox = self.bbox
+        if isinstance(bbox, dict):
+            bbox = tuple(sorted(bbox.items()))
+
+        key = (self.wkt, bbox, self.county)
+        if self._area is None or self._area[0] != key:
+            area = None
+            wkt = self._resolve_wkt()
+            if wkt:
+                from .geo_utils import AreaOfInterest
+
+                area = AreaOfInterest(wkt)
+            self._area = key, area
+        return self._area[1]
+
+    def _resolve_wkt(self):
         if self.wkt:
             return self.wkt
         elif self.bbox:
-            x1, y1, x2, y2 = self.bbox_bounding_points()
+            x1, y1, x2, y2 = parse_bbox(self.bbox)
             pts = f"{x1} {y1},{x1} {y2},{x2} {y2},{x2} {y1},{x1} {y1}"
             return f"POLYGON(({pts}))"
         elif self.county:
             return get_county_polygon(self.county)
 
+    def get_client_pool(self):
+        if self._client_pool is None:
+            self._client_pool = ClientPool(
+                http2=self.http2,
+                max_connections=self.http_max_connections,
+                max_keepalive_connections=self.http_max_keepalive_connections,
+                keepalive_expiry=self.http_keepalive_expiry,
+                policy=self.get_request_policy(),
+            )
+        return self._client_pool
+
+    def close_client_pool(self):
+        if self._client_pool is not None:
+            self._client_pool.close()
+            self._client_pool = None
+
+    def get_request_policy(self):
+        # shared by the sync and async pools so rate limits and circuit state
+        # apply to both
+        if self._request_policy is None:
+            self._request_policy = RequestPolicy(
+                rate_limits=self.rate_limits,
+                max_retries=self.max_retries,
+                backoff_factor=self.backoff_factor,
+                failure_threshold=self.circuit_failure_threshold,
+                reset_timeout=self.circuit_reset_timeout,
+            )
+        return self._request_policy
+
+    def get_async_client_pool(self):
+        if self._async_client_pool is None:
+            self._async_client_pool = AsyncClientPool(
+                http2=self.http2,
+                max_connections=self.http_max_connections,
+                max_keepalive_connections=self.http_max_keepalive_connections,
+                keepalive_expiry=self.http_keepalive_expiry,
+                policy=self.get_request_policy(),
+            )
+        return self._async_client_pool
+
+    async def aclose_async_client_pool(self):
+        if self._async_client_pool is not None:
+            await self._async_client_pool.aclose()
+            self._async_client_pool = None
+
+    def get_response_cache(self):
+        if not self.use_cache:
+            return
+
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(
+                root=self.cache_dir or None,
+                max_size=self.cache_max_size,
+                refresh=self.cache_refresh,
+            )
+        return self._response_cache
+
     def has_bounds(self):
         return self.bbox or self.county or self.wkt
 
+    def get_spatial_filter(self):
+        """
+        Return the SpatialFilter of the area of interest, or None if there is none
+        """
+        area = self.get_area()
+        if area is not None:
+            return area.filter
+
     def now_ms(self, days=0):
         td = timedelta(days=days)
         # return current time in milliseconds
@@ -299,6 +371,30 @@ class Config(object):
                 "use_source_st2",
                 "use_source_bor",
                 "use_source_dwb",
+                "pushdown_tolerance",
+            ),
+        )
+
+        area = self.get_area()
+        if area is not None and self.pushdown_tolerance:
+            rate = area.false_positive_rate(self.pushdown_tolerance)
+            click.secho(
+                f"pushdown false positive rate: {rate:.1%} of the pushdown area is "
+                f"outside the area of interest\n",
+                fg="yellow",
+            )
+
+        _report_attributes(
+            "Performance",
+            (
+                "use_cache",
+                "cache_refresh",
+                "max_workers",
+                "use_async",
+                "use_columnar",
+                "use_streaming",
+                "max_concurrent_requests",
+                "max_concurrent_requests_per_source",
             ),
         )
 
@@ -310,6 +406,12 @@ class Config(object):
                 "output_name",
                 "output_horizontal_datum",
                 "output_elevation_units",
+                "use_csv",
+                "use_geojson",
+                "use_geojsonseq",
+                "use_gpkg",
+                "use_parquet",
+                "use_consolidated_timeseries",
             ),
         )
 
@@ -350,14 +452,17 @@ class Config(object):
     def _validate_bbox(self):
         try:
             if self.bbox:
-                self.bbox_bounding_points()
+                parse_bbox(self.bbox)
             return True
         except ValueError:
             return False
 
     def _validate_county(self):
         if self.county:
-            return bool(get_county_polygon(self.county))
+            if self.wkt or self.bbox:
+                # the area comes from wkt or bbox, but the county must still exist
+                return get_county_polygon(self.county, as_wkt=False) is not None
+            return self.get_area() is not None
 
         return True
 
@@ -369,6 +474,13 @@ class Config(object):
     def end_dt(self):
         return self._extract_date(self.end_date)
 
+    def set_output_format(self, fmt):
+        """
+        Select the persister by name, one of OUTPUT_FORMATS
+        """
+        for f in OUTPUT_FORMATS:
+            setattr(self, f"use_{f}", f == fmt)
+
     @property
     def output_path(self):
         return os.path.join(self.output_dir, f"{self.output_name}")
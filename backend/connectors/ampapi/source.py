@@ -15,8 +15,6 @@
 # ===============================================================================
 import os
 
-import httpx
-
 from backend.connectors.ampapi.transformer import (
     AMPAPISiteTransformer,
     AMPAPIWaterLevelTransformer,
@@ -62,7 +60,7 @@ class AMPAPISiteSource(BaseSiteSource):
         config = self.config
         params = {}
         if config.has_bounds():
-            params["wkt"] = config.bounding_wkt()
+            params["wkt"] = config.pushdown_wkt()
 
         if config.site_limit:
             params["limit"] = config.site_limit
@@ -81,27 +79,39 @@ class AMPAPISiteSource(BaseSiteSource):
 
 class AMPAPIAnalyteSource(BaseAnalyteSource):
     transformer_klass = AMPAPIAnalyteTransformer
+    most_recent_tag = "info.CollectionDate"
 
     def get_records(self, parent_record):
-        analyte = get_analyte_search_param(self.config.analyte, AMPAPI_ANALYTE_MAPPING)
+        analyte, params = self._get_params(parent_record)
         records = self._execute_json_request(
-            _make_url("waterchemistry"),
-            params={
-                "pointid": ",".join(make_site_list(parent_record)),
-                "analyte": analyte,
-            },
-            tag="",
+            _make_url("waterchemistry"), params=params, tag=""
         )
         return records[analyte]
 
-    def _extract_parent_records(self, records, parent_record):
-        return records.get(parent_record.id, [])
+    async def get_records_async(self, parent_record):
+        analyte, params = self._get_params(parent_record)
+        records = await self._execute_json_request_async(
+            _make_url("waterchemistry"), params=params, tag=""
+        )
+        return records[analyte]
+
+    def _get_params(self, parent_record):
+        analyte = get_analyte_search_param(self.config.analyte, AMPAPI_ANALYTE_MAPPING)
+        params = {
+            "pointid": ",".join(make_site_list(parent_record)),
+            "analyte": analyte,
+        }
+        return analyte, params
+
+    def _index_parent_records(self, records):
+        # the response is already keyed by PointID
+        return records
 
     def _extract_parameter_units(self, records):
         return [r["Units"] for r in records]
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, "info.CollectionDate")
+        record = get_most_recent(records, self.most_recent_tag)
         return {
             "value": record["SampleValue"],
             "datetime": record["info"]["CollectionDate"],
@@ -121,6 +131,8 @@ class AMPAPIAnalyteSource(BaseAnalyteSource):
 
 class AMPAPIWaterLevelSource(BaseWaterLevelSource):
     transformer_klass = AMPAPIWaterLevelTransformer
+    site_key = "Well.PointID"
+    most_recent_tag = ("DateMeasured", "TimeMeasured")
 
     def _clean_records(self, records):
         return [r for r in records if r["DepthToWaterBGS"] is not None]
@@ -132,7 +144,7 @@ class AMPAPIWaterLevelSource(BaseWaterLevelSource):
         return record
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, "DateMeasured")
+        record = get_most_recent(records, self.most_recent_tag)
         return {
             "value": record["DepthToWaterBGS"],
             "datetime": (record["DateMeasured"], record["TimeMeasured"]),
@@ -142,9 +154,6 @@ class AMPAPIWaterLevelSource(BaseWaterLevelSource):
     def _extract_parameter_results(self, records):
         return [r["DepthToWaterBGS"] for r in records]
 
-    def _extract_parent_records(self, records, parent_record):
-        return [ri for ri in records if ri["Well"]["PointID"] == parent_record.id]
-
     def get_records(self, parent_record):
         # if self.config.latest_water_level_only:
         #     params = {"pointids": parent_record.id}
@@ -156,5 +165,11 @@ class AMPAPIWaterLevelSource(BaseWaterLevelSource):
 
         return self._execute_json_request(url, params)
 
+    async def get_records_async(self, parent_record):
+        params = {"pointid": ",".join(make_site_list(parent_record))}
+        url = _make_url("waterlevels/manual")
+
+        return await self._execute_json_request_async(url, params)
+
 
 # ============= EOF =============================================
@@ -24,6 +24,10 @@ from backend.transformer import (
 
 
 class AMPAPISiteTransformer(SiteTransformer):
+    def _get_lnglat(self, record):
+        lng, lat = record["geometry"]["coordinates"][:2]
+        return lng, lat
+
     def _transform(self, record):
         props = record["properties"]
         rec = {
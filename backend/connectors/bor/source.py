@@ -16,8 +16,6 @@
 import pprint
 from json import JSONDecodeError
 
-import httpx
-
 from backend.connectors.bor.transformer import BORSiteTransformer, BORAnalyteTransformer
 from backend.connectors.mappings import BOR_ANALYTE_MAPPING
 from backend.constants import (
@@ -57,6 +55,8 @@ def parse_dt(dt):
 
 class BORAnalyteSource(BaseAnalyteSource):
     transformer_klass = BORAnalyteTransformer
+    site_key = "attributes.locationId"
+    most_recent_tag = "attributes.dateTime"
     _catalog_item_idx = None
 
     def _extract_parameter_record(self, record):
@@ -73,18 +73,13 @@ class BORAnalyteSource(BaseAnalyteSource):
 
     def _extract_most_recent(self, rs):
 
-        record = get_most_recent(rs, "attributes.dateTime")
+        record = get_most_recent(rs, self.most_recent_tag)
         return {
             "value": record["attributes"]["result"],
             "datetime": parse_dt(record["attributes"]["dateTime"]),
             "units": record["attributes"]["resultAttributes"]["units"],
         }
 
-    def _extract_parent_records(self, records, parent_record):
-        return [
-            ri for ri in records if ri["attributes"]["locationId"] == parent_record.id
-        ]
-
     def _reorder_catalog_items(self, items):
         if self._catalog_item_idx:
             # rotate list so catalog_item_idx is the first item
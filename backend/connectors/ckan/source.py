@@ -13,10 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import threading
 from itertools import groupby
 
-import httpx
-
 from backend.connectors.ckan.transformer import (
     OSERoswellSiteTransformer,
     OSERoswellWaterLevelTransformer,
@@ -34,6 +33,10 @@ class CKANSource:
     base_url: str
     _cached_response = None
 
+    def __init__(self, *args, **kw):
+        self._lock = threading.Lock()
+        super().__init__(*args, **kw)
+
     def get_records(self, *args, **kw):
         return self._parse_response(self.get_response(*args, **kw))
 
@@ -41,8 +44,13 @@ class CKANSource:
         if self.base_url is None:
             raise NotImplementedError("base_url is not set")
 
-        if self._cached_response is None:
-            self._cached_response = httpx.get(self.base_url, params=self._get_params())
+        # the water level source is called once per site, possibly from several
+        # worker threads. only fetch the resource once
+        with self._lock:
+            if self._cached_response is None:
+                self._cached_response = self._get(
+                    self.base_url, params=self._get_params()
+                )
 
         return self._cached_response
 
@@ -86,6 +94,7 @@ class OSERoswellSiteSource(OSERoswellSource, BaseSiteSource):
 
 class OSERoswellWaterLevelSource(OSERoswellSource, BaseWaterLevelSource):
     transformer_klass = OSERoswellWaterLevelTransformer
+    most_recent_tag = "Date"
 
     def get_records(self, parent_record):
         return self._parse_response(parent_record, self.get_response())
@@ -98,7 +107,7 @@ class OSERoswellWaterLevelSource(OSERoswellSource, BaseWaterLevelSource):
         return [float(r["DTWGS"]) for r in records]
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, tag="Date")
+        record = get_most_recent(records, self.most_recent_tag)
         return {"value": record["DTWGS"], "datetime": record["Date"], "units": FEET}
 
     def _extract_parameter_record(self, record):
@@ -20,12 +20,13 @@ from backend.transformer import BaseTransformer, WaterLevelTransformer, SiteTran
 
 
 class OSERoswellSiteTransformer(SiteTransformer):
+    def _get_lnglat(self, record):
+        return float(record["DD_lon"]), float(record["DD_lat"])
+
     def _transform(self, record):
         # pprint.pprint(record)
         lat = float(record["DD_lat"])
         lng = float(record["DD_lon"])
-        if not self.contained(lng, lat):
-            return
 
         rec = {
             "source": f"CKAN/OSERoswell",
@@ -15,8 +15,6 @@
 # ===============================================================================
 from datetime import datetime
 
-import httpx
-
 from backend.connectors.mappings import ISC_SEVEN_RIVERS_ANALYTE_MAPPING
 from backend.constants import (
     TDS,
@@ -61,6 +59,7 @@ class ISCSevenRiversSiteSource(BaseSiteSource):
 
 class ISCSevenRiversAnalyteSource(BaseAnalyteSource):
     transformer_klass = ISCSevenRiversAnalyteTransformer
+    most_recent_tag = "dateTime"
     _analyte_ids = None
 
     def _get_analyte_id(self, analyte):
@@ -82,7 +81,7 @@ class ISCSevenRiversAnalyteSource(BaseAnalyteSource):
         return record
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, "dateTime")
+        record = get_most_recent(records, self.most_recent_tag)
 
         return {
             "value": record["result"],
@@ -135,6 +134,7 @@ def get_datetime(record):
 
 class ISCSevenRiversWaterLevelSource(BaseWaterLevelSource):
     transformer_klass = ISCSevenRiversWaterLevelTransformer
+    most_recent_tag = "dateTime"
 
     def get_records(self, parent_record):
         params = {
@@ -164,7 +164,7 @@ class ISCSevenRiversWaterLevelSource(BaseWaterLevelSource):
         ]
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, "dateTime")
+        record = get_most_recent(records, self.most_recent_tag)
         t = get_datetime(record)
         return {"value": record["depthToWaterFeet"], "datetime": t, "units": FEET}
 
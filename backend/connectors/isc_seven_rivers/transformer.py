@@ -13,9 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
-import shapely.wkt
-from shapely import Point
-
 from backend.record import SiteRecord
 from backend.transformer import (
     BaseTransformer,
@@ -26,13 +23,13 @@ from backend.transformer import (
 
 
 class ISCSevenRiversSiteTransformer(SiteTransformer):
+    def _get_lnglat(self, record):
+        return record["longitude"], record["latitude"]
+
     def _transform(self, record):
         lat = record["latitude"]
         lng = record["longitude"]
 
-        if not self.contained(lng, lat):
-            return
-
         rec = {
             "source": "ISCSevenRivers",
             "id": record["id"],
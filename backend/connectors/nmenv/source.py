@@ -40,7 +40,7 @@ class DWBSiteSource(STSiteSource):
         fs = [f"ObservedProperty/id eq {analyte}"]
         if self.config.has_bounds():
             fs.append(
-                f"st_within(Thing/Location/location, geography'{self.config.bounding_wkt()}')"
+                f"st_within(Thing/Location/location, geography'{self.config.pushdown_wkt()}')"
             )
 
         q = q.filter(" and ".join(fs))
@@ -0,0 +1,180 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+"""
+Registry of the data source connectors, keyed by source name (see SOURCE_KEYS).
+
+Connector classes are referenced as "module:Class" strings and imported only
+when a source is used, so importing the registry, or Config, does not import
+the connectors or their dependencies (frost_sta_client, shapely, pyproj...).
+
+Other packages can add sources with an entry point in the "nmuwd.sources"
+group. The entry point's name is the source key and it points to a function
+that is called with register, e.g.
+
+    def register_sources(register):
+        register("mysource", "waterlevels", "mypkg.source:MySiteSource",
+                 "mypkg.source:MyWaterLevelSource")
+"""
+
+from collections import namedtuple
+from importlib import import_module
+from typing import Dict, List
+
+from backend.connectors.ckan import (
+    HONDO_RESOURCE_ID,
+    FORT_SUMNER_RESOURCE_ID,
+    ROSWELL_RESOURCE_ID,
+)
+
+ENTRY_POINT_GROUP = "nmuwd.sources"
+
+SOURCE_KEYS = (
+    "ampapi",
+    "wqp",
+    "isc_seven_rivers",
+    "nwis",
+    "ose_roswell",
+    "st2",
+    "bor",
+    "dwb",
+)
+
+# kind is "sites", "waterlevels" or "analytes". parameter is None for sites.
+# args are passed to both the site and the parameter source
+SourceEntry = namedtuple("SourceEntry", "key site parameter args")
+
+REGISTRY: Dict[str, List[SourceEntry]] = {
+    "sites": [],
+    "waterlevels": [],
+    "analytes": [],
+}
+
+_loaded_entry_points = False
+
+
+def register(key, kind, site, parameter=None, args=()):
+    REGISTRY[kind].append(SourceEntry(key, site, parameter, tuple(args)))
+
+
+def load_class(path):
+    """
+    Import a "module:Class" path and return the class
+    """
+    module, _, name = path.partition(":")
+    return getattr(import_module(module), name)
+
+
+def get_entries(kind):
+    """
+    Return the SourceEntry's of kind, in registration order, including sources
+    added by entry points
+    """
+    _load_entry_points()
+    return REGISTRY[kind]
+
+
+def source_keys():
+    """
+    The built in SOURCE_KEYS plus the keys of any plugin sources
+    """
+    _load_entry_points()
+    keys = list(SOURCE_KEYS)
+    for entries in REGISTRY.values():
+        for e in entries:
+            if e.key not in keys:
+                keys.append(e.key)
+    return keys
+
+
+def _load_entry_points():
+    global _loaded_entry_points
+    if _loaded_entry_points:
+        return
+    _loaded_entry_points = True
+
+    from importlib.metadata import entry_points
+
+    try:
+        eps = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # python < 3.10
+        eps = entry_points().get(ENTRY_POINT_GROUP, [])
+
+    for ep in eps:
+        ep.load()(register)
+
+
+def _module(name):
+    return f"backend.connectors.{name}.source"
+
+
+AMPAPI = _module("ampapi")
+BOR = _module("bor")
+CKAN = _module("ckan")
+DWB = _module("nmenv")
+ISC = _module("isc_seven_rivers")
+ST2 = _module("st2")
+USGS = _module("usgs")
+WQP = _module("wqp")
+
+# the order of registration is the order the sources are run and written
+register("bor", "analytes", f"{BOR}:BORSiteSource", f"{BOR}:BORAnalyteSource")
+register("wqp", "analytes", f"{WQP}:WQPSiteSource", f"{WQP}:WQPAnalyteSource")
+register(
+    "isc_seven_rivers",
+    "analytes",
+    f"{ISC}:ISCSevenRiversSiteSource",
+    f"{ISC}:ISCSevenRiversAnalyteSource",
+)
+register(
+    "ampapi", "analytes", f"{AMPAPI}:AMPAPISiteSource", f"{AMPAPI}:AMPAPIAnalyteSource"
+)
+register("dwb", "analytes", f"{DWB}:DWBSiteSource", f"{DWB}:DWBAnalyteSource")
+
+register(
+    "ampapi",
+    "waterlevels",
+    f"{AMPAPI}:AMPAPISiteSource",
+    f"{AMPAPI}:AMPAPIWaterLevelSource",
+)
+register(
+    "isc_seven_rivers",
+    "waterlevels",
+    f"{ISC}:ISCSevenRiversSiteSource",
+    f"{ISC}:ISCSevenRiversWaterLevelSource",
+)
+register(
+    "nwis", "waterlevels", f"{USGS}:USGSSiteSource", f"{USGS}:USGSWaterLevelSource"
+)
+for resource_id in (HONDO_RESOURCE_ID, FORT_SUMNER_RESOURCE_ID, ROSWELL_RESOURCE_ID):
+    register(
+        "ose_roswell",
+        "waterlevels",
+        f"{CKAN}:OSERoswellSiteSource",
+        f"{CKAN}:OSERoswellWaterLevelSource",
+        (resource_id,),
+    )
+register("st2", "waterlevels", f"{ST2}:PVACDSiteSource", f"{ST2}:PVACDWaterLevelSource")
+
+register("ampapi", "sites", f"{AMPAPI}:AMPAPISiteSource")
+register("isc_seven_rivers", "sites", f"{ISC}:ISCSevenRiversSiteSource")
+register("ose_roswell", "sites", f"{CKAN}:OSERoswellSiteSource")
+register("nwis", "sites", f"{USGS}:USGSSiteSource")
+register("st2", "sites", f"{ST2}:PVACDSiteSource")
+register("st2", "sites", f"{ST2}:EBIDSiteSource")
+register("bor", "sites", f"{BOR}:BORSiteSource")
+
+# ============= EOF =============================================
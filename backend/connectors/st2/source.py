@@ -59,9 +59,7 @@ class ST2WaterLevelSource(STWaterLevelSource):
     url = URL
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(
-            records, tag=lambda x: x["observation"].phenomenon_time
-        )
+        record = get_most_recent(records, self.most_recent_tag)
 
         return {
             "value": record["observation"].result,
@@ -14,6 +14,7 @@
 # limitations under the License.
 # ===============================================================================
 from datetime import datetime
+from typing import Optional, Union
 
 import frost_sta_client as fsc
 
@@ -33,6 +34,9 @@ def get_service(url):
 
 class STSource:
     url: str
+    # same type as BaseParameterSource.most_recent_tag so the sources that mix
+    # both in agree on it
+    most_recent_tag: Optional[Union[str, tuple]] = "observation.phenomenon_time"
 
     def get_service(self):
         if self.url is None:
@@ -55,9 +59,7 @@ class STSource:
         return things.list()
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(
-            records, tag=lambda x: x["observation"].phenomenon_time
-        )
+        record = get_most_recent(records, self.most_recent_tag)
 
         return {
             "value": self._parse_result(record["observation"].result),
@@ -94,7 +96,7 @@ class STSiteSource(BaseSiteSource, STSource):
         fs = []
         if config.has_bounds():
             fs.append(
-                f"st_within(Location/location, geography'{config.bounding_wkt()}')"
+                f"st_within(Location/location, geography'{config.pushdown_wkt()}')"
             )
 
         fi = make_dt_filter(
@@ -131,15 +133,16 @@ class STSiteTransformer(SiteTransformer):
     def _transform_hook(self, rec):
         return rec
 
+    def _get_lnglat(self, record):
+        lng, lat = record.location["coordinates"][:2]
+        return lng, lat
+
     def _transform(self, record):
         if self.source_id is None:
             raise ValueError(f"{self.__class__.__name__} Source ID not set")
 
         lat = record.location["coordinates"][1]
         lng = record.location["coordinates"][0]
-        if not self.contained(lng, lat):
-            print("not contained")
-            return
 
         rec = {
             "source": self.source_id,
@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
-import httpx
+import io
 
 from backend.constants import FEET, DTW, DTW_UNITS, DT_MEASURED
 from backend.connectors.usgs.transformer import (
@@ -29,30 +29,103 @@ from backend.source import (
 )
 
 
+class RDBParser:
+    """
+    Incremental parser for USGS RDB (tab separated) responses.
+
+    Comment lines start with "#". The header line starts with "agency_cd" and is
+    followed by a line of column types (e.g. "5s 15s 20d"). Feed lines one at a
+    time with parse_line
+    """
+
+    def __init__(self, columns=None):
+        self.header = None
+        self.columns = columns
+        self._indices = None
+
+    def parse_line(self, line):
+        if line.startswith("#"):
+            return
+        elif line.startswith("agency_cd"):
+            self.header = [h.strip() for h in line.split("\t")]
+            if self.columns:
+                self._indices = [
+                    (c, self.header.index(c)) for c in self.columns if c in self.header
+                ]
+            return
+        elif line.startswith("5s"):
+            return
+        elif line == "":
+            return
+
+        vals = [v.strip() for v in line.split("\t")]
+        if self.header and any(vals):
+            if self._indices is not None:
+                n = len(vals)
+                return {c: vals[i] if i < n else "" for c, i in self._indices}
+
+            return dict(zip(self.header, vals))
+
+
+def iter_rdb(lines, columns=None):
+    """
+    Yield a dict per data row of an RDB document. lines can be any iterable, e.g.
+    a streaming response. If columns is given only those columns are kept
+    """
+    parser = RDBParser(columns)
+    for line in lines:
+        row = parser.parse_line(line)
+        if row is not None:
+            yield row
+
+
 def parse_rdb(text):
-    def line_generator():
-        header = None
-        for line in text.split("\n"):
-            if line.startswith("#"):
-                continue
-            elif line.startswith("agency_cd"):
-                header = [h.strip() for h in line.split("\t")]
-                continue
-            elif line.startswith("5s"):
-                continue
-            elif line == "":
-                continue
-
-            vals = [v.strip() for v in line.split("\t")]
-            if header and any(vals):
-                yield dict(zip(header, vals))
-
-    return list(line_generator())
+    return list(iter_rdb(io.StringIO(text)))
+
+
+def parse_rdb_frame(text, columns=None):
+    """
+    Decode an RDB document into a pandas DataFrame of strings. Much faster than
+    parse_rdb for large responses
+    """
+    import pandas as pd
+
+    # comments are only found at the top of the document
+    nskip = 0
+    pos = 0
+    while text.startswith("#", pos):
+        pos = text.find("\n", pos) + 1
+        if not pos:
+            return
+        nskip += 1
+
+    if not text[pos:].startswith("agency_cd"):
+        return
+
+    # a callable, unlike a list, tolerates columns missing from the response
+    usecols = frozenset(columns).__contains__ if columns else None
+
+    # skip the comments and the column type line that follows the header
+    df = pd.read_csv(
+        io.StringIO(text),
+        sep="\t",
+        skiprows=list(range(nskip)) + [nskip + 1],
+        dtype=str,
+        keep_default_na=False,
+        usecols=usecols,
+    )
+    return df
+
+
+# the gwlevels columns used downstream. everything else is dropped while parsing
+GWLEVELS_COLUMNS = ("site_no", "lev_dt", "lev_tm", "lev_va")
 
 
 class USGSSiteSource(BaseSiteSource):
     transformer_klass = USGSSiteTransformer
     chunk_size = 500
+    # site lists change slowly
+    cache_ttl = 7 * 24 * 3600
 
     def get_records(self):
         params = {"format": "rdb", "siteOutput": "expanded", "siteType": "GW"}
@@ -69,19 +142,51 @@ class USGSSiteSource(BaseSiteSource):
         if config.end_date:
             params["endDt"] = config.end_date
 
-        text = self._execute_text_request(
+        lines = self._execute_lines_request(
             "https://waterservices.usgs.gov/nwis/site/", params
         )
-        if text:
-            records = parse_rdb(text)
+        records = list(iter_rdb(lines))
+        if records:
             self.log(f"Retrieved {len(records)} records")
             return records
 
 
 class USGSWaterLevelSource(BaseWaterLevelSource):
     transformer_klass = USGSWaterLevelTransformer
+    site_key = "site_no"
+    most_recent_tag = ("lev_dt", "lev_tm")
+    url = "https://waterservices.usgs.gov/nwis/gwlevels/"
+
+    frame_site_column = "site_no"
+    frame_value_column = "lev_va"
+    frame_date_columns = ("lev_dt", "lev_tm")
+
+    def get_frame(self, parent_record):
+        text = self._execute_text_request(self.url, self._get_params(parent_record))
+        if text:
+            return parse_rdb_frame(text, GWLEVELS_COLUMNS)
 
     def get_records(self, parent_record):
+        """
+        Return an iterator over the rows of the response as they arrive. load
+        consumes it without holding the whole response
+        """
+        lines = self._execute_lines_request(self.url, self._get_params(parent_record))
+        return iter_rdb(lines, GWLEVELS_COLUMNS)
+
+    async def get_records_async(self, parent_record):
+        return self._iter_records_async(parent_record)
+
+    async def _iter_records_async(self, parent_record):
+        parser = RDBParser(GWLEVELS_COLUMNS)
+        async for line in self._execute_lines_request_async(
+            self.url, self._get_params(parent_record)
+        ):
+            row = parser.parse_line(line)
+            if row is not None:
+                yield row
+
+    def _get_params(self, parent_record):
         params = {
             "format": "rdb",
             "siteType": "GW",
@@ -96,17 +201,7 @@ class USGSWaterLevelSource(BaseWaterLevelSource):
 
         if config.end_date:
             params["endDt"] = config.end_date
-
-        text = self._execute_text_request(
-            "https://waterservices.usgs.gov/nwis/gwlevels/", params
-        )
-        if text:
-            records = parse_rdb(text)
-            self.log(f"Retrieved {len(records)} records")
-            return records
-
-    def _extract_parent_records(self, records, parent_record):
-        return [ri for ri in records if ri["site_no"] == parent_record.id]
+        return params
 
     def _clean_records(self, records):
         return [r for r in records if r["lev_va"] is not None and r["lev_va"].strip()]
@@ -115,7 +210,7 @@ class USGSWaterLevelSource(BaseWaterLevelSource):
         return [float(r["lev_va"]) for r in records]
 
     def _extract_most_recent(self, records):
-        record = get_most_recent(records, "lev_dt")
+        record = get_most_recent(records, self.most_recent_tag)
         return {
             "value": float(record["lev_va"]),
             "datetime": (record["lev_dt"], record["lev_tm"]),
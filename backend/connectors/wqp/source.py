@@ -13,10 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import io
 import pprint
 
-import httpx
-
 from backend.connectors.mappings import WQP_ANALYTE_MAPPING
 from backend.constants import (
     TDS,
@@ -43,7 +42,16 @@ from backend.source import (
 def parse_tsv(text):
     rows = text.split("\n")
     header = rows[0].split("\t")
-    return [dict(zip(header, row.split("\t"))) for row in rows[1:]]
+    return [dict(zip(header, row.split("\t"))) for row in rows[1:] if row]
+
+
+def parse_tsv_frame(text):
+    """
+    Decode a tab separated document into a pandas DataFrame of strings
+    """
+    import pandas as pd
+
+    return pd.read_csv(io.StringIO(text), sep="\t", dtype=str, keep_default_na=False)
 
 
 def get_date_range(config):
@@ -58,6 +66,8 @@ def get_date_range(config):
 class WQPSiteSource(BaseSiteSource):
     transformer_klass = WQPSiteTransformer
     chunk_size = 100
+    # site lists change slowly
+    cache_ttl = 7 * 24 * 3600
 
     def get_records(self):
         config = self.config
@@ -81,6 +91,19 @@ class WQPSiteSource(BaseSiteSource):
 
 class WQPAnalyteSource(BaseAnalyteSource):
     transformer_klass = WQPAnalyteTransformer
+    site_key = "MonitoringLocationIdentifier"
+    most_recent_tag = "ActivityStartDate"
+    url = "https://www.waterqualitydata.us/data/Result/search?"
+
+    frame_site_column = "MonitoringLocationIdentifier"
+    frame_value_column = "ResultMeasureValue"
+    frame_units_column = "ResultMeasure/MeasureUnitCode"
+    frame_date_columns = ("ActivityStartDate",)
+
+    def get_frame(self, parent_record):
+        text = self._execute_text_request(self.url, self._get_params(parent_record))
+        if text:
+            return parse_tsv_frame(text)
 
     def _extract_parameter_record(self, record):
         record[PARAMETER_VALUE] = record["ResultMeasureValue"]
@@ -88,13 +111,6 @@ class WQPAnalyteSource(BaseAnalyteSource):
         record[DT_MEASURED] = record["ActivityStartDate"]
         return record
 
-    def _extract_parent_records(self, records, parent_record):
-        return [
-            ri
-            for ri in records
-            if ri["MonitoringLocationIdentifier"] == parent_record.id
-        ]
-
     def _extract_parameter_results(self, records):
         return [ri["ResultMeasureValue"] for ri in records]
 
@@ -105,7 +121,7 @@ class WQPAnalyteSource(BaseAnalyteSource):
         return [ri["ResultMeasure/MeasureUnitCode"] for ri in records]
 
     def _extract_most_recent(self, records):
-        ri = get_most_recent(records, "ActivityStartDate")
+        ri = get_most_recent(records, self.most_recent_tag)
         return {
             "value": ri["ResultMeasureValue"],
             "datetime": ri["ActivityStartDate"],
@@ -113,6 +129,18 @@ class WQPAnalyteSource(BaseAnalyteSource):
         }
 
     def get_records(self, parent_record):
+        text = self._execute_text_request(self.url, self._get_params(parent_record))
+        if text:
+            return parse_tsv(text)
+
+    async def get_records_async(self, parent_record):
+        text = await self._execute_text_request_async(
+            self.url, self._get_params(parent_record)
+        )
+        if text:
+            return parse_tsv(text)
+
+    def _get_params(self, parent_record):
         sites = make_site_list(parent_record)
 
         params = {
@@ -123,12 +151,7 @@ class WQPAnalyteSource(BaseAnalyteSource):
             ),
         }
         params.update(get_date_range(self.config))
-
-        text = self._execute_text_request(
-            "https://www.waterqualitydata.us/data/Result/search?", params
-        )
-        if text:
-            return parse_tsv(text)
+        return params
 
 
 # ============= EOF =============================================
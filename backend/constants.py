@@ -66,4 +66,6 @@ ANALYTE_CHOICES = [
     URANIUM,
     PH,
 ]
+
+OUTPUT_FORMATS = ["csv", "geojson", "geojsonseq", "gpkg", "parquet"]
 # ============= EOF =============================================
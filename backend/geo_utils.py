@@ -13,11 +13,59 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
-import pyproj
+from typing import Dict
+
+import numpy as np
+
+# pyproj and shapely are imported where they are used, they are slow to import
 
 PROJECTIONS = {}
 TRANSFORMS = {}
 
+DATUM_ALIASES = {
+    "NAD27": "EPSG:4267",
+    "NAD83": "EPSG:4269",
+    "WGS84": "EPSG:4326",
+}
+
+
+def normalize_datum(datum):
+    """
+    Return the EPSG code, e.g. "EPSG:4269", for a datum name or code. Returns None
+    for datums that pyproj does not know
+    """
+    if not datum:
+        return
+
+    key = str(datum).strip().upper()
+    code = DATUM_ALIASES.get(key)
+    if code is None:
+        import pyproj
+
+        try:
+            epsg = pyproj.CRS.from_user_input(key).to_epsg()
+        except pyproj.exceptions.CRSError:
+            epsg = None
+        code = f"EPSG:{epsg}" if epsg else None
+        DATUM_ALIASES[key] = code
+    return code
+
+
+def get_transformer(in_datum, out_datum):
+    """
+    Return a cached pyproj Transformer between two EPSG codes. always_xy is set so
+    coordinates are always (longitude, latitude)
+    """
+    key = (in_datum, out_datum)
+    pr = TRANSFORMS.get(key)
+    if pr is None:
+        import pyproj
+
+        pr = TRANSFORMS[key] = pyproj.Transformer.from_crs(
+            in_datum, out_datum, always_xy=True
+        )
+    return pr
+
 
 def datum_transform(x, y, in_datum, out_datum):
     """
@@ -26,36 +74,254 @@ def datum_transform(x, y, in_datum, out_datum):
     Parameters
     --------
     x: float
-        easting
+        longitude
     y: float
-        northing
+        latitude
     datum: str
         datum name
 
     Returns
     --------
     tuple
-        (easting, northing)
+        (longitude, latitude)
     """
-    if in_datum == "NAD27":
-        in_datum = "EPSG:4267"
-    elif in_datum == "NAD83":
-        in_datum = "EPSG:4269"
+    in_code = normalize_datum(in_datum)
+    out_code = normalize_datum(out_datum)
+    if in_code is None or out_code is None:
+        raise ValueError(f"Unknown datum {in_datum} or {out_datum}")
 
-    if out_datum == "WGS84":
-        out_datum = "EPSG:4326"
+    if in_code == out_code:
+        return x, y
 
-    name = f"datum{out_datum}{in_datum}"
-    if name not in TRANSFORMS:
-        pr = pyproj.Transformer.from_proj(
-            pyproj.Proj(in_datum),
-            pyproj.Proj(out_datum),
+    return get_transformer(in_code, out_code).transform(x, y)
+
+
+def datum_transform_batch(xs, ys, in_datums, out_datum):
+    """
+    Transform arrays of longitudes and latitudes, each with its own datum, to
+    out_datum. Points are grouped by datum and each group is transformed with one
+    array call.
+
+    Points whose datum is unknown are left as is and keep their datum. Returns
+    (xs, ys, datums) as lists
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    out_code = normalize_datum(out_datum)
+
+    groups = {}
+    for i, d in enumerate(in_datums):
+        groups.setdefault(d, []).append(i)
+
+    nxs, nys = xs.copy(), ys.copy()
+    datums = [out_datum] * len(xs)
+    for d, idx in groups.items():
+        if not d:
+            # no datum. assume it is already out_datum
+            continue
+
+        in_code = normalize_datum(d)
+        if in_code is None or out_code is None:
+            for i in idx:
+                datums[i] = d
+            continue
+
+        if in_code == out_code:
+            continue
+
+        idx = np.asarray(idx)
+        nxs[idx], nys[idx] = get_transformer(in_code, out_code).transform(
+            xs[idx], ys[idx]
         )
-        TRANSFORMS[name] = pr
 
-    pr = TRANSFORMS[name]
-    lng, lat = pr.transform(x, y)
-    return lng, lat
+    return nxs.tolist(), nys.tolist(), datums
+
+
+class SpatialFilter:
+    """
+    Point in polygon test against a prepared geometry.
+
+    Points outside the geometry's bounding box are rejected before the exact
+    test. contains_xy tests whole arrays of points in one call
+    """
+
+    def __init__(self, wkt):
+        import shapely
+
+        self.wkt = wkt
+        self.geometry = shapely.from_wkt(wkt)
+        shapely.prepare(self.geometry)
+        self.bounds = self.geometry.bounds
+
+    def contains(self, lng, lat):
+        minx, miny, maxx, maxy = self.bounds
+        lng, lat = float(lng), float(lat)
+        if not (minx <= lng <= maxx and miny <= lat <= maxy):
+            return False
+
+        import shapely
+
+        return bool(shapely.contains_xy(self.geometry, lng, lat))
+
+    def contains_xy(self, lngs, lats):
+        """
+        Return a boolean array, True for each point inside the geometry
+        """
+        import shapely
+
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+
+        minx, miny, maxx, maxy = self.bounds
+        mask = (lngs >= minx) & (lngs <= maxx) & (lats >= miny) & (lats <= maxy)
+        idx = np.flatnonzero(mask)
+        if len(idx):
+            mask[idx] = shapely.contains_xy(self.geometry, lngs[idx], lats[idx])
+        return mask
+
+
+SPATIAL_FILTERS: Dict[str, "SpatialFilter"] = {}
+
+
+def get_spatial_filter(wkt):
+    """
+    Return a cached SpatialFilter for wkt
+    """
+    sf = SPATIAL_FILTERS.get(wkt)
+    if sf is None:
+        if len(SPATIAL_FILTERS) >= 16:
+            SPATIAL_FILTERS.clear()
+        sf = SPATIAL_FILTERS[wkt] = SpatialFilter(wkt)
+    return sf
+
+
+class AreaOfInterest:
+    """
+    The area a run is limited to, resolved once from a county, bbox or wkt.
+
+    Immutable. Holds the WKT, the (minx, miny, maxx, maxy) bounds rounded to 7
+    decimals, the prepared geometry, through its SpatialFilter, and simplified
+    variants and pushdown supersets for services that want a small WKT. Use
+    Config.get_area
+    """
+
+    __slots__ = ("wkt", "bounds", "filter", "_simplified", "_pushdown")
+
+    # default simplify tolerance, in degrees. about 100 m
+    simplify_tolerance = 0.001
+    # default pushdown tolerance, in degrees. about 1 km
+    pushdown_tolerance = 0.01
+    # decimals kept in pushdown WKT. about 10 cm
+    pushdown_precision = 6
+
+    def __init__(self, wkt):
+        sf = get_spatial_filter(wkt)
+        bounds = tuple(round(b, 7) for b in sf.bounds)
+        object.__setattr__(self, "wkt", wkt)
+        object.__setattr__(self, "bounds", bounds)
+        object.__setattr__(self, "filter", sf)
+        object.__setattr__(self, "_simplified", {})
+        object.__setattr__(self, "_pushdown", {})
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    @property
+    def geometry(self):
+        return self.filter.geometry
+
+    def contains(self, lng, lat):
+        return self.filter.contains(lng, lat)
+
+    def contains_xy(self, lngs, lats):
+        return self.filter.contains_xy(lngs, lats)
+
+    def simplified(self, tolerance=None):
+        """
+        Return the WKT of the geometry simplified to tolerance degrees
+        """
+        if tolerance is None:
+            tolerance = self.simplify_tolerance
+
+        wkt = self._simplified.get(tolerance)
+        if wkt is None:
+            geometry = self.geometry.simplify(tolerance, preserve_topology=True)
+            wkt = self._simplified[tolerance] = geometry.wkt
+        return wkt
+
+    def pushdown(self, tolerance=None):
+        """
+        Return the geometry to send to a service that filters spatially, a
+        simplified superset of the area that is small enough for a query string.
+
+        The area is simplified to tolerance degrees, with topology preserved, and
+        then buffered by tolerance so no point of the area is lost. If the result
+        does not cover the area its buffered convex hull is used instead, and the
+        area itself if neither has fewer vertices. Records the service returns
+        still have to be filtered with contains/contains_xy
+        """
+        if tolerance is None:
+            tolerance = self.pushdown_tolerance
+
+        geometry = self._pushdown.get(tolerance)
+        if geometry is None:
+            geometry = self.geometry
+            if tolerance > 0:
+                geometry = self._make_pushdown(tolerance)
+            self._pushdown[tolerance] = geometry
+        return geometry
+
+    def pushdown_wkt(self, tolerance=None):
+        """
+        Return the WKT of pushdown(tolerance). The WKT of the area itself is
+        returned when tolerance is 0 or simplifying does not make it smaller
+        """
+        geometry = self.pushdown(tolerance)
+        if geometry is self.geometry:
+            return self.wkt
+
+        import shapely
+
+        return shapely.to_wkt(geometry, rounding_precision=self.pushdown_precision)
+
+    def false_positive_rate(self, tolerance=None):
+        """
+        Return the fraction of pushdown(tolerance) that is outside the area, i.e.
+        the share of evenly spread records a service returns that the local
+        filter drops
+        """
+        area = self.pushdown(tolerance).area
+        if not area:
+            return 0.0
+        return max(0.0, 1 - self.geometry.area / area)
+
+    def _make_pushdown(self, tolerance):
+        import shapely
+
+        geometry = self.geometry
+        precision = self.pushdown_precision
+        # simplify keeps every vertex within tolerance of the simplified
+        # boundary, so buffering the result by tolerance covers the area. leave
+        # room for moving the vertices to precision decimals as well
+        margin = tolerance + 10**-precision
+        simplified = geometry.simplify(tolerance, preserve_topology=True)
+        for superset in (
+            simplified.buffer(margin, join_style="mitre"),
+            geometry.convex_hull.buffer(margin, join_style="mitre"),
+        ):
+            superset = shapely.from_wkt(
+                shapely.to_wkt(superset, rounding_precision=precision)
+            )
+            if superset.covers(geometry):
+                break
+        else:
+            return geometry
+
+        # small areas, e.g. a bbox, are sent as they are
+        nvertices = shapely.get_num_coordinates
+        if nvertices(superset) < nvertices(geometry):
+            return superset
+        return geometry
 
 
 def utm_to_lonlat(e, n, zone=13):
@@ -76,6 +342,8 @@ def utm_to_lonlat(e, n, zone=13):
     """
     name = f"utm{zone}"
     if name not in PROJECTIONS:
+        import pyproj
+
         pr = pyproj.Proj(proj="utm", zone=int(zone), ellps="WGS84")
         PROJECTIONS[name] = pr
     pr = PROJECTIONS[name]
@@ -102,6 +370,8 @@ def lonlat_to_utm(lon, lat, zone=13):
     """
     name = "lonlat"
     if name not in PROJECTIONS:
+        import pyproj
+
         pr = pyproj.Proj(proj="utm", ellps="WGS84", zone=zone)
         PROJECTIONS[name] = pr
 
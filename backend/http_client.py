@@ -0,0 +1,223 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import codecs
+import threading
+from urllib.parse import urlsplit
+
+import click
+import httpx
+
+from backend.request_policy import RequestPolicy
+
+DEFAULT_TIMEOUT = 10
+
+
+def get_host(url):
+    """
+    Return the scheme and network location of url. Used to key the pooled clients
+    """
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+class LineSplitter:
+    """
+    Incrementally decode a byte stream into lines
+    """
+
+    def __init__(self, encoding="utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = ""
+
+    def feed(self, chunk):
+        text = self._pending + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._pending = lines.pop()
+        return [line.rstrip("\r") for line in lines]
+
+    def flush(self):
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        if text:
+            return [text.rstrip("\r")]
+        return []
+
+
+class ClientPool:
+    """
+    A set of long-lived httpx.Client objects, one per host.
+
+    Each client keeps its connections alive so repeated requests to the same host
+    only pay the TCP/TLS handshake once. Requests go through policy, a
+    RequestPolicy, for rate limiting, retries and circuit breaking. transport is
+    passed to every client, e.g. an httpx.MockTransport in tests
+    """
+
+    def __init__(
+        self,
+        http2=False,
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry=30,
+        policy=None,
+        transport=None,
+    ):
+        if http2 and not http2_available():
+            click.secho(
+                "http2 requested but the 'h2' package is not installed. Using http/1.1",
+                fg="red",
+            )
+            http2 = False
+
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.policy = policy
+        self.transport = transport
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, url):
+        host = get_host(url)
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = httpx.Client(
+                    http2=self.http2,
+                    limits=self.limits,
+                    timeout=DEFAULT_TIMEOUT,
+                    transport=self.transport,
+                )
+                self._clients[host] = client
+        return client
+
+    def get(self, url, params=None, **kw):
+        client = self.get_client(url)
+        if self.policy is None:
+            return client.get(url, params=params, **kw)
+
+        return self.policy.execute(url, lambda: client.get(url, params=params, **kw))
+
+    def stream(self, url, params=None, **kw):
+        """
+        Send a GET request without reading the body. The caller must close the
+        returned response
+        """
+        client = self.get_client(url)
+
+        def send():
+            request = client.build_request("GET", url, params=params, **kw)
+            return client.send(request, stream=True)
+
+        if self.policy is None:
+            return send()
+        return self.policy.execute(url, send)
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+
+
+class AsyncClientPool:
+    """
+    asyncio counterpart of ClientPool. Must be created and closed inside the running
+    event loop
+    """
+
+    def __init__(
+        self,
+        http2=False,
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry=30,
+        policy=None,
+        transport=None,
+    ):
+        if http2 and not http2_available():
+            http2 = False
+
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.policy = policy
+        self.transport = transport
+        self._clients = {}
+
+    def get_client(self, url):
+        host = get_host(url)
+        client = self._clients.get(host)
+        if client is None:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=DEFAULT_TIMEOUT,
+                transport=self.transport,
+            )
+            self._clients[host] = client
+        return client
+
+    async def get(self, url, params=None, **kw):
+        client = self.get_client(url)
+        if self.policy is None:
+            return await client.get(url, params=params, **kw)
+
+        return await self.policy.execute_async(
+            url, lambda: client.get(url, params=params, **kw)
+        )
+
+    async def stream(self, url, params=None, **kw):
+        client = self.get_client(url)
+
+        async def send():
+            request = client.build_request("GET", url, params=params, **kw)
+            return await client.send(request, stream=True)
+
+        if self.policy is None:
+            return await send()
+        return await self.policy.execute_async(url, send)
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients = {}
+
+
+# pool used when no Config is available, e.g. by backend.bounding_polygons
+DEFAULT_POOL = ClientPool(policy=RequestPolicy())
+
+
+def get(url, params=None, **kw):
+    return DEFAULT_POOL.get(url, params=params, **kw)
+
+
+# ============= EOF =============================================
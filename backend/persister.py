@@ -15,19 +15,24 @@
 # ===============================================================================
 import csv
 import io
+import json
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 import click
-import pandas as pd
-import geopandas as gpd
 
+from backend.batch import RecordBatch, arrow_table
 from backend.record import SiteRecord
 
-try:
-    from google.cloud import storage
-except ImportError:
-    print("google cloud storage not available")
+from backend.cloud_storage import (
+    BlobStream,
+    DEFAULT_STORAGE_URL,
+    open_bucket,
+    parse_storage_url,
+)
 
 
 class Loggable:
@@ -37,6 +42,9 @@ class Loggable:
 
 class BasePersister(Loggable):
     extension: str
+    # write timeseries to a single file with a sites index instead of a file per
+    # site
+    consolidate_timeseries = False
 
     def __init__(self):
         self.records = []
@@ -47,6 +55,17 @@ class BasePersister(Loggable):
     def load(self, records):
         self.records.extend(records)
 
+    def add_combined(self, site, record):
+        self.combined.append((site, record))
+
+    def add_timeseries(self, site, records):
+        self.timeseries.append((site, records))
+
+    def flush(self):
+        """
+        Called after each chunk of results. Buffering persisters have nothing to do
+        """
+
     def dump_timeseries(self, root):
         if self.timeseries:
             if os.path.isdir(root):
@@ -54,12 +73,16 @@ class BasePersister(Loggable):
                 shutil.rmtree(root)
 
             os.mkdir(root)
+            if self.consolidate_timeseries:
+                self.log(f"dumping consolidated timeseries to {os.path.abspath(root)}")
+                self._dump_consolidated(root, self.timeseries)
+                return
 
             for site, records in self.timeseries:
                 path = os.path.join(root, str(site.id).replace(" ", "_"))
                 path = self.add_extension(path)
                 self.log(f"dumping {site.id} to {os.path.abspath(path)}")
-                self._write(path, records)
+                self._write_timeseries(path, site, records)
 
             self._write(
                 os.path.join(root, self.add_extension("sites")),
@@ -99,50 +122,247 @@ class BasePersister(Loggable):
     def _dump_combined(self, path, combined):
         raise NotImplementedError
 
+    def _write_timeseries(self, path, site, records):
+        self._write(path, records)
+
+    def _dump_consolidated(self, root, timeseries):
+        store = self._open_timeseries_store(root)
+        for site, records in timeseries:
+            store.add(site, records)
+        store.close()
+
+    def _open_timeseries_store(self, root):
+        raise NotImplementedError
+
+
+def iter_rows(records):
+    """
+    Return (keys, rows) for a list of records or a RecordBatch
+    """
+    if isinstance(records, RecordBatch):
+        return records.keys, records.rows()
+
+    if not records:
+        return (), iter(())
+    return records[0].keys, (r.to_row() for r in records)
+
+
+def iter_columns(records):
+    """
+    Return (keys, columns) for a list of records or a RecordBatch
+    """
+    if isinstance(records, RecordBatch):
+        return records.keys, records.to_columns()
+
+    if not records:
+        return (), []
+    return records[0].keys, [list(c) for c in zip(*(r.to_row() for r in records))]
+
+
+def iter_site_rows(site, records):
+    """
+    Return (keys, rows) for records with the site's values prepended to each row
+    """
+    keys, rows = iter_rows(records)
+    if not keys:
+        return keys, rows
+
+    srow = site.to_row()
+    return tuple(site.keys) + tuple(keys), (srow + list(row) for row in rows)
+
+
+def write_rows(writer, records):
+    keys, rows = iter_rows(records)
+    if keys:
+        writer.writerow(keys)
+        writer.writerows(rows)
+
 
 def write_file(path, func):
     with open(path, "w") as f:
         func(csv.writer(f))
 
 
-def write_memory(func):
-    f = io.StringIO()
-    func(f, csv.writer(f))
+class CloudStoragePersister(BasePersister):
+    """
+    Uploads csv output to Google Cloud Storage, or to a LocalBucket for file://
+    urls.
 
+    Each object is written through a resumable upload of chunk_size bytes, so a
+    failed request is retried from the last uploaded chunk instead of from the
+    start. Results are still held until the end of the run, like the other
+    buffering persisters; StreamingCloudStoragePersister uploads them as they
+    arrive. With gzip objects are compressed and stored with Content-Encoding
+    gzip, and the offsets of the consolidated sites.csv are into the
+    uncompressed timeseries.csv.
+
+    Timeseries files are uploaded by upload_workers threads. The consolidated
+    layout is uploaded as parts of sites_per_part sites, in parallel, which are
+    then composed into a single timeseries.csv
+    """
 
-class CloudStoragePersister(BasePersister):
     extension = "csv"
+    # resumable upload chunk size. must be a multiple of 256 KiB
+    chunk_size = 8 * 1024 * 1024
+    upload_workers = 8
+    sites_per_part = 1000
+    # number of rows encoded per write
+    rows_per_write = 1000
 
-    def _write(self, path, records):
-        def func(f, writer):
-            for i, site in enumerate(records):
-                if i == 0:
-                    writer.writerow(site.keys)
+    def __init__(self, url=DEFAULT_STORAGE_URL, gzip=False):
+        super().__init__()
+        self.url = url
+        self.gzip = gzip
+        self._prefix = parse_storage_url(url)[2]
+        self._bucket = None
 
-                writer.writerow(site.to_row())
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = open_bucket(self.url)
+        return self._bucket
+
+    def dump_timeseries(self, root):
+        if not self.timeseries:
+            self.log("no timeseries records to dump", fg="red")
+            return
 
-            self._upload(path, f.getvalue())
+        self.log(f"uploading timeseries to {self._blob_name(root)}")
+        if self.consolidate_timeseries:
+            self._dump_consolidated(root, self.timeseries)
+            return
 
-        write_memory(func)
+        def upload(pair):
+            site, records = pair
+            path = f"{root}/{str(site.id).replace(' ', '_')}"
+            self._write(self.add_extension(path), records)
 
-    def _upload(self, path, cnt):
-        storage_client = storage.Client()
-        bucket = storage_client.bucket("waterdatainitiative")
-        path = f"die/{path}"
-        blob = bucket.blob(path)
-        blob.upload_from_string(cnt.encode("utf-8"))
+        with ThreadPoolExecutor(self.upload_workers) as executor:
+            list(executor.map(upload, self.timeseries))
+
+        self._write(
+            f"{root}/{self.add_extension('sites')}", [s[0] for s in self.timeseries]
+        )
+
+    def _write(self, path, records):
+        self._write_rows(path, *iter_rows(records))
 
     def _dump_combined(self, path, combined):
-        def func(f, writer):
-            for i, (site, record) in enumerate(combined):
-                if i == 0:
-                    writer.writerow(site.keys + record.keys)
+        site, record = combined[0]
+        rows = (s.to_row() + r.to_row() for s, r in combined)
+        self._write_rows(path, site.keys + record.keys, rows)
 
-                writer.writerow(site.to_row() + record.to_row())
+    def _dump_consolidated(self, root, timeseries):
+        keys = None
+        for site, records in timeseries:
+            keys, _ = iter_rows(records)
+            if keys:
+                break
+        else:
+            return
+
+        n = self.sites_per_part
+        parts = [timeseries[i : i + n] for i in range(0, len(timeseries), n)]
+        names = [f"{root}/timeseries.csv.part{i:05d}" for i in range(len(parts) + 1)]
+
+        header = self._open_blob(names[0])
+        header.write(encode_rows([("id",) + tuple(keys)]))
+        header.commit()
+
+        with ThreadPoolExecutor(self.upload_workers) as executor:
+            results = list(executor.map(self._upload_part, names[1:], parts))
+
+        # offsets in each part are relative to the part
+        index = []
+        offset = header.nbytes
+        for nbytes, rows in results:
+            for row in rows:
+                row[-3] += offset
+            index.extend(rows)
+            offset += nbytes
 
-            self._upload(path, f.getvalue())
+        self._compose(f"{root}/{TIMESERIES_NAME}", names)
+        self._write_rows(
+            f"{root}/{SITES_NAME}", tuple(site.keys) + self.site_index_keys(), index
+        )
+
+    def site_index_keys(self):
+        """
+        Columns of the consolidated sites.csv index. The byte offsets point into
+        the uncompressed timeseries.csv, which the column names say when gzip is
+        on
+        """
+        if self.gzip:
+            return GZIP_SITE_INDEX_KEYS
+        return SITE_INDEX_KEYS
+
+    def _upload_part(self, name, pairs):
+        stream = self._open_blob(name)
+        index = []
+        for site, records in pairs:
+            data, nrows = encode_site_rows(site, records)
+            if nrows:
+                index.append(site.to_row() + [stream.nbytes, len(data), nrows])
+                stream.write(data)
+        stream.commit()
+        return stream.nbytes, index
+
+    def _compose(self, path, names):
+        """
+        Compose the blobs names into path and delete them. Compose takes at most
+        32 sources, so larger sets are composed in stages
+        """
+        bucket = self.bucket
+        sources = [bucket.blob(self._blob_name(n)) for n in names]
+        stage = 0
+        while len(sources) > 32:
+            composed = []
+            for i in range(0, len(sources), 32):
+                blob = self._new_blob(f"{path}.compose{stage}_{i // 32:05d}")
+                blob.compose(sources[i : i + 32])
+                composed.append(blob)
+            for blob in sources:
+                blob.delete()
+            sources = composed
+            stage += 1
 
-        write_memory(func)
+        self._new_blob(path).compose(sources)
+        for blob in sources:
+            blob.delete()
+
+    def _write_rows(self, path, keys, rows):
+        if not keys:
+            return
+
+        stream = self._open_blob(path)
+        stream.write(encode_rows([keys]))
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.rows_per_write))
+            if not chunk:
+                break
+            stream.write(encode_rows(chunk))
+        stream.commit()
+
+    def _open_blob(self, path):
+        blob = self._new_blob(path)
+        f = blob.open(
+            "wb",
+            chunk_size=self.chunk_size,
+            ignore_flush=True,
+            content_type=blob.content_type,
+        )
+        return BlobStream(f, self.gzip)
+
+    def _new_blob(self, path):
+        blob = self.bucket.blob(self._blob_name(path))
+        blob.content_type = "text/csv"
+        if self.gzip:
+            blob.content_encoding = "gzip"
+        return blob
+
+    def _blob_name(self, path):
+        return "/".join(p for p in (self._prefix, path) if p)
 
 
 class CSVPersister(BasePersister):
@@ -150,10 +370,7 @@ class CSVPersister(BasePersister):
 
     def _write(self, path, records):
         def func(writer):
-            for i, site in enumerate(records):
-                if i == 0:
-                    writer.writerow(site.keys)
-                writer.writerow(site.to_row())
+            write_rows(writer, records)
 
         write_file(path, func)
 
@@ -167,18 +384,632 @@ class CSVPersister(BasePersister):
 
         write_file(path, func)
 
+    def _open_stream(self, path):
+        return CSVStream(path)
+
+    def _open_timeseries_store(self, root):
+        return TimeseriesStore(root)
+
+
+class CSVStream:
+    """
+    A csv file written incrementally to path.partial and moved to path, in one
+    atomic rename, by commit. If the run dies the partial file is left behind
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.partial = f"{path}.partial"
+        self._file = open(self.partial, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._header = False
+        self.nrows = 0
+
+    def write(self, keys, rows):
+        if not self._header:
+            self._writer.writerow(keys)
+            self._header = True
+
+        for row in rows:
+            self._writer.writerow(row)
+            self.nrows += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.partial, self.path)
+
+
+TIMESERIES_NAME = "timeseries.csv"
+SITES_NAME = "sites.csv"
+# columns appended to the site keys in a consolidated sites.csv
+SITE_INDEX_KEYS = ("offset", "nbytes", "nrows")
+# the same, for a gzip compressed timeseries.csv. offsets are into the
+# decompressed file
+GZIP_SITE_INDEX_KEYS = ("uncompressed_offset", "uncompressed_nbytes", "nrows")
+
+
+class TimeseriesStore:
+    """
+    Consolidated timeseries layout. Every site's records are appended to one long
+    csv, root/timeseries.csv, with the site id as the first column. Each site's
+    rows are contiguous, and root/sites.csv records where they are: the byte
+    offset and length of the block and its number of rows. See
+    read_site_timeseries
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._data = open(os.path.join(root, TIMESERIES_NAME), "wb")
+        self._sites = open(os.path.join(root, SITES_NAME), "w", newline="")
+        self._sites_writer = csv.writer(self._sites)
+        self._header = False
+        self.nsites = 0
+
+    def add(self, site, records):
+        keys, rows = iter_rows(records)
+        if not keys:
+            return
+
+        if not self._header:
+            self._data.write(encode_rows([("id",) + tuple(keys)]))
+            self._sites_writer.writerow(tuple(site.keys) + SITE_INDEX_KEYS)
+            self._header = True
+
+        data, nrows = encode_site_rows(site, records)
+        offset = self._data.tell()
+        self._data.write(data)
+        self._sites_writer.writerow(site.to_row() + [offset, len(data), nrows])
+        self.nsites += 1
+
+    def flush(self):
+        self._data.flush()
+        self._sites.flush()
+
+    def close(self):
+        self._data.close()
+        self._sites.close()
+
+
+def encode_rows(rows):
+    f = io.StringIO()
+    csv.writer(f).writerows(rows)
+    return f.getvalue().encode("utf-8")
+
+
+def encode_site_rows(site, records):
+    """
+    Return (data, nrows), the utf-8 csv rows of a site's records in the
+    consolidated timeseries layout, with the site id as the first column
+    """
+    keys, rows = iter_rows(records)
+    if not keys:
+        return b"", 0
+
+    sid = site.id
+    rows = [(sid, *row) for row in rows]
+    return encode_rows(rows), len(rows)
+
+
+def read_sites_index(root):
+    """
+    Return {site id: (offset, nbytes, nrows)} from a consolidated sites.csv. For
+    gzip output the offsets are into the decompressed timeseries.csv
+    """
+    with open(os.path.join(root, SITES_NAME), newline="") as f:
+        reader = csv.DictReader(f)
+        keys = SITE_INDEX_KEYS
+        if GZIP_SITE_INDEX_KEYS[0] in (reader.fieldnames or ()):
+            keys = GZIP_SITE_INDEX_KEYS
+        return {row["id"]: tuple(int(row[k]) for k in keys) for row in reader}
+
+
+def read_site_timeseries(root, site_id, index=None):
+    """
+    Return one site's rows, as dicts, from consolidated timeseries output. root is
+    either a TimeseriesStore directory or a ParquetPersister timeseries file.
+    Pass the result of read_sites_index as index when reading many sites
+    """
+    if root.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        # rows are sorted by source and id, so row group statistics skip
+        # everything but the groups holding this site
+        table = pq.read_table(root, filters=[("id", "=", str(site_id))])
+        return table.to_pylist()
+
+    if index is None:
+        index = read_sites_index(root)
+
+    entry = index.get(str(site_id))
+    if entry is None:
+        return []
+
+    offset, nbytes, _ = entry
+    with open(os.path.join(root, TIMESERIES_NAME), "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]))
+        f.seek(offset)
+        data = f.read(nbytes).decode("utf-8")
+
+    return [dict(zip(header, row)) for row in csv.reader(io.StringIO(data))]
+
+
+class StreamingPersister(BasePersister):
+    """
+    Writes results as each chunk arrives instead of holding the whole run in
+    memory. Combine with a persister that implements _open_stream, e.g.
+    StreamingCSVPersister.
+
+    Outputs are written to .partial files, flushed at most every flush_interval
+    seconds, and renamed into place by save/dump_combined/dump_timeseries
+    """
+
+    flush_interval = 5
+
+    def __init__(self, output_path):
+        super().__init__()
+        self.output_path = output_path
+        self._streams = {}
+        self._timeseries_root = None
+        self._timeseries_sites = None
+        self._last_flush = time.monotonic()
+
+    def load(self, records):
+        path = self.add_extension(self.output_path)
+        stream = self._get_stream(path)
+        keys, rows = iter_rows(records)
+        if keys:
+            stream.write(keys, rows)
+
+    def add_combined(self, site, record):
+        path = self.add_extension(f"{self.output_path}.combined")
+        stream = self._get_stream(path)
+        stream.write(site.keys + record.keys, [site.to_row() + record.to_row()])
+
+    def add_timeseries(self, site, records):
+        root = self._get_timeseries_root()
+        if self.consolidate_timeseries:
+            if self._timeseries_sites is None:
+                self._timeseries_sites = self._open_timeseries_store(root)
+            self._timeseries_sites.add(site, records)
+            return
+
+        path = os.path.join(root, str(site.id).replace(" ", "_"))
+        self._write_timeseries(self.add_extension(path), site, records)
+
+        if self._timeseries_sites is None:
+            self._timeseries_sites = self._open_stream(
+                os.path.join(root, self.add_extension("sites"))
+            )
+        self._timeseries_sites.write(site.keys, [site.to_row()])
+
+    def flush(self):
+        now = time.monotonic()
+        if now - self._last_flush < self.flush_interval:
+            return
+
+        self._last_flush = now
+        for stream in self._streams.values():
+            stream.flush()
+        if self._timeseries_sites is not None:
+            self._timeseries_sites.flush()
+
+    def save(self, path):
+        self._commit(self.add_extension(path), "no records to save")
+
+    def dump_combined(self, path):
+        self._commit(self.add_extension(path), "no combined records to dump")
+
+    def dump_timeseries(self, root):
+        if self._timeseries_root is None:
+            self.log("no timeseries records to dump", fg="red")
+            return
+
+        if self.consolidate_timeseries:
+            self._timeseries_sites.close()
+        else:
+            self._timeseries_sites.commit()
+
+        if os.path.isdir(root):
+            self.log(f"root {root} already exists", fg="red")
+            shutil.rmtree(root)
+        os.replace(self._timeseries_root, root)
+        self.log(f"dumped timeseries to {os.path.abspath(root)}")
+
+    def _get_stream(self, path):
+        stream = self._streams.get(path)
+        if stream is None:
+            stream = self._streams[path] = self._open_stream(path)
+        return stream
+
+    def _get_timeseries_root(self):
+        if self._timeseries_root is None:
+            root = f"{self.output_path}_timeseries.partial"
+            if os.path.isdir(root):
+                shutil.rmtree(root)
+            os.mkdir(root)
+            self._timeseries_root = root
+        return self._timeseries_root
+
+    def _commit(self, path, empty_msg):
+        stream = self._streams.pop(path, None)
+        if stream is None:
+            self.log(empty_msg, fg="red")
+            return
+
+        stream.commit()
+        self.log(f"saved {stream.nrows} rows to {os.path.abspath(path)}")
+
+
+class StreamingCSVPersister(StreamingPersister, CSVPersister):
+    pass
+
+
+class BlobCSVStream:
+    """
+    csv rows written incrementally into a blob upload, a BlobStream. The object
+    only appears in the bucket once commit finishes the upload, so there is no
+    partial name to rename
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._header = False
+        self.nrows = 0
+
+    def write(self, keys, rows):
+        if not self._header:
+            self._stream.write(encode_rows([keys]))
+            self._header = True
+
+        rows = list(rows)
+        self._stream.write(encode_rows(rows))
+        self.nrows += len(rows)
+
+    def flush(self):
+        """
+        Nothing to do. The upload sends each chunk_size bytes as they fill
+        """
+
+    def commit(self):
+        self._stream.commit()
+
+
+class BlobTimeseriesStore:
+    """
+    TimeseriesStore that writes timeseries.csv and sites.csv into two blob
+    uploads as sites arrive
+    """
+
+    def __init__(self, persister, root):
+        self._data = persister._open_blob(f"{root}/{TIMESERIES_NAME}")
+        self._sites = BlobCSVStream(persister._open_blob(f"{root}/{SITES_NAME}"))
+        self._index_keys = persister.site_index_keys()
+        self._header = False
+        self.nsites = 0
+
+    def add(self, site, records):
+        keys, _ = iter_rows(records)
+        if not keys:
+            return
+
+        if not self._header:
+            self._data.write(encode_rows([("id",) + tuple(keys)]))
+            self._header = True
+
+        data, nrows = encode_site_rows(site, records)
+        offset = self._data.nbytes
+        self._data.write(data)
+        self._sites.write(
+            tuple(site.keys) + self._index_keys,
+            [site.to_row() + [offset, len(data), nrows]],
+        )
+        self.nsites += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._data.commit()
+        self._sites.commit()
+
+
+class StreamingCloudStoragePersister(StreamingPersister, CloudStoragePersister):
+    """
+    Uploads results to cloud storage as each chunk arrives. Summaries and
+    combined records are written into open resumable uploads, per site
+    timeseries are uploaded by upload_workers threads and the consolidated
+    layout is appended to a single timeseries.csv upload. Memory is bounded by
+    a chunk of results and the upload buffers, not by the size of the run
+    """
+
+    def __init__(self, output_path, url=DEFAULT_STORAGE_URL, gzip=False):
+        super().__init__(output_path)
+        self.url = url
+        self.gzip = gzip
+        self._prefix = parse_storage_url(url)[2]
+        self._executor = None
+        self._uploads = []
+
+    def flush(self):
+        # wait for the chunk's timeseries uploads so at most one chunk of records
+        # is held
+        uploads, self._uploads = self._uploads, []
+        for future in uploads:
+            future.result()
+        super().flush()
+
+    def dump_timeseries(self, root):
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        if self._timeseries_root is None:
+            self.log("no timeseries records to dump", fg="red")
+            return
+
+        if self.consolidate_timeseries:
+            self._timeseries_sites.close()
+        else:
+            self._timeseries_sites.commit()
+        self.log(f"uploaded timeseries to {self._blob_name(self._timeseries_root)}")
+
+    def _write_timeseries(self, path, site, records):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.upload_workers)
+        self._uploads.append(self._executor.submit(self._write, path, records))
+
+    def _open_stream(self, path):
+        return BlobCSVStream(self._open_blob(path))
+
+    def _open_timeseries_store(self, root):
+        return BlobTimeseriesStore(self, root)
+
+    def _get_timeseries_root(self):
+        # blobs are only visible once their upload completes, so they are written
+        # under their final names
+        if self._timeseries_root is None:
+            self._timeseries_root = f"{self.output_path}_timeseries"
+        return self._timeseries_root
+
+    def _commit(self, path, empty_msg):
+        stream = self._streams.pop(path, None)
+        if stream is None:
+            self.log(empty_msg, fg="red")
+            return
+
+        stream.commit()
+        self.log(f"uploaded {stream.nrows} rows to {self._blob_name(path)}")
+
+
+class ParquetPersister(BasePersister):
+    """
+    Writes typed, zstd compressed parquet files. Requires pyarrow.
+
+    Timeseries are written to one file per run with the site columns repeated on
+    each row. Rows are sorted by source and site id, and each source gets its own
+    row groups, so readers can skip the sources and sites they don't need
+    """
+
+    extension = "parquet"
+    compression = "zstd"
+    row_group_size = 128_000
+
+    def dump_timeseries(self, root):
+        if self.timeseries:
+            path = self.add_extension(root)
+            self.log(f"dumping timeseries to {os.path.abspath(path)}")
+            pairs = sorted(
+                self.timeseries, key=lambda p: (p[0].source or "", str(p[0].id))
+            )
+            self._write_sites(path, pairs)
+        else:
+            self.log("no timeseries records to dump", fg="red")
+
+    def _write(self, path, records):
+        keys, columns = iter_columns(records)
+        if keys:
+            self._write_table(path, arrow_table(keys, columns))
+
+    def _dump_combined(self, path, combined):
+        self._write_sites(path, [(site, [record]) for site, record in combined])
+
+    def _write_sites(self, path, pairs):
+        keys = None
+        columns = None
+        for site, records in pairs:
+            rkeys, rcolumns = iter_columns(records)
+            if not rkeys:
+                continue
+
+            if columns is None:
+                keys = tuple(site.keys) + tuple(rkeys)
+                columns = [[] for _ in keys]
+
+            n = len(rcolumns[0])
+            for col, v in zip(columns, site.to_row()):
+                col.extend([v] * n)
+            for col, vs in zip(columns[len(site.keys) :], rcolumns):
+                col.extend(vs)
+
+        if columns is None:
+            return
+
+        table = arrow_table(keys, columns)
+        # the (start, length) of each source's run of rows
+        runs = []
+        for i, source in enumerate(columns[keys.index("source")]):
+            if runs and runs[-1][0] == source:
+                runs[-1][2] += 1
+            else:
+                runs.append([source, i, 1])
+
+        self._write_table(path, table, [(start, n) for _, start, n in runs])
+
+    def _write_table(self, path, table, slices=None):
+        import pyarrow.parquet as pq
+
+        if slices is None:
+            slices = [(0, len(table))]
+
+        with pq.ParquetWriter(path, table.schema, compression=self.compression) as w:
+            for start, n in slices:
+                w.write_table(table.slice(start, n), row_group_size=self.row_group_size)
+
+
+class GeoJSONStream:
+    """
+    GeoJSON written a feature at a time to path.partial and moved to path by
+    commit. Each row is a Point feature located by its longitude and latitude,
+    with all of its values as properties. With seq features are written one per
+    line (GeoJSONSeq) instead of as a FeatureCollection
+    """
+
+    def __init__(self, path, seq=False):
+        self.path = path
+        self.partial = f"{path}.partial"
+        self.seq = seq
+        self._file = open(self.partial, "w")
+        self.nrows = 0
+        if not seq:
+            self._file.write('{"type": "FeatureCollection", "features": [\n')
+
+    def write(self, keys, rows):
+        keys = list(keys)
+        try:
+            ilng, ilat = keys.index("longitude"), keys.index("latitude")
+        except ValueError:
+            ilng = ilat = None
+
+        sep = "\n" if self.seq else ",\n"
+        for row in rows:
+            geometry = None
+            if ilng is not None and row[ilng] is not None and row[ilat] is not None:
+                geometry = {"type": "Point", "coordinates": [row[ilng], row[ilat]]}
+
+            feature = {
+                "type": "Feature",
+                "geometry": geometry,
+                "properties": dict(zip(keys, row)),
+            }
+            if self.nrows and not self.seq:
+                self._file.write(sep)
+            self._file.write(json.dumps(feature, default=str))
+            if self.seq:
+                self._file.write(sep)
+            self.nrows += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def commit(self):
+        if not self.seq:
+            self._file.write("\n]}\n")
+        self._file.close()
+        os.replace(self.partial, self.path)
+
+
+class GeoJSONTimeseriesStore:
+    """
+    Consolidated GeoJSON timeseries. Every record is a feature located at its
+    site, with the site's values as properties
+    """
+
+    def __init__(self, path, seq=False):
+        self._stream = GeoJSONStream(path, seq)
+
+    def add(self, site, records):
+        keys, rows = iter_site_rows(site, records)
+        if keys:
+            self._stream.write(keys, rows)
+
+    def flush(self):
+        self._stream.flush()
+
+    def close(self):
+        self._stream.commit()
+
 
 class GeoJSONPersister(BasePersister):
+    """
+    Writes point features directly, a record at a time. Timeseries and combined
+    records are located at their site
+    """
+
     extension = "geojson"
+    seq = False
+
+    def _write(self, path, records):
+        self._write_rows(path, *iter_rows(records))
+
+    def _write_timeseries(self, path, site, records):
+        self._write_rows(path, *iter_site_rows(site, records))
+
+    def _dump_combined(self, path, combined):
+        stream = self._open_stream(path)
+        for site, record in combined:
+            stream.write(site.keys + record.keys, [site.to_row() + record.to_row()])
+        stream.commit()
+
+    def _write_rows(self, path, keys, rows):
+        stream = self._open_stream(path)
+        if keys:
+            stream.write(keys, rows)
+        stream.commit()
+
+    def _open_stream(self, path):
+        return GeoJSONStream(path, self.seq)
+
+    def _open_timeseries_store(self, root):
+        path = os.path.join(root, self.add_extension("timeseries"))
+        return GeoJSONTimeseriesStore(path, self.seq)
+
+
+class GeoJSONSeqPersister(GeoJSONPersister):
+    extension = "geojsonl"
+    seq = True
+
+
+class StreamingGeoJSONPersister(StreamingPersister, GeoJSONPersister):
+    pass
+
+
+class StreamingGeoJSONSeqPersister(StreamingPersister, GeoJSONSeqPersister):
+    pass
+
+
+class GDALPersister(BasePersister):
+    """
+    Writes any vector format supported by GDAL through geopandas, which is only
+    imported when this persister is used
+    """
+
+    extension = "gpkg"
+    driver = "GPKG"
 
     def _write(self, path, records):
-        r0 = records[0]
-        df = pd.DataFrame([r.to_row() for r in records], columns=r0.keys)
+        self._write_rows(path, *iter_rows(records))
+
+    def _write_timeseries(self, path, site, records):
+        self._write_rows(path, *iter_site_rows(site, records))
+
+    def _dump_combined(self, path, combined):
+        rows = [site.to_row() + record.to_row() for site, record in combined]
+        site, record = combined[0]
+        self._write_rows(path, site.keys + record.keys, rows)
+
+    def _write_rows(self, path, keys, rows):
+        import geopandas as gpd
+        import pandas as pd
 
+        df = pd.DataFrame(list(rows), columns=list(keys))
         gdf = gpd.GeoDataFrame(
             df, geometry=gpd.points_from_xy(df.longitude, df.latitude), crs="EPSG:4326"
         )
-        gdf.to_file(path, driver="GeoJSON")
+        gdf.to_file(path, driver=self.driver)
 
 
 # class ST2Persister(BasePersister):
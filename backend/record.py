@@ -15,55 +15,108 @@
 # ===============================================================================
 from backend.constants import DTW, PARAMETER, PARAMETER_VALUE, FEET
 
+# number of decimals each key is rounded to in to_row
+ROUNDING = {
+    "elevation": 2,
+    "depth_to_water_ft_below_ground_surface": 2,
+    "surface_elevation_ft": 2,
+    "well_depth_ft_below_ground_surface": 2,
+    "well_depth": 2,
+    "latitude": 6,
+    "longitude": 6,
+    "min": 2,
+    "max": 2,
+    "mean": 2,
+}
+
 
 class BaseRecord:
+    """
+    A record stores the values of its class's keys in a list, in keys order.
+
+    Values for anything else are kept in a small extras dict when keep_extras is
+    True. Otherwise they are dropped from the payload, and setting them later
+    raises AttributeError. Missing or None values fall back to
+    defaults. The index of each key and the rounding applied by to_row are worked
+    out once per class
+    """
+
+    __slots__ = ("_values", "_extras")
+
+    keys: tuple = ()
+    defaults: dict = {}
+    keep_extras = True
+
+    def __init_subclass__(cls, **kw):
+        super().__init_subclass__(**kw)
+        cls._index = {k: i for i, k in enumerate(cls.keys)}
+        cls._row_plan = tuple((cls.defaults.get(k), ROUNDING.get(k)) for k in cls.keys)
+
     def to_csv(self):
         raise NotImplementedError
 
     def __init__(self, payload):
-        self._payload = payload
+        index = self._index
+        values = [None] * len(index)
+        extras = None
+        for k, v in payload.items():
+            i = index.get(k)
+            if i is not None:
+                values[i] = v
+            elif self.keep_extras:
+                if extras is None:
+                    extras = {}
+                extras[k] = v
+
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_extras", extras)
 
     def to_row(self):
-
-        def get(attr):
-            # v = self._payload.get(attr)
-            # if v is None and self.defaults:
-            #     v = self.defaults.get(attr)
-            v = self.__getattr__(attr)
-            for key, sigfigs in (
-                ("elevation", 2),
-                ("depth_to_water_ft_below_ground_surface", 2),
-                ("surface_elevation_ft", 2),
-                ("well_depth_ft_below_ground_surface", 2),
-                ("well_depth", 2),
-                ("latitude", 6),
-                ("longitude", 6),
-                ("min", 2),
-                ("max", 2),
-                ("mean", 2),
-            ):
-                if v is not None and key == attr:
-                    try:
-                        v = round(v, sigfigs)
-                    except TypeError as e:
-                        print(key, attr)
-                        raise e
-                    break
-            return v
-
-        return [get(k) for k in self.keys]
+        row = []
+        for v, (default, ndigits) in zip(self._values, self._row_plan):
+            if v is None:
+                v = default
+            if v is not None and ndigits is not None:
+                v = round(v, ndigits)
+            row.append(v)
+        return row
 
     def update(self, **kw):
-        self._payload.update(kw)
+        index = self._index
+        for k, v in kw.items():
+            i = index.get(k)
+            if i is not None:
+                self._values[i] = v
+            elif self.keep_extras:
+                if self._extras is None:
+                    object.__setattr__(self, "_extras", {})
+                self._extras[k] = v
+            else:
+                raise AttributeError(f"{self.__class__.__name__} has no field {k!r}")
 
     def __getattr__(self, attr):
-        v = self._payload.get(attr)
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+
+        i = self._index.get(attr)
+        if i is not None:
+            v = self._values[i]
+        elif self._extras:
+            v = self._extras.get(attr)
+        else:
+            v = None
+
         if v is None and self.defaults:
             v = self.defaults.get(attr)
         return v
 
+    def __setattr__(self, attr, value):
+        self.update(**{attr: value})
+
 
 class WaterLevelRecord(BaseRecord):
+    __slots__ = ()
+
     keys: tuple = (
         # "source",
         # "id",
@@ -78,9 +131,12 @@ class WaterLevelRecord(BaseRecord):
     )
 
     defaults: dict = {}
+    keep_extras = False
 
 
 class AnalyteRecord(BaseRecord):
+    __slots__ = ()
+
     keys: tuple = (
         # "source",
         # "id",
@@ -96,9 +152,12 @@ class AnalyteRecord(BaseRecord):
     )
 
     defaults: dict = {}
+    keep_extras = False
 
 
 class SummaryRecord(BaseRecord):
+    __slots__ = ()
+
     keys: tuple = (
         "source",
         "id",
@@ -126,14 +185,16 @@ class SummaryRecord(BaseRecord):
 
 
 class WaterLevelSummaryRecord(SummaryRecord):
-    pass
+    __slots__ = ()
 
 
 class AnalyteSummaryRecord(SummaryRecord):
-    pass
+    __slots__ = ()
 
 
 class SiteRecord(BaseRecord):
+    __slots__ = ()
+
     keys: tuple = (
         "source",
         "id",
@@ -0,0 +1,337 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import click
+import httpx
+
+# requests per second allowed for hosts known to throttle aggressive clients
+DEFAULT_RATE_LIMITS = {
+    "waterservices.usgs.gov": 5,
+    "www.waterqualitydata.us": 2,
+}
+
+# status codes that are worth retrying
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host):
+        super().__init__(f"circuit open for {host}. Failing fast")
+        self.host = host
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket. Each request takes one token. Tokens refill at rate
+    per second up to capacity
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return the number of seconds to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._timestamp) * self.rate
+            )
+            self._timestamp = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+# returned by CircuitBreaker.allow for the trial request of a half open circuit
+TRIAL = "trial"
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open every request
+    fails fast. After reset_timeout seconds one trial request is let through
+    (half open); its outcome closes or re-opens the circuit. A trial that ends
+    without an outcome must be handed back with end_trial
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """
+        Return True if a request may be made, TRIAL if it is the trial request of
+        a half open circuit, otherwise False
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                if not self._trial:
+                    self._trial = True
+                    return TRIAL
+            return False
+
+    def end_trial(self):
+        """
+        Let another trial through if the current one recorded no outcome
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+def parse_retry_after(value):
+    """
+    Retry-After is either a number of seconds or an HTTP date
+    """
+    if not value:
+        return
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestPolicy:
+    """
+    Rate limiting, retries and circuit breaking for idempotent GET requests.
+
+    State is kept per host so one slow or failing upstream does not affect
+    requests to the others
+    """
+
+    def __init__(
+        self,
+        rate_limits=None,
+        max_retries=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+        failure_threshold=5,
+        reset_timeout=60,
+    ):
+        if rate_limits is None:
+            rate_limits = DEFAULT_RATE_LIMITS
+
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._buckets = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, host):
+        rate = self.rate_limits.get(host)
+        if not rate:
+            return
+
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(rate)
+        return bucket
+
+    def get_breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+        return breaker
+
+    def execute(self, url, func):
+        """
+        Call func() to perform the request for url, retrying as needed
+        """
+        host = urlsplit(str(url)).hostname
+        breaker = self.get_breaker(host)
+        bucket = self.get_bucket(host)
+
+        attempt = 0
+        while 1:
+            allowed = breaker.allow()
+            if not allowed:
+                raise CircuitOpenError(host)
+
+            try:
+                if bucket:
+                    bucket.acquire()
+
+                try:
+                    resp = func()
+                except httpx.TransportError as e:
+                    delay = self._handle_error(breaker, url, attempt, e)
+                else:
+                    delay = self._handle_response(
+                        breaker, url, attempt, resp, allowed is TRIAL
+                    )
+                    if delay is None:
+                        return resp
+                    resp.close()
+            finally:
+                if allowed is TRIAL:
+                    breaker.end_trial()
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def execute_async(self, url, func):
+        """
+        asyncio version of execute. func() must return an awaitable
+        """
+        host = urlsplit(str(url)).hostname
+        breaker = self.get_breaker(host)
+        bucket = self.get_bucket(host)
+
+        attempt = 0
+        while 1:
+            allowed = breaker.allow()
+            if not allowed:
+                raise CircuitOpenError(host)
+
+            try:
+                if bucket:
+                    await bucket.acquire_async()
+
+                try:
+                    resp = await func()
+                except httpx.TransportError as e:
+                    delay = self._handle_error(breaker, url, attempt, e)
+                else:
+                    delay = self._handle_response(
+                        breaker, url, attempt, resp, allowed is TRIAL
+                    )
+                    if delay is None:
+                        return resp
+                    await resp.aclose()
+            finally:
+                # also covers cancellation and errors that are not retried
+                if allowed is TRIAL:
+                    breaker.end_trial()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def backoff(self, attempt):
+        """
+        Exponential backoff with full jitter
+        """
+        cap = min(self.backoff_max, self.backoff_factor * 2**attempt)
+        return random.uniform(0, cap)
+
+    def _handle_error(self, breaker, url, attempt, exc):
+        breaker.record_failure()
+        if attempt >= self.max_retries or breaker.is_open:
+            raise exc
+
+        delay = self.backoff(attempt)
+        _warn(f"{exc.__class__.__name__} for {url}. retrying in {delay:0.2f}s")
+        return delay
+
+    def _handle_response(self, breaker, url, attempt, resp, trial=False):
+        """
+        Return None if resp should be returned to the caller, otherwise the number
+        of seconds to wait before retrying
+        """
+        status = resp.status_code
+        if status not in RETRY_STATUS_CODES:
+            breaker.record_success()
+            return
+
+        # being throttled does not mean the service is down, so a throttled
+        # trial closes the circuit
+        if status != 429:
+            breaker.record_failure()
+        elif trial:
+            breaker.record_success()
+
+        if attempt >= self.max_retries or breaker.is_open:
+            return
+
+        delay = parse_retry_after(resp.headers.get("Retry-After"))
+        if delay is None:
+            delay = self.backoff(attempt)
+        delay = min(delay, self.backoff_max)
+
+        _warn(f"{url} responded with status {status}. retrying in {delay:0.2f}s")
+        return delay
+
+
+def _warn(msg):
+    click.secho(f"{'RequestPolicy':25s} -- {msg}", fg="red")
+
+
+# ============= EOF =============================================
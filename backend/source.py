@@ -13,11 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import asyncio
+import heapq
+from collections.abc import AsyncIterator, Iterator
+from datetime import date, datetime, time, timedelta, timezone
+from functools import partial
+from typing import Optional, Union
 from json import JSONDecodeError
 
 import click
 import httpx
 
+from backend import http_client
 from backend.constants import (
     MILLIGRAMS_PER_LITER,
     FEET,
@@ -31,13 +38,21 @@ from backend.constants import (
     PARAMETER_VALUE,
 )
 from backend.persister import BasePersister, CSVPersister
-from backend.transformer import BaseTransformer, convert_units
+from backend.request_policy import CircuitOpenError
+from backend.summary import SummaryAccumulator
+from backend.transformer import BaseTransformer, parse_datetime, EPOCH
+from backend.units import DEFAULT_REGISTRY
+
+REQUEST_ERRORS = (httpx.TransportError, CircuitOpenError)
 
 
 class BaseSource:
     transformer_klass = BaseTransformer
     config = None
 
+    # seconds a cached response is used before it is revalidated with upstream
+    cache_ttl = 24 * 3600
+
     def __init__(self):
         self.transformer = self.transformer_klass()
 
@@ -56,11 +71,214 @@ class BaseSource:
             f"get_records not implemented by {self.__class__.__name__}"
         )
 
+    def _get(self, url, params=None, **kw):
+        if self.config is None:
+            return http_client.get(url, params=params, **kw)
+
+        pool = self.config.get_client_pool()
+        cache = self.config.get_response_cache()
+        if cache is None:
+            return pool.get(url, params=params, **kw)
+
+        key, resp, headers = cache.lookup(url, params, self.cache_ttl)
+        if resp is not None:
+            return resp
+
+        resp = pool.get(url, params=params, **_add_headers(kw, headers))
+        if resp.status_code == 304:
+            cached = cache.revalidated(key)
+            if cached is not None:
+                return cached
+            # the entry was evicted since lookup. ask again, unconditionally
+            resp = pool.get(url, params=params, **kw)
+
+        cache.store(key, resp)
+        return resp
+
+    async def _aget(self, url, params=None, **kw):
+        pool = self.config.get_async_client_pool()
+        cache = self.config.get_response_cache()
+        if cache is None:
+            return await pool.get(url, params=params, **kw)
+
+        key, resp, headers = cache.lookup(url, params, self.cache_ttl)
+        if resp is not None:
+            return resp
+
+        resp = await pool.get(url, params=params, **_add_headers(kw, headers))
+        if resp.status_code == 304:
+            cached = cache.revalidated(key)
+            if cached is not None:
+                return cached
+            resp = await pool.get(url, params=params, **kw)
+
+        cache.store(key, resp)
+        return resp
+
     def _execute_text_request(self, url, params=None, **kw):
         if "timeout" not in kw:
             kw["timeout"] = 10
 
-        resp = httpx.get(url, params=params, **kw)
+        try:
+            resp = self._get(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return ""
+        return self._handle_text_response(resp)
+
+    async def _execute_text_request_async(self, url, params=None, **kw):
+        if "timeout" not in kw:
+            kw["timeout"] = 10
+
+        try:
+            resp = await self._aget(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return ""
+        return self._handle_text_response(resp)
+
+    def _execute_json_request(self, url, params=None, tag=None, **kw):
+        try:
+            resp = self._get(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return []
+        return self._handle_json_response(resp, tag)
+
+    async def _execute_json_request_async(self, url, params=None, tag=None, **kw):
+        try:
+            resp = await self._aget(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return []
+        return self._handle_json_response(resp, tag)
+
+    def _execute_lines_request(self, url, params=None, **kw):
+        """
+        Yield the lines of the response body as they arrive, without holding the
+        whole body in memory
+        """
+        if "timeout" not in kw:
+            kw["timeout"] = 10
+
+        cache, key, headers = None, None, {}
+        if self.config is not None:
+            pool = self.config.get_client_pool()
+            cache = self.config.get_response_cache()
+        else:
+            pool = http_client.DEFAULT_POOL
+
+        if cache is not None:
+            key, cached, headers = cache.lookup(url, params, self.cache_ttl)
+            if cached is not None:
+                yield from cached.iter_lines()
+                return
+
+        try:
+            resp = pool.stream(url, params=params, **_add_headers(kw, headers))
+            if resp.status_code == 304 and cache is not None:
+                resp.close()
+                cached = cache.revalidated(key)
+                if cached is not None:
+                    yield from cached.iter_lines()
+                    return
+                # the entry was evicted since lookup. ask again, unconditionally
+                resp = pool.stream(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return
+
+        writer = None
+        try:
+            if resp.status_code != 200:
+                resp.read()
+                self._handle_text_response(resp)
+                return
+
+            if cache is not None:
+                writer = cache.open_writer(key, resp)
+
+            splitter = http_client.LineSplitter(resp.encoding or "utf-8")
+            for chunk in resp.iter_bytes():
+                if writer:
+                    writer.write(chunk)
+                yield from splitter.feed(chunk)
+            yield from splitter.flush()
+
+            if writer:
+                writer.commit()
+                writer = None
+        except httpx.TransportError as e:
+            self._warn_request_failed(url, e)
+        finally:
+            if writer:
+                writer.abort()
+            resp.close()
+
+    async def _execute_lines_request_async(self, url, params=None, **kw):
+        """
+        asyncio version of _execute_lines_request
+        """
+        if "timeout" not in kw:
+            kw["timeout"] = 10
+
+        pool = self.config.get_async_client_pool()
+        cache = self.config.get_response_cache()
+        key, headers = None, {}
+        if cache is not None:
+            key, cached, headers = cache.lookup(url, params, self.cache_ttl)
+            if cached is not None:
+                for line in cached.iter_lines():
+                    yield line
+                return
+
+        try:
+            resp = await pool.stream(url, params=params, **_add_headers(kw, headers))
+            if resp.status_code == 304 and cache is not None:
+                await resp.aclose()
+                cached = cache.revalidated(key)
+                if cached is not None:
+                    for line in cached.iter_lines():
+                        yield line
+                    return
+                resp = await pool.stream(url, params=params, **kw)
+        except REQUEST_ERRORS as e:
+            self._warn_request_failed(url, e)
+            return
+
+        writer = None
+        try:
+            if resp.status_code != 200:
+                await resp.aread()
+                self._handle_text_response(resp)
+                return
+
+            if cache is not None:
+                writer = cache.open_writer(key, resp)
+
+            splitter = http_client.LineSplitter(resp.encoding or "utf-8")
+            async for chunk in resp.aiter_bytes():
+                if writer:
+                    writer.write(chunk)
+                for line in splitter.feed(chunk):
+                    yield line
+            for line in splitter.flush():
+                yield line
+
+            if writer:
+                writer.commit()
+                writer = None
+        except httpx.TransportError as e:
+            self._warn_request_failed(url, e)
+        finally:
+            if writer:
+                writer.abort()
+            await resp.aclose()
+
+    def _warn_request_failed(self, url, exc):
+        self.warn(f"request to {url} failed after retries. {exc}")
+
+    def _handle_text_response(self, resp):
         if resp.status_code == 200:
             return resp.text
         else:
@@ -69,8 +287,7 @@ class BaseSource:
             self.warn(f"service responded with text {resp.text}")
             return ""
 
-    def _execute_json_request(self, url, params=None, tag=None, **kw):
-        resp = httpx.get(url, params=params, **kw)
+    def _handle_json_response(self, resp, tag):
         if tag is None:
             tag = "data"
 
@@ -89,12 +306,37 @@ class BaseSource:
             return []
 
 
+def _add_headers(kw, headers):
+    if headers:
+        kw = dict(kw)
+        kw["headers"] = {**kw.get("headers", {}), **headers}
+    return kw
+
+
+async def run_in_thread(func, *args, **kw):
+    """
+    Run a blocking function in the default executor. Used by sources that do not
+    have a native async implementation
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kw))
+
+
 class BaseSiteSource(BaseSource):
     chunk_size = 1
 
+    async def get_records_async(self, *args, **kw):
+        return await run_in_thread(self.get_records, *args, **kw)
+
     def read_sites(self, *args, **kw):
         self.log("Gathering site records")
-        records = self.get_records()
+        return self._read_sites(self.get_records())
+
+    async def read_sites_async(self, *args, **kw):
+        self.log("Gathering site records")
+        return self._read_sites(await self.get_records_async())
+
+    def _read_sites(self, records):
         if records:
             self.log(f"total records={len(records)}")
             return self._transform_sites(records)
@@ -103,11 +345,9 @@ class BaseSiteSource(BaseSource):
 
     def _transform_sites(self, records):
         ns = []
-        for record in records:
-            record = self.transformer.do_transform(record)
-            if record:
-                record.chunk_size = self.chunk_size
-                ns.append(record)
+        for record in self.transformer.do_transform_batch(records):
+            record.chunk_size = self.chunk_size
+            ns.append(record)
 
         self.log(f"processed nrecords={len(ns)}")
         return ns
@@ -132,28 +372,184 @@ def make_site_list(parent_record):
     return sites
 
 
-def get_most_recent(records, tag):
+def make_accessor(tag):
+    """
+    Return a function that pulls tag out of a record. tag is either a callable, a
+    key, a dotted path into nested dicts/objects e.g. "Well.PointID", or a tuple of
+    those e.g. ("lev_dt", "lev_tm") which returns a tuple of values
+    """
     if callable(tag):
-        func = tag
+        return tag
+
+    if isinstance(tag, tuple):
+        funcs = [make_accessor(t) for t in tag]
+
+        def func(x):
+            return tuple(f(x) for f in funcs)
+
+    elif "." in tag:
+        keys = tag.split(".")
+
+        def func(x):
+            for t in keys:
+                x = x[t] if isinstance(x, dict) else getattr(x, t)
+            return x
+
     else:
-        if "." in tag:
 
-            def func(x):
-                for t in tag.split("."):
-                    x = x[t]
-                return x
+        def func(x):
+            return x[tag]
 
-        else:
+    return func
 
-            def func(x):
-                return x[tag]
 
-    return sorted(records, key=func)[-1]
+def datetime_sort_key(value):
+    """
+    Turn a raw date value into something that sorts chronologically. Strings and
+    (date, time) tuples are parsed, numbers are treated as epoch milliseconds.
+    Values that cannot be parsed sort before everything else, by their raw string
+    """
+    if value is None:
+        return datetime.min, ""
+
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value, ""
+
+    if isinstance(value, date):
+        return datetime.combine(value, time.min), ""
+
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(milliseconds=value), ""
+
+    try:
+        dt, _ = parse_datetime(value)
+    except (ValueError, TypeError):
+        dt = None
+
+    if not isinstance(dt, datetime):
+        return datetime.min, str(value)
+    return datetime_sort_key(dt)
+
+
+def make_most_recent_key(tag):
+    accessor = make_accessor(tag)
+
+    def key(record):
+        return datetime_sort_key(accessor(record))
+
+    return key
+
+
+def get_most_recent(records, tag, k=None):
+    """
+    Return the record with the latest date found at tag, or the k latest records,
+    most recent first, if k is given. Each date is parsed once
+    """
+    key = make_most_recent_key(tag)
+    if k is not None:
+        return heapq.nlargest(k, records, key=key)
+
+    record, latest = None, None
+    for r in records:
+        rk = key(r)
+        # >= so that ties resolve to the last record
+        if latest is None or rk >= latest:
+            record, latest = r, rk
+    return record
+
+
+def group_records(records, tag):
+    """
+    Group records by the value of tag in one pass. Records missing tag are skipped
+    """
+    func = make_accessor(tag)
+    groups = {}
+    for r in records:
+        try:
+            key = func(r)
+        except (KeyError, TypeError, AttributeError):
+            continue
+
+        try:
+            groups[key].append(r)
+        except KeyError:
+            groups[key] = [r]
+    return groups
+
+
+class RecordStream:
+    """
+    Group, clean and summarize the records of a response as they arrive.
+
+    Records are buffered in blocks of block_size. Each block is grouped by the
+    source's site_key, cleaned and then folded into a SummaryAccumulator per site,
+    or appended to the site's cleaned records for timeseries, so only one block of
+    raw records is held at a time
+    """
+
+    block_size = 1000
+
+    def __init__(self, source, use_summarize):
+        self.source = source
+        self.use_summarize = use_summarize
+        self.n = 0
+        # site ids that had any record, and their accumulator or cleaned records
+        self.seen = set()
+        self.results = {}
+        self._block = []
+
+    def add(self, record):
+        self._block.append(record)
+        if len(self._block) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        block, self._block = self._block, []
+        self.n += len(block)
+
+        source = self.source
+        for site, records in group_records(block, source.site_key).items():
+            self.seen.add(site)
+            cleaned = source._clean_records(records)
+            if not cleaned:
+                continue
+
+            if self.use_summarize:
+                self.results[site] = source._accumulate(cleaned, self.results.get(site))
+            else:
+                self.results.setdefault(site, []).extend(cleaned)
 
 
 class BaseParameterSource(BaseSource):
     name = ""
 
+    # columnar fast path. sources that can decode their response into a DataFrame
+    # set these column names and implement get_frame
+    frame_site_column: Optional[str] = None
+    frame_value_column: Optional[str] = None
+    frame_units_column: Optional[str] = None
+    frame_default_units: Optional[str] = None
+    frame_date_columns: tuple = ()
+
+    # key or dotted path to the site identifier of a record. used to index a
+    # response by site once instead of scanning it for every site in the chunk
+    site_key: Optional[str] = None
+
+    # key, dotted path or (date, time) tuple of keys used to pick the most recent
+    # record while summarizing.
+    # sources without one fall back to _extract_most_recent over all records
+    most_recent_tag: Optional[Union[str, tuple]] = None
+
+    def _index_parent_records(self, records):
+        """
+        Return a dict of site id to records, or None if this source does not
+        declare a site_key
+        """
+        if self.site_key is not None:
+            return group_records(records, self.site_key)
+
     def _extract_parent_records(self, records, parent_record):
         if parent_record.chunk_size == 1:
             return records
@@ -195,7 +591,42 @@ class BaseParameterSource(BaseSource):
             f"{self.__class__.__name__} Must implement _get_output_units"
         )
 
+    async def get_records_async(self, parent_record):
+        return await run_in_thread(self.get_records, parent_record)
+
     def load(self, parent_record, use_summarize):
+        self._log_load(parent_record)
+        if self.config.use_columnar and self.supports_frames():
+            return self._load_frame(parent_record, use_summarize)
+
+        rs = self.get_records(parent_record)
+        if isinstance(rs, Iterator) and self._can_stream():
+            stream = RecordStream(self, use_summarize)
+            for record in rs:
+                stream.add(record)
+            return self._load_stream(parent_record, stream)
+
+        if rs is not None and not isinstance(rs, list):
+            rs = list(rs)
+        return self._load(parent_record, rs, use_summarize)
+
+    async def load_async(self, parent_record, use_summarize):
+        if self.config.use_columnar and self.supports_frames():
+            return await run_in_thread(self.load, parent_record, use_summarize)
+
+        self._log_load(parent_record)
+        rs = await self.get_records_async(parent_record)
+        if isinstance(rs, AsyncIterator):
+            if self._can_stream():
+                stream = RecordStream(self, use_summarize)
+                async for record in rs:
+                    stream.add(record)
+                return self._load_stream(parent_record, stream)
+
+            rs = [record async for record in rs]
+        return self._load(parent_record, rs, use_summarize)
+
+    def _log_load(self, parent_record):
         if isinstance(parent_record, list):
             self.log(
                 f"Gathering {self.name} summary for multiple records. {len(parent_record)}"
@@ -205,14 +636,19 @@ class BaseParameterSource(BaseSource):
                 f"{parent_record.id} ({parent_record.id}): Gathering {self.name} summary"
             )
 
-        rs = self.get_records(parent_record)
+    def _load(self, parent_record, rs, use_summarize):
         if rs:
             if not isinstance(parent_record, list):
                 parent_record = [parent_record]
 
+            index = self._index_parent_records(rs)
+
             ret = []
             for pi in parent_record:
-                rrs = self._extract_parent_records(rs, pi)
+                if index is None:
+                    rrs = self._extract_parent_records(rs, pi)
+                else:
+                    rrs = index.get(pi.id)
                 if not rrs:
                     self.warn(f"{pi.name}: No parent records found")
                     continue
@@ -222,62 +658,215 @@ class BaseParameterSource(BaseSource):
                     self.warn(f"{pi.name} No clean records found")
                     continue
 
-                items = self._extract_parameter_results(cleaned)
-                units = self._extract_parameter_units(cleaned)
-                items = [
-                    convert_units(float(r), u, self._get_output_units())
-                    for r, u in zip(items, units)
-                ]
-
-                if items is not None:
-                    n = len(items)
-                    self.log(f"{pi.name}: Retrieved {self.name}: {n}")
-                    if use_summarize:
-                        mr = self._extract_most_recent(cleaned)
-                        if not mr:
-                            continue
-                        rec = {
-                            "nrecords": n,
-                            "min": min(items),
-                            "max": max(items),
-                            "mean": sum(items) / n,
-                            "most_recent_datetime": mr["datetime"],
-                            "most_recent_value": mr["value"],
-                            "most_recent_units": mr["units"],
-                        }
-                        trec = self.transformer.do_transform(
-                            rec,
-                            pi,
-                        )
-                        ret.append(trec)
+                if use_summarize:
+                    acc = self._accumulate(cleaned)
+                    self.log(f"{pi.name}: Retrieved {self.name}: {acc.n}")
+                    if acc.most_recent is not None:
+                        mr = self._extract_most_recent([acc.most_recent])
                     else:
-                        cs = [
-                            self.transformer.do_transform(
-                                self._extract_parameter(r), pi
-                            )
-                            for r in cleaned
-                        ]
-                        cs = sorted(cs, key=self._sort_func)
-                        ret.append((pi, cs))
+                        mr = self._extract_most_recent(cleaned)
+                    if not mr:
+                        continue
+                    ret.append(
+                        self._summarize(pi, acc.n, acc.min, acc.max, acc.mean, mr)
+                    )
+                else:
+                    self.log(f"{pi.name}: Retrieved {self.name}: {len(cleaned)}")
+                    ret.append(self._make_timeseries(pi, cleaned))
 
             return ret
         else:
-            if isinstance(parent_record, list):
-                names = [str(r.id) for r in parent_record]
+            self._warn_no_records(parent_record)
+
+    def _can_stream(self):
+        """
+        Records can be consumed as they arrive only if they can be grouped by site
+        and the most recent record can be tracked while accumulating
+        """
+        return self.site_key is not None and self.most_recent_tag is not None
+
+    def _load_stream(self, parent_record, stream):
+        """
+        Build the results of load from a consumed RecordStream
+        """
+        stream.flush()
+        if not stream.n:
+            self._warn_no_records(parent_record)
+            return
+
+        self.log(f"Retrieved {stream.n} records")
+        if not isinstance(parent_record, list):
+            parent_record = [parent_record]
+
+        ret = []
+        for pi in parent_record:
+            if pi.id not in stream.seen:
+                self.warn(f"{pi.name}: No parent records found")
+                continue
+
+            result = stream.results.get(pi.id)
+            if not result:
+                self.warn(f"{pi.name} No clean records found")
+                continue
+
+            if stream.use_summarize:
+                acc = result
+                self.log(f"{pi.name}: Retrieved {self.name}: {acc.n}")
+                mr = self._extract_most_recent([acc.most_recent])
+                if not mr:
+                    continue
+                ret.append(self._summarize(pi, acc.n, acc.min, acc.max, acc.mean, mr))
+            else:
+                self.log(f"{pi.name}: Retrieved {self.name}: {len(result)}")
+                ret.append(self._make_timeseries(pi, result))
+        return ret
+
+    def _accumulate(self, cleaned, acc=None):
+        """
+        Feed cleaned records into a SummaryAccumulator in one pass. Pass acc to
+        keep adding to an existing accumulator e.g. as pages of a response arrive
+        """
+        if acc is None:
+            key = None
+            if self.most_recent_tag:
+                key = make_most_recent_key(self.most_recent_tag)
+            acc = SummaryAccumulator(key)
+
+        values = DEFAULT_REGISTRY.convert_array(
+            self._extract_parameter_results(cleaned),
+            self._extract_parameter_units(cleaned),
+            self._get_output_units(),
+        )
+        acc.update_array(values, cleaned)
+        return acc
+
+    def _summarize(self, pi, n, vmin, vmax, mean, mr):
+        rec = {
+            "nrecords": n,
+            "min": vmin,
+            "max": vmax,
+            "mean": mean,
+            "most_recent_datetime": mr["datetime"],
+            "most_recent_value": mr["value"],
+            "most_recent_units": mr["units"],
+        }
+        return self.transformer.do_transform(rec, pi)
+
+    def _make_timeseries(self, pi, cleaned):
+        batch = self.transformer.do_transform_batch(
+            (self._extract_parameter(r) for r in cleaned), pi
+        )
+        batch.site = pi
+        return pi, batch.sort("date_measured")
+
+    def _warn_no_records(self, parent_record):
+        if isinstance(parent_record, list):
+            names = [str(r.id) for r in parent_record]
+        else:
+            names = [str(parent_record.id)]
+
+        name = ",".join(names)
+        self.warn(f"{name}: No records found")
+
+    # columnar fast path =============================================
+    def supports_frames(self):
+        return self.frame_site_column is not None
+
+    def get_frame(self, parent_record):
+        raise NotImplementedError(f"{self.__class__.__name__} Must implement get_frame")
+
+    def _load_frame(self, parent_record, use_summarize):
+        """
+        Columnar version of load. The response is decoded into a pandas DataFrame
+        and cleaning, unit conversion and summarizing are done as column operations
+        """
+        if not isinstance(parent_record, list):
+            parent_record = [parent_record]
+
+        df = self.get_frame(parent_record)
+        if df is None or not len(df):
+            self._warn_no_records(parent_record)
+            return
+
+        site = self.frame_site_column
+        df = self._clean_frame(df)
+        if use_summarize:
+            stats = df.groupby(site)["_value"].agg(["count", "min", "max", "mean"])
+            latest = (
+                df.assign(_date=self._frame_date_ranks(df))
+                .sort_values("_date", kind="stable")
+                .groupby(site)
+                .tail(1)
+                .drop(columns="_date")
+            )
+            latest = {r[site]: r for r in latest.to_dict("records")}
+            stats = stats.to_dict("index")
+        else:
+            groups = {k: g for k, g in df.groupby(site, sort=False)}
+
+        ret = []
+        for pi in parent_record:
+            key = str(pi.id)
+            if use_summarize:
+                if key not in stats:
+                    self.warn(f"{pi.name}: No clean records found")
+                    continue
+
+                st = stats[key]
+                n = int(st["count"])
+                self.log(f"{pi.name}: Retrieved {self.name}: {n}")
+                mr = self._extract_most_recent([latest[key]])
+                if not mr:
+                    continue
+
+                ret.append(self._summarize(pi, n, st["min"], st["max"], st["mean"], mr))
             else:
-                names = [str(parent_record.id)]
+                if key not in groups:
+                    self.warn(f"{pi.name}: No clean records found")
+                    continue
+
+                cleaned = groups[key].drop(columns="_value").to_dict("records")
+                self.log(f"{pi.name}: Retrieved {self.name}: {len(cleaned)}")
+                ret.append(self._make_timeseries(pi, cleaned))
+
+        return ret
+
+    def _frame_date_ranks(self, df):
+        """
+        Return the chronological rank of each row's frame_date_columns. Dates are
+        parsed with datetime_sort_key, as get_most_recent does, so mixed formats
+        sort the same way in both paths
+        """
+        columns = [df[c].tolist() for c in self.frame_date_columns]
+        if len(columns) == 1:
+            values = columns[0]
+        else:
+            values = list(zip(*columns))
 
-            name = ",".join(names)
-            self.warn(f"{name}: No records found")
+        keys = [datetime_sort_key(v) for v in values]
+        ranks = {k: i for i, k in enumerate(sorted(set(keys)))}
+        return [ranks[k] for k in keys]
+
+    def _clean_frame(self, df):
+        import pandas as pd
+
+        values = pd.to_numeric(df[self.frame_value_column], errors="coerce")
+        if self.frame_units_column:
+            units = df[self.frame_units_column].to_numpy()
+        else:
+            units = self.frame_default_units
+
+        values = DEFAULT_REGISTRY.convert_array(
+            values.to_numpy(), units, self._get_output_units()
+        )
+        df = df.assign(_value=values)
+        return df[df["_value"].notna()]
 
     def _extract_parameter(self, record):
         record = self._extract_parameter_record(record)
         self._validate_record(record)
         return record
 
-    def _sort_func(self, x):
-        return x.date_measured
-
 
 def get_analyte_search_param(parameter, mapping):
     try:
@@ -303,6 +892,7 @@ class BaseAnalyteSource(BaseParameterSource):
 
 class BaseWaterLevelSource(BaseParameterSource):
     name = "water levels"
+    frame_default_units = FEET
 
     def _get_output_units(self):
         return self.config.waterlevel_output_units
@@ -0,0 +1,136 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import math
+
+import numpy as np
+
+
+class SummaryAccumulator:
+    """
+    Running count, min, max, mean and variance (Welford) of a stream of values,
+    plus the most recent record seen.
+
+    Values can be added one at a time as pages of a response arrive, so a summary
+    never needs the full list of records. Accumulators for the same site can be
+    combined with merge.
+
+    key, if given, is a function returning the sort key of a record. The record
+    with the largest key is kept as most_recent
+    """
+
+    def __init__(self, key=None):
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self._m2 = 0.0
+
+        self.most_recent = None
+        self._most_recent_key = None
+        self._key = key
+
+    def add(self, value, record=None):
+        self.n += 1
+        if self.n == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+        if self._key is not None and record is not None:
+            key = self._key(record)
+            # >= so that ties resolve to the last record, like sorted(...)[-1]
+            if self.most_recent is None or key >= self._most_recent_key:
+                self.most_recent = record
+                self._most_recent_key = key
+
+    def update(self, values, records=None):
+        if records is None:
+            for v in values:
+                self.add(v)
+        else:
+            for v, r in zip(values, records):
+                self.add(v, r)
+
+    def update_array(self, values, records=None):
+        """
+        Add a numpy array of values at once. Statistics are computed vectorised and
+        merged in; only the most recent tracking visits each record
+        """
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+
+        other = SummaryAccumulator()
+        other.n = len(values)
+        other.min = float(values.min())
+        other.max = float(values.max())
+        other.mean = float(values.mean())
+        other._m2 = float(((values - other.mean) ** 2).sum())
+        self.merge(other)
+
+        if self._key is not None and records is not None:
+            for r in records:
+                key = self._key(r)
+                if self.most_recent is None or key >= self._most_recent_key:
+                    self.most_recent = r
+                    self._most_recent_key = key
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one (Chan et al. parallel update)
+        """
+        if not other.n:
+            return self
+        if not self.n:
+            self.min, self.max = other.min, other.max
+            self.n, self.mean, self._m2 = other.n, other.mean, other._m2
+        else:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / n
+            self._m2 += other._m2 + delta**2 * self.n * other.n / n
+            self.n = n
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+        if other.most_recent is not None and (
+            self.most_recent is None or other._most_recent_key >= self._most_recent_key
+        ):
+            self.most_recent = other.most_recent
+            self._most_recent_key = other._most_recent_key
+        return self
+
+    @property
+    def variance(self):
+        """
+        Sample variance. 0 for fewer than two values
+        """
+        if self.n < 2:
+            return 0.0
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+# ============= EOF =============================================
@@ -14,21 +14,17 @@
 # limitations under the License.
 # ===============================================================================
 import pprint
-from datetime import datetime
-
-import shapely
-from shapely import Point
+import threading
+from datetime import datetime, timedelta, timezone
 
 from backend.constants import (
-    MILLIGRAMS_PER_LITER,
-    PARTS_PER_MILLION,
     FEET,
     METERS,
-    TONS_PER_ACRE_FOOT,
-    MICROGRAMS_PER_LITER,
     DT_MEASURED,
 )
-from backend.geo_utils import datum_transform
+from backend.batch import RecordBatch
+from backend.geo_utils import datum_transform_batch
+from backend.units import convert_units
 from backend.record import (
     WaterLevelSummaryRecord,
     WaterLevelRecord,
@@ -40,9 +36,12 @@ from backend.record import (
 
 
 def transform_horizontal_datum(x, y, in_datum, out_datum):
+    """
+    x is longitude, y is latitude
+    """
     if in_datum and in_datum != out_datum:
-        nx, ny = datum_transform(x, y, in_datum, out_datum)
-        return nx, ny, out_datum
+        nx, ny, datums = datum_transform_batch([x], [y], [in_datum], out_datum)
+        return nx[0], ny[0], datums[0]
     else:
         return x, y, out_datum
 
@@ -68,127 +67,230 @@ def transform_units(e, unit, out_unit):
     return e, unit
 
 
-def convert_units(input_value, input_units, output_units):
-    input_value = float(input_value)
-    input_units = input_units.lower()
-    output_units = output_units.lower()
+DATETIME_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S+00:00",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%Y-%m",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+)
 
-    mgl = MILLIGRAMS_PER_LITER.lower()
-    ugl = MICROGRAMS_PER_LITER.lower()
-    ppm = PARTS_PER_MILLION.lower()
-    tpaf = TONS_PER_ACRE_FOOT.lower()
 
-    if input_units == output_units:
-        return input_value
+EPOCH = datetime(1970, 1, 1)
+
+
+class DatetimeParser:
+    """
+    Parses the datetime strings of one field of one source.
+
+    Common ISO shapes (YYYY-MM-DD and YYYY-MM-DD[T ]HH:MM:SS, optionally followed
+    by Z or a +HH:MM offset) are parsed by hand,
+    numbers are treated as epoch milliseconds, and otherwise the format that
+    matched last time is tried before falling back to DATETIME_FORMATS in order.
+    Results for repeated strings are remembered, up to memo_size strings. Parsers
+    are shared by the threads of a --workers run, so the memos are guarded by a
+    lock
+    """
+
+    def __init__(self, formats=DATETIME_FORMATS, memo_size=4096):
+        self.formats = formats
+        self.memo_size = memo_size
+        self._fmt = None
+        self._memo = {}
+        self._standardized = {}
+        self._lock = threading.Lock()
+
+    def parse(self, dt):
+        """
+        Return (datetime, format). format is None for anything that was not a
+        string
+        """
+        if isinstance(dt, tuple):
+            dt = " ".join(di for di in dt if di is not None)
+
+        if not isinstance(dt, str):
+            if isinstance(dt, (int, float)) and not isinstance(dt, bool):
+                return EPOCH + timedelta(milliseconds=dt), None
+            return dt, None
+
+        result = self._recall(self._memo, dt)
+        if result is not None:
+            return result
+
+        result = self._parse(dt)
+        self._remember(self._memo, dt, result)
+        return result
+
+    def standardize(self, dt):
+        """
+        Return (date, time) strings
+        """
+        key = dt if isinstance(dt, (str, tuple)) else None
+        if key is not None:
+            result = self._recall(self._standardized, key)
+            if result is not None:
+                return result
+
+        dt, fmt = self.parse(dt)
+        if fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+            result = dt.strftime("%Y-%m-%d"), ""
+        elif fmt == "%Y-%m":
+            result = dt.strftime("%Y-%m"), ""
+        else:
+            tt = dt.strftime("%H:%M:%S")
+            if tt == "00:00:00":
+                tt = ""
+            result = dt.strftime("%Y-%m-%d"), tt
+
+        if key is not None:
+            self._remember(self._standardized, key, result)
+        return result
+
+    def _parse(self, dt):
+        s = dt.strip()
+        if "." in s:
+            # drop fractional seconds but keep a trailing Z or offset
+            head, _, tail = s.partition(".")
+            s = head + tail.lstrip("0123456789")
+
+        result = _parse_iso(s)
+        if result is not None:
+            return result
+
+        if self._fmt is not None:
+            try:
+                return datetime.strptime(s, self._fmt), self._fmt
+            except ValueError:
+                pass
 
-    if input_units == tpaf and output_units == mgl:
-        return input_value * 735.47
+        for fmt in self.formats:
+            try:
+                result = datetime.strptime(s, fmt), fmt
+            except ValueError:
+                continue
+            self._fmt = fmt
+            return result
+
+        raise ValueError(f"Failed to parse datetime {dt}")
+
+    def _recall(self, memo, key):
+        with self._lock:
+            return memo.get(key)
+
+    def _remember(self, memo, key, value):
+        with self._lock:
+            if len(memo) >= self.memo_size:
+                # drop the oldest entry
+                memo.pop(next(iter(memo), None), None)
+            memo[key] = value
+
+
+def _parse_iso(s):
+    """
+    Hand written parser for YYYY-MM-DD and YYYY-MM-DD[T ]HH:MM:SS, the latter
+    optionally followed by Z or a +HH:MM or +HHMM offset. Offsets give an aware
+    datetime. Return None if s has some other shape
+    """
+    n = len(s)
+    tz = None
+    suffix = ""
+    if n == 20 and s[19] == "Z":
+        suffix = "Z"
+    elif n in (24, 25) and s[19] in "+-":
+        tz = _parse_offset(s[19:])
+        if tz is None:
+            return
+        suffix = "%z"
+    if suffix:
+        s = s[:19]
+        n = 19
 
-    if (
-        input_units == mgl
-        and output_units == ppm
-        or input_units == ppm
-        and output_units == mgl
-    ):
-        return input_value * 1.0
+    if n not in (10, 19) or s[4] != "-" or s[7] != "-":
+        return
 
-    if input_units == ugl and output_units == mgl:
-        return input_value * 0.001
+    y, m, d = s[:4], s[5:7], s[8:10]
+    if not (y.isdigit() and m.isdigit() and d.isdigit()):
+        return
 
-    ft = FEET.lower()
-    m = METERS.lower()
+    try:
+        if n == 10:
+            return datetime(int(y), int(m), int(d)), "%Y-%m-%d"
+
+        sep = s[10]
+        hh, mm, ss = s[11:13], s[14:16], s[17:19]
+        if (
+            sep in "T "
+            and s[13] == ":"
+            and s[16] == ":"
+            and hh.isdigit()
+            and mm.isdigit()
+            and ss.isdigit()
+        ):
+            fmt = "%Y-%m-%dT%H:%M:%S" if sep == "T" else "%Y-%m-%d %H:%M:%S"
+            return (
+                datetime(int(y), int(m), int(d), int(hh), int(mm), int(ss), tzinfo=tz),
+                fmt + suffix,
+            )
+    except ValueError:
+        # let strptime have a go and report the failure
+        return
 
-    if input_units == "feet":
-        input_units = ft
-    if input_units == "meters":
-        input_units = m
 
-    if input_units == ft and output_units == m:
-        return input_value * 0.3048
-    if input_units == m and output_units == ft:
-        return input_value * 3.28084
+def _parse_offset(s):
+    """
+    Return the timezone of a +HH:MM or +HHMM offset, or None
+    """
+    hh, mm = s[1:3], s[-2:]
+    if not (hh.isdigit() and mm.isdigit()) or (len(s) == 6 and s[3] != ":"):
+        return
 
-    print(f"Failed to convert {input_value} {input_units} to {output_units}")
-    return input_value
+    offset = timedelta(hours=int(hh), minutes=int(mm))
+    if offset >= timedelta(days=1):
+        return
+    return timezone(-offset if s[0] == "-" else offset)
 
 
-def standardize_datetime(dt):
-    if isinstance(dt, tuple):
-        dt = [di for di in dt if di is not None]
-        dt = " ".join(dt)
-    fmt = None
-    if isinstance(dt, str):
-        dt = dt.strip()
-        for fmt in [
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S.%fZ",
-            "%Y-%m-%dT%H:%M:%SZ",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d %H:%M:%S+00:00",
-            "%Y-%m-%d %H:%M",
-            "%Y-%m-%d",
-            "%Y-%m",
-            "%Y/%m/%d %H:%M:%S",
-            "%Y/%m/%d %H:%M",
-            "%Y/%m/%d",
-        ]:
-            try:
-                dt = datetime.strptime(dt.split(".")[0], fmt)
-                break
-            except ValueError as e:
-                pass
-        else:
-            raise ValueError(f"Failed to parse datetime {dt}")
+DEFAULT_DATETIME_PARSER = DatetimeParser()
 
-    if fmt == "%Y-%m-%d":
-        return dt.strftime("%Y-%m-%d"), ""
-    elif fmt == "%Y/%m/%d":
-        return dt.strftime("%Y-%m-%d"), ""
-    elif fmt == "%Y-%m":
-        return dt.strftime("%Y-%m"), ""
 
-    tt = dt.strftime("%H:%M:%S")
-    if tt == "00:00:00":
-        tt = ""
-    return dt.strftime("%Y-%m-%d"), tt
+def parse_datetime(dt):
+    """
+    Parse a datetime string, or a (date, time) tuple. Return (datetime, format)
+    """
+    return DEFAULT_DATETIME_PARSER.parse(dt)
+
+
+def standardize_datetime(dt):
+    return DEFAULT_DATETIME_PARSER.standardize(dt)
 
 
 class BaseTransformer:
-    _cached_polygon = None
+    _datetime_parsers = None
     config = None
 
     def do_transform(self, inrecord, *args, **kw):
-        record = self._transform(inrecord, *args, **kw)
-        if not record:
+        if not self._is_contained(inrecord):
             return
 
-        self._post_transform(record, *args, **kw)
-
-        dt = record.get(DT_MEASURED)
-        if dt:
-            d, t = standardize_datetime(dt)
-            record["date_measured"] = d
-            record["time_measured"] = t
-        else:
-            mrd = record.get("most_recent_datetime")
-            if mrd:
-                d, t = standardize_datetime(mrd)
-                record["date_measured"] = d
-                record["time_measured"] = t
+        record = self._transform_record(inrecord, *args, **kw)
+        if not record:
+            return
 
         # convert to proper record type
         klass = self._get_record_klass()
         record = klass(record)
 
         if isinstance(record, (SiteRecord, SummaryRecord)):
-            x = float(record.latitude)
-            y = float(record.longitude)
-            datum = record.horizontal_datum
-
             lng, lat, datum = transform_horizontal_datum(
-                x,
-                y,
-                datum,
+                float(record.longitude),
+                float(record.latitude),
+                record.horizontal_datum,
                 self.config.output_horizontal_datum,
             )
             record.update(latitude=lat)
@@ -213,6 +315,88 @@ class BaseTransformer:
 
         return record
 
+    def do_transform_batch(self, inrecords, *args, **kw):
+        """
+        Transform many records into one RecordBatch. Records that transform to
+        nothing are dropped. Datum and unit conversions are done column by column
+        """
+        inrecords = self._filter_contained(list(inrecords))
+        records = (self._transform_record(r, *args, **kw) for r in inrecords)
+        batch = RecordBatch.from_dicts(
+            self._get_record_klass(), [r for r in records if r]
+        )
+        if issubclass(batch.record_klass, (SiteRecord, SummaryRecord)):
+            self._transform_batch_geo(batch)
+        return batch
+
+    def _transform_batch_geo(self, batch):
+        # one pyproj call per distinct input datum
+        lngs, lats, datums = datum_transform_batch(
+            [float(v) for v in batch.values("longitude")],
+            [float(v) for v in batch.values("latitude")],
+            batch.values("horizontal_datum"),
+            self.config.output_horizontal_datum,
+        )
+
+        batch.set_values("latitude", lats)
+        batch.set_values("longitude", lngs)
+        batch.set_values("horizontal_datum", datums)
+
+        for key, units_key, out_units in (
+            ("elevation", "elevation_units", self.config.output_elevation_units),
+            ("well_depth", "well_depth_units", self.config.output_well_depth_units),
+        ):
+            values, units = [], []
+            for v, u in zip(batch.values(key), batch.values(units_key)):
+                v, u = transform_units(v, u, out_units)
+                values.append(v)
+                units.append(u)
+            batch.set_values(key, values)
+            batch.set_values(units_key, units)
+
+    def _transform_record(self, inrecord, *args, **kw):
+        """
+        Run the source specific _transform and standardize the measurement date.
+        Returns a dict, or None if the record should be dropped
+        """
+        record = self._transform(inrecord, *args, **kw)
+        if not record:
+            return
+
+        self._post_transform(record, *args, **kw)
+
+        dt = record.get(DT_MEASURED)
+        if dt:
+            d, t = self._standardize_datetime(dt, DT_MEASURED)
+            record["date_measured"] = d
+            record["time_measured"] = t
+        elif "most_recent_date" in record:
+            # already standardized by _transform_most_recents
+            record["date_measured"] = record["most_recent_date"]
+            record["time_measured"] = record["most_recent_time"]
+        else:
+            mrd = record.get("most_recent_datetime")
+            if mrd:
+                d, t = self._standardize_datetime(mrd, "most_recent_datetime")
+                record["date_measured"] = d
+                record["time_measured"] = t
+        return record
+
+    def _standardize_datetime(self, dt, field):
+        """
+        Standardize dt with a parser dedicated to field of this source, so each
+        parser learns the format its field uses
+        """
+        if self._datetime_parsers is None:
+            self._datetime_parsers = {}
+
+        try:
+            parser = self._datetime_parsers[field]
+        except KeyError:
+            # setdefault so threads racing to create it end up sharing one
+            parser = self._datetime_parsers.setdefault(field, DatetimeParser())
+        return parser.standardize(dt)
+
     def _transform(self, *args, **kw):
         raise NotImplementedError(
             f"{self.__class__.__name__} must implement _transform"
@@ -226,18 +410,44 @@ class BaseTransformer:
         lng,
         lat,
     ):
-        config = self.config
-        if config.has_bounds():
-            if not self._cached_polygon:
-                poly = shapely.wkt.loads(config.bounding_wkt())
-                self._cached_polygon = poly
-            else:
-                poly = self._cached_polygon
-
-            pt = Point(lng, lat)
-            return poly.contains(pt)
-
-        return True
+        sf = self.config.get_spatial_filter()
+        if sf is None:
+            return True
+        return sf.contains(lng, lat)
+
+    def _get_lnglat(self, record):
+        """
+        Return the (longitude, latitude) of a raw upstream record. Transformers for
+        sources that cannot be filtered spatially upstream implement this, and
+        their records are dropped unless they fall within the config's bounds
+        """
+        return
+
+    def _is_contained(self, record):
+        lnglat = self._get_lnglat(record)
+        if lnglat is None:
+            return True
+        return self.contained(*lnglat)
+
+    def _filter_contained(self, records):
+        """
+        Drop the records outside the config's bounds with one vectorised test.
+        Records without coordinates are kept, as _is_contained does
+        """
+        sf = self.config.get_spatial_filter() if self.config else None
+        if sf is None or not records:
+            return records
+
+        coords = [self._get_lnglat(r) for r in records]
+        located = [i for i, c in enumerate(coords) if c is not None]
+        if not located:
+            return records
+
+        lngs, lats = zip(*(coords[i] for i in located))
+        keep = [True] * len(records)
+        for i, m in zip(located, sf.contains_xy(lngs, lats)):
+            keep[i] = bool(m)
+        return [r for r, k in zip(records, keep) if k]
 
     def _get_record_klass(self):
         raise NotImplementedError
@@ -286,7 +496,9 @@ class ParameterTransformer(BaseTransformer):
 
     def _transform_most_recents(self, record):
         # convert most_recents
-        dt, tt = standardize_datetime(record["most_recent_datetime"])
+        dt, tt = self._standardize_datetime(
+            record["most_recent_datetime"], "most_recent_datetime"
+        )
         record["most_recent_date"] = dt
         record["most_recent_time"] = tt
         p, u = self._get_parameter()
@@ -13,9 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 from backend.config import Config
-from backend.persister import CSVPersister, GeoJSONPersister, CloudStoragePersister
+from backend.persister import (
+    CSVPersister,
+    GeoJSONPersister,
+    GeoJSONSeqPersister,
+    GDALPersister,
+    CloudStoragePersister,
+    StreamingCloudStoragePersister,
+    StreamingCSVPersister,
+    StreamingGeoJSONPersister,
+    StreamingGeoJSONSeqPersister,
+    ParquetPersister,
+)
 
 
 def unify_sites(config):
@@ -52,6 +65,15 @@ def unify_waterlevels(config):
     return True
 
 
+# persisters that can write results as they arrive
+STREAMING_PERSISTERS = {
+    CloudStoragePersister: StreamingCloudStoragePersister,
+    CSVPersister: StreamingCSVPersister,
+    GeoJSONPersister: StreamingGeoJSONPersister,
+    GeoJSONSeqPersister: StreamingGeoJSONSeqPersister,
+}
+
+
 def _perister_factory(config):
     persister_klass = CSVPersister
     if config.use_cloud_storage:
@@ -60,8 +82,24 @@ def _perister_factory(config):
         persister_klass = CSVPersister
     elif config.use_geojson:
         persister_klass = GeoJSONPersister
+    elif config.use_geojsonseq:
+        persister_klass = GeoJSONSeqPersister
+    elif config.use_gpkg:
+        persister_klass = GDALPersister
+    elif config.use_parquet:
+        persister_klass = ParquetPersister
+
+    kw = {}
+    if persister_klass is CloudStoragePersister:
+        kw = {"url": config.cloud_storage_url, "gzip": config.cloud_storage_gzip}
+
+    if config.use_streaming and persister_klass in STREAMING_PERSISTERS:
+        persister = STREAMING_PERSISTERS[persister_klass](config.output_path, **kw)
+    else:
+        persister = persister_klass(**kw)
 
-    return persister_klass()
+    persister.consolidate_timeseries = config.use_consolidated_timeseries
+    return persister
 
 
 # def _unify_wrapper(config, func):
@@ -80,25 +118,18 @@ def _site_wrapper(site_source, parameter_source, persister, config):
             print(f"No sites found for {site_source}")
             return
 
-        for i, sites in enumerate(site_source.chunks(sites)):
-            if site_limit and i > site_limit:
-                break
-
-            if use_summarize:
-                summary_records = parameter_source.load(sites, use_summarize)
-                if summary_records:
-                    persister.records.extend(summary_records)
-            else:
+        chunks = _get_chunks(site_source, sites, site_limit)
+        if config.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=config.max_workers) as executor:
+                # map yields results in chunk order regardless of completion order
+                for results in executor.map(
+                    lambda chunk: parameter_source.load(chunk, use_summarize), chunks
+                ):
+                    _add_results(persister, results, use_summarize)
+        else:
+            for sites in chunks:
                 results = parameter_source.load(sites, use_summarize)
-                if results is None:
-                    continue
-
-                # combine sites that only have one record
-                for site, records in results:
-                    if len(records) == 1:
-                        persister.combined.append((site, records[0]))
-                    else:
-                        persister.timeseries.append((site, records))
+                _add_results(persister, results, use_summarize)
 
     except BaseException:
         import traceback
@@ -108,14 +139,105 @@ def _site_wrapper(site_source, parameter_source, persister, config):
         print(f"Failed to unify {site_source}")
 
 
+async def _site_wrapper_async(site_source, parameter_source, config, semaphore):
+    """
+    Load all the chunks for one (site_source, parameter_source) pair concurrently.
+
+    semaphore caps the number of chunks in flight across all sources, and
+    max_concurrent_requests_per_source caps the chunks in flight for this source.
+    Returns the chunk results in chunk order
+    """
+    use_summarize = config.output_summary
+    source_semaphore = asyncio.Semaphore(config.max_concurrent_requests_per_source)
+
+    async def load(chunk):
+        async with source_semaphore, semaphore:
+            try:
+                return await parameter_source.load_async(chunk, use_summarize)
+            except Exception:
+                import traceback
+
+                print(traceback.format_exc())
+                print(f"Failed to load chunk for {parameter_source}")
+
+    try:
+        async with semaphore:
+            sites = await site_source.read_sites_async()
+        if not sites:
+            print(f"No sites found for {site_source}")
+            return []
+
+        chunks = _get_chunks(site_source, sites, config.site_limit)
+        return await asyncio.gather(*[load(chunk) for chunk in chunks])
+    except Exception:
+        import traceback
+
+        print(traceback.format_exc())
+        print(f"Failed to unify {site_source}")
+        return []
+
+
+def _get_chunks(site_source, sites, site_limit):
+    chunks = site_source.chunks(sites)
+    if site_limit:
+        chunks = chunks[: site_limit + 1]
+    return chunks
+
+
+def _add_results(persister, results, use_summarize):
+    if use_summarize:
+        if results:
+            persister.load(results)
+    else:
+        if results is None:
+            return
+
+        # combine sites that only have one record
+        for site, records in results:
+            if len(records) == 1:
+                persister.add_combined(site, records[0])
+            else:
+                persister.add_timeseries(site, records)
+
+    persister.flush()
+
+
+async def _unify_sources_async(config, sources, persister):
+    semaphore = asyncio.Semaphore(config.max_concurrent_requests)
+    try:
+        results = await asyncio.gather(
+            *[
+                _site_wrapper_async(site_source, ss, config, semaphore)
+                for site_source, ss in sources
+            ]
+        )
+    finally:
+        await config.aclose_async_client_pool()
+
+    # merge in source order so the output is independent of completion order
+    for source_results in results:
+        for chunk_results in source_results:
+            _add_results(persister, chunk_results, config.output_summary)
+
+
 def _unify_parameter(
     config,
     sources,
 ):
     use_summarize = config.output_summary
     persister = _perister_factory(config)
-    for site_source, ss in sources:
-        _site_wrapper(site_source, ss, persister, config)
+    try:
+        if config.use_async:
+            asyncio.run(_unify_sources_async(config, sources, persister))
+        else:
+            for site_source, ss in sources:
+                _site_wrapper(site_source, ss, persister, config)
+    finally:
+        config.close_client_pool()
+        from backend.units import DEFAULT_REGISTRY
+
+        DEFAULT_REGISTRY.report()
+
     if use_summarize:
         persister.save(config.output_path)
     else:
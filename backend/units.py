@@ -0,0 +1,165 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import threading
+
+import click
+import numpy as np
+
+from backend.constants import (
+    MILLIGRAMS_PER_LITER,
+    MICROGRAMS_PER_LITER,
+    PARTS_PER_MILLION,
+    TONS_PER_ACRE_FOOT,
+    FEET,
+    METERS,
+)
+
+# spellings seen in upstream responses, lower case, mapped to a canonical unit
+UNIT_ALIASES = {
+    "ft": FEET,
+    "feet": FEET,
+    "foot": FEET,
+    "m": METERS,
+    "meter": METERS,
+    "meters": METERS,
+    "mg/l": MILLIGRAMS_PER_LITER,
+    "ug/l": MICROGRAMS_PER_LITER,
+    "µg/l": MICROGRAMS_PER_LITER,
+    "ppm": PARTS_PER_MILLION,
+    "tons/ac ft": TONS_PER_ACRE_FOOT,
+    "tons/ac-ft": TONS_PER_ACRE_FOOT,
+}
+
+# multiply a value in the first unit by the factor to get the second unit
+CONVERSION_FACTORS = {
+    (TONS_PER_ACRE_FOOT, MILLIGRAMS_PER_LITER): 735.47,
+    (MILLIGRAMS_PER_LITER, PARTS_PER_MILLION): 1.0,
+    (PARTS_PER_MILLION, MILLIGRAMS_PER_LITER): 1.0,
+    (MICROGRAMS_PER_LITER, MILLIGRAMS_PER_LITER): 0.001,
+    (FEET, METERS): 0.3048,
+    (METERS, FEET): 3.28084,
+}
+
+
+class UnitRegistry:
+    """
+    Table driven unit conversion.
+
+    Unit names are normalised through UNIT_ALIASES once per distinct spelling and
+    factors are looked up in a matrix built from CONVERSION_FACTORS. Conversions
+    that are not in the table leave the value unchanged. They are counted and
+    summarised by report instead of being printed for every value
+    """
+
+    def __init__(self, aliases=None, factors=None):
+        if aliases is None:
+            aliases = UNIT_ALIASES
+        if factors is None:
+            factors = CONVERSION_FACTORS
+
+        self.aliases = aliases
+        self._names = {}
+        self._matrix = {}
+        for (a, b), f in factors.items():
+            self._matrix[(self.normalize(a), self.normalize(b))] = f
+
+        self.unknown = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, unit):
+        try:
+            return self._names[unit]
+        except KeyError:
+            pass
+
+        name = unit.strip().lower() if isinstance(unit, str) else ""
+        name = self.aliases.get(name, name)
+        self._names[unit] = name
+        return name
+
+    def factor(self, input_units, output_units):
+        """
+        Return the factor that converts input_units to output_units, or None if the
+        conversion is unknown
+        """
+        a = self.normalize(input_units)
+        b = self.normalize(output_units)
+        if a == b:
+            return 1.0
+        return self._matrix.get((a, b))
+
+    def convert(self, value, input_units, output_units):
+        value = float(value)
+        f = self._get_factor(input_units, output_units)
+        return value * f
+
+    def convert_array(self, values, units, output_units):
+        """
+        Convert a sequence of values with a matching sequence of units. Returns a
+        numpy float array
+        """
+        values = np.asarray(values, dtype=float)
+        if isinstance(units, str):
+            return values * self._get_factor(units, output_units)
+
+        units = np.asarray(units, dtype=object).astype(str)
+        uniques, inverse, counts = np.unique(
+            units, return_inverse=True, return_counts=True
+        )
+        factors = np.ones(len(uniques))
+        for i, u in enumerate(uniques):
+            f = self.factor(u, output_units)
+            if f is None:
+                self._record_unknown(u, output_units, int(counts[i]))
+            else:
+                factors[i] = f
+        return values * factors[inverse]
+
+    def report(self):
+        """
+        Warn once about each unknown conversion seen since the last report
+        """
+        with self._lock:
+            unknown, self.unknown = self.unknown, {}
+
+        for (a, b), n in unknown.items():
+            _warn(f"Failed to convert {n} values from {a} to {b}")
+
+    def _get_factor(self, input_units, output_units):
+        f = self.factor(input_units, output_units)
+        if f is None:
+            self._record_unknown(input_units, output_units, 1)
+            f = 1.0
+        return f
+
+    def _record_unknown(self, input_units, output_units, n):
+        key = (input_units, output_units)
+        with self._lock:
+            self.unknown[key] = self.unknown.get(key, 0) + n
+
+
+def _warn(msg):
+    click.secho(f"{'UnitRegistry':25s} -- {msg}", fg="red")
+
+
+DEFAULT_REGISTRY = UnitRegistry()
+
+
+def convert_units(input_value, input_units, output_units):
+    return DEFAULT_REGISTRY.convert(input_value, input_units, output_units)
+
+
+# ============= EOF =============================================
@@ -13,18 +13,106 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import builtins
 import sys
+import time
 
 import click
 
+from backend.boundaries import BOUNDARY_STATES, BOUNDARY_STORE_PATH
 from backend.config import Config
-from backend.constants import ANALYTE_CHOICES
+from backend.constants import ANALYTE_CHOICES, OUTPUT_FORMATS
 from backend.unifier import unify_sites, unify_waterlevels, unify_analytes
+from frontend import IMPORT_START
+
+# time spent importing the cli and the backend modules it imports at startup
+IMPORT_TIME = time.perf_counter() - IMPORT_START
+
+# third party modules that are slow to import. --timings reports the ones a
+# command ended up using
+HEAVY_MODULES = (
+    "httpx",
+    "numpy",
+    "shapely",
+    "pyproj",
+    "frost_sta_client",
+    "pandas",
+    "geopandas",
+    "pyarrow",
+    "google.cloud.storage",
+)
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--timings",
+    is_flag=True,
+    default=False,
+    help="Report the time spent importing modules",
+)
+@click.pass_context
+def cli(ctx, timings):
+    if timings:
+        timer = ImportTimer(HEAVY_MODULES)
+        timer.install()
+        ctx.call_on_close(lambda: report_timings(timer))
+
+
+class ImportTimer:
+    """
+    Times the imports of modules made by this process, while installed, by
+    wrapping builtins.__import__. Each time includes the dependencies the module
+    pulled in that were not already imported
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+        # modules imported before the timer was installed
+        self.preloaded = [m for m in modules if m in sys.modules]
+        self.timings = {}
+        self._import = None
+
+    def install(self):
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = self._timed_module(name, fromlist, level)
+        if module is None:
+            return self._import(name, globals, locals, fromlist, level)
+
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self.timings.setdefault(module, time.perf_counter() - start)
+
+    def _timed_module(self, name, fromlist, level):
+        if level:
+            return
+
+        # e.g. "from google.cloud import storage"
+        names = [name] + [f"{name}.{f}" for f in fromlist or ()]
+        for n in names:
+            if n in self.modules and n not in sys.modules and n not in self.timings:
+                return n
+
+
+def report_timings(timer):
+    timer.uninstall()
+    click.secho("---- Import timings ----", fg="yellow")
+    click.secho(f"{'weave startup':30s}{IMPORT_TIME * 1000:10.1f} ms", fg="yellow")
+    for module in timer.preloaded:
+        click.secho(f"{module:30s}{'at startup':>13s}", fg="yellow")
+    for module in timer.modules:
+        seconds = timer.timings.get(module)
+        if seconds is not None:
+            click.secho(f"{module:30s}{seconds * 1000:10.1f} ms", fg="yellow")
 
 
 SOURCE_OPTIONS = [
@@ -98,6 +186,13 @@ SPATIAL_OPTIONS = [
         default="",
         help="New Mexico county name",
     ),
+    click.option(
+        "--pushdown-tolerance",
+        type=float,
+        default=Config.pushdown_tolerance,
+        show_default=True,
+        help="Tolerance, in degrees, of the simplified area sent to services that filter spatially. 0 sends the exact area",
+    ),
 ]
 DEBUG_OPTIONS = [
     click.option(
@@ -114,6 +209,72 @@ DEBUG_OPTIONS = [
     ),
 ]
 
+CACHE_OPTIONS = [
+    click.option(
+        "--cache/--no-cache",
+        default=False,
+        show_default=True,
+        help="Cache source responses on disk in ~/.cache/nmuwd",
+    ),
+    click.option(
+        "--refresh",
+        is_flag=True,
+        default=False,
+        show_default=True,
+        help="Ignore cached responses and download everything again",
+    ),
+]
+
+OUTPUT_OPTIONS = [
+    click.option(
+        "--format",
+        "output_format",
+        type=click.Choice(OUTPUT_FORMATS),
+        default="csv",
+        show_default=True,
+        help="Output file format. gpkg requires geopandas, parquet requires pyarrow",
+    ),
+    click.option(
+        "--stream",
+        is_flag=True,
+        default=False,
+        show_default=True,
+        help="Write csv, geojson and cloud storage output as results arrive instead of at the end of the run",
+    ),
+    click.option(
+        "--consolidate",
+        is_flag=True,
+        default=False,
+        show_default=True,
+        help="Write timeseries to a single csv with a sites index instead of a file per site",
+    ),
+]
+
+PERFORMANCE_OPTIONS = [
+    click.option(
+        "--workers",
+        type=int,
+        default=1,
+        show_default=True,
+        help="Number of threads used to fetch the chunks of each source",
+    ),
+    click.option(
+        "--async",
+        "use_async",
+        is_flag=True,
+        default=False,
+        show_default=True,
+        help="Fetch all sources and their chunks concurrently using asyncio",
+    ),
+    click.option(
+        "--columnar",
+        is_flag=True,
+        default=False,
+        show_default=True,
+        help="Decode NWIS and WQP responses into columnar frames. Requires pandas",
+    ),
+]
+
 DT_OPTIONS = [
     click.option(
         "--start-date",
@@ -139,12 +300,13 @@ def add_options(options):
 
 @cli.command()
 @add_options(SPATIAL_OPTIONS)
-def wells(bbox, county):
+def wells(bbox, county, pushdown_tolerance):
     """
     Get locations
     """
 
     config = setup_config("sites", bbox, county)
+    config.pushdown_tolerance = pushdown_tolerance
     unify_sites(config)
 
 
@@ -159,6 +321,9 @@ def wells(bbox, county):
 @add_options(DT_OPTIONS)
 @add_options(SPATIAL_OPTIONS)
 @add_options(SOURCE_OPTIONS)
+@add_options(CACHE_OPTIONS)
+@add_options(OUTPUT_OPTIONS)
+@add_options(PERFORMANCE_OPTIONS)
 @add_options(DEBUG_OPTIONS)
 def waterlevels(
     timeseries,
@@ -166,6 +331,7 @@ def waterlevels(
     end_date,
     bbox,
     county,
+    pushdown_tolerance,
     no_amp,
     no_nwis,
     no_st2,
@@ -174,11 +340,20 @@ def waterlevels(
     no_wqp,
     no_ckan,
     no_dwb,
+    cache,
+    refresh,
+    output_format,
+    stream,
+    consolidate,
+    workers,
+    use_async,
+    columnar,
     site_limit,
     dry,
 ):
     config = setup_config("waterlevels", timeseries, bbox, county, site_limit, dry)
 
+    config.pushdown_tolerance = pushdown_tolerance
     config.use_source_ampapi = no_amp
     config.use_source_nwis = no_nwis
     config.use_source_st2 = no_st2
@@ -189,6 +364,14 @@ def waterlevels(
     config.use_source_dwb = no_dwb
     config.start_date = start_date
     config.end_date = end_date
+    config.use_cache = cache
+    config.cache_refresh = refresh
+    config.max_workers = workers
+    config.use_async = use_async
+    config.use_columnar = columnar
+    config.set_output_format(output_format)
+    config.use_streaming = stream
+    config.use_consolidated_timeseries = consolidate
 
     if not dry:
         config.report()
@@ -211,6 +394,9 @@ def waterlevels(
 @add_options(DT_OPTIONS)
 @add_options(SPATIAL_OPTIONS)
 @add_options(SOURCE_OPTIONS)
+@add_options(CACHE_OPTIONS)
+@add_options(OUTPUT_OPTIONS)
+@add_options(PERFORMANCE_OPTIONS)
 @add_options(DEBUG_OPTIONS)
 def analytes(
     analyte,
@@ -219,6 +405,7 @@ def analytes(
     end_date,
     bbox,
     county,
+    pushdown_tolerance,
     no_amp,
     no_nwis,
     no_st2,
@@ -227,6 +414,14 @@ def analytes(
     no_wqp,
     no_ckan,
     no_dwb,
+    cache,
+    refresh,
+    output_format,
+    stream,
+    consolidate,
+    workers,
+    use_async,
+    columnar,
     site_limit,
     dry,
 ):
@@ -235,6 +430,7 @@ def analytes(
     )
     config.analyte = analyte
 
+    config.pushdown_tolerance = pushdown_tolerance
     config.use_source_ampapi = no_amp
     config.use_source_nwis = no_nwis
     config.use_source_st2 = no_st2
@@ -245,6 +441,14 @@ def analytes(
     config.use_source_dwb = no_dwb
     config.start_date = start_date
     config.end_date = end_date
+    config.use_cache = cache
+    config.cache_refresh = refresh
+    config.max_workers = workers
+    config.use_async = use_async
+    config.use_columnar = columnar
+    config.set_output_format(output_format)
+    config.use_streaming = stream
+    config.use_consolidated_timeseries = consolidate
 
     if not dry:
         config.report()
@@ -255,6 +459,32 @@ def analytes(
     unify_analytes(config)
 
 
+@cli.command("build-boundaries")
+@click.option(
+    "--output",
+    default=BOUNDARY_STORE_PATH,
+    show_default=True,
+    help="Path of the boundary store",
+)
+@click.option(
+    "--state",
+    "states",
+    multiple=True,
+    default=BOUNDARY_STATES,
+    show_default=True,
+    help="Two letter abbreviation of a state to include. Repeat for more states",
+)
+def build_boundaries(output, states):
+    """
+    Download county and state boundaries into the boundary store used to resolve
+    --county offline
+    """
+    from backend.boundaries import build_boundary_store
+
+    store = build_boundary_store(output, states)
+    click.echo(f"Saved {len(store.features)} boundaries to {output}")
+
+
 def setup_config(tag, timeseries, bbox, county, site_limit, dry):
     config = Config()
     if county:
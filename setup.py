@@ -31,7 +31,20 @@ setup(
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
     ],
-    install_requires=["click", "httpx", "geopandas", "frost_sta_client"],
+    install_requires=[
+        "click",
+        "httpx",
+        "numpy",
+        "pyproj",
+        "shapely>=2",
+        "frost_sta_client",
+    ],
+    extras_require={
+        "http2": ["httpx[http2]"],
+        "parquet": ["pyarrow"],
+        "columnar": ["pandas"],
+        "gdal": ["geopandas"],
+    },
     entry_points={
         "console_scripts": [
             "weave = frontend.cli:cli",
@@ -41,11 +54,8 @@ setup(
     + [f"backend.{p}" for p in find_packages("backend")],
     python_requires=">=3.6",
     include_package_data=True,
-    # package_data={
-    # If any package contains *.txt or *.rst files, include them:
-    #     "templates": [
-    #         "*.template",
-    #     ],
-    # },
+    # the boundary store, built with weave build-boundaries before a release is
+    # packaged, see .github/workflows/publish-to-pypi.yml
+    package_data={"backend": ["data/*.bin"]},
 )
 # ============= EOF =============================================
@@ -0,0 +1,65 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import csv
+import io
+
+from backend.batch import RecordBatch
+from backend.constants import DTW
+from backend.persister import write_rows
+from backend.record import WaterLevelRecord, SiteRecord
+
+
+def _batch():
+    return RecordBatch.from_dicts(
+        WaterLevelRecord,
+        [
+            {DTW: 2.345, "date_measured": "2021-01-01", "time_measured": ""},
+            {DTW: 1.0, "date_measured": "2020-01-01", "time_measured": "10:00:00"},
+        ],
+    )
+
+
+def test_batch_rows_match_records():
+    batch = _batch()
+    assert len(batch) == 2
+    assert [list(r) for r in batch.rows()] == [r.to_row() for r in batch]
+
+
+def test_batch_sort_and_filter():
+    batch = _batch().sort("date_measured")
+    assert batch.column("date_measured") == ["2020-01-01", "2021-01-01"]
+    assert len(batch.filter([False, True])) == 1
+
+
+def test_batch_extras():
+    batch = RecordBatch.from_dicts(
+        SiteRecord, [{"id": "A", "catalogItems": [1]}, {"id": "B"}]
+    )
+    assert batch[0].catalogItems == [1]
+    assert batch.values("elevation_units") == ["ft", "ft"]
+    batch.set_values("well_depth_units", ["m", "ft"])
+    assert batch[0].well_depth_units == "m"
+
+
+def test_write_rows_batch():
+    f = io.StringIO()
+    write_rows(csv.writer(f), _batch())
+    rows = list(csv.reader(io.StringIO(f.getvalue())))
+    assert rows[0] == list(WaterLevelRecord.keys)
+    assert rows[1] == ["2.35", "2021-01-01", ""]
+
+
+# ============= EOF =============================================
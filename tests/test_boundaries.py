@@ -0,0 +1,63 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+from shapely import MultiPolygon, box
+
+from backend import boundaries
+from backend.boundaries import BoundaryStore
+
+
+def _store():
+    features = [
+        {"kind": "state", "state": "NM", "statefp": "35", "name": "New Mexico"},
+        {"kind": "county", "state": "NM", "statefp": "35", "name": "Eddy"},
+        {"kind": "county", "state": "NM", "statefp": "35", "name": "Lea"},
+    ]
+    geometries = [
+        box(0, 0, 20, 10),
+        MultiPolygon([box(0, 0, 5, 10), box(6, 0, 10, 10)]),
+        box(10, 0, 20, 10),
+    ]
+    return BoundaryStore(features, geometries, {"states": ["NM"]})
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / "boundaries.bin")
+    _store().save(path)
+
+    store = BoundaryStore.load(path)
+    assert store.meta["states"] == ["NM"]
+    assert store.statefp("nm") == "35"
+    assert store.county_names() == ["Eddy", "Lea"]
+
+    eddy = store.get_county("eddy")
+    assert eddy.geom_type == "MultiPolygon"
+    assert eddy.equals(_store().geometries[1])
+    assert store.get_county("eddy", "TX") is None
+
+
+def test_missing_store_warns_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(boundaries, "BOUNDARY_STORE_PATH", str(tmp_path / "x.bin"))
+    monkeypatch.setattr(boundaries, "_store", None)
+    monkeypatch.setattr(boundaries, "_warned_missing", False)
+
+    assert boundaries.get_boundary_store() is None
+    assert boundaries.get_boundary_store() is None
+
+    out = capsys.readouterr().out
+    assert out.count("weave build-boundaries") == 1
+
+
+# ============= EOF =============================================
@@ -0,0 +1,134 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import time
+
+import httpx
+
+from backend.cache import ResponseCache, make_key
+from backend.config import Config
+from backend.http_client import ClientPool
+from backend.source import BaseSource
+
+URL = "https://example.com/data"
+
+
+def _response(text, headers=None):
+    return httpx.Response(
+        200,
+        text=text,
+        headers=headers,
+        request=httpx.Request("GET", URL),
+    )
+
+
+def test_make_key_sorts_params():
+    assert make_key(URL, {"a": 1, "b": 2}) == make_key(URL, {"b": 2, "a": 1})
+    assert make_key(URL, {"a": 1}) != make_key(URL, {"a": 2})
+
+
+def test_cache_hit(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    key, resp, headers = cache.lookup(URL, {"a": 1}, ttl=60)
+    assert resp is None
+
+    cache.store(key, _response("hello"))
+    key, resp, headers = cache.lookup(URL, {"a": 1}, ttl=60)
+    assert resp.text == "hello"
+    assert resp.status_code == 200
+
+
+def test_cache_stale_revalidate(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    key, _, _ = cache.lookup(URL)
+    cache.store(key, _response("hello", headers={"ETag": '"abc"'}))
+
+    time.sleep(0.01)
+    key, resp, headers = cache.lookup(URL, ttl=0)
+    assert resp is None
+    assert headers == {"If-None-Match": '"abc"'}
+
+    resp = cache.revalidated(key)
+    assert resp.text == "hello"
+
+
+def test_cache_refresh(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    key, _, _ = cache.lookup(URL)
+    cache.store(key, _response("hello"))
+
+    cache = ResponseCache(root=str(tmp_path), refresh=True)
+    _, resp, _ = cache.lookup(URL)
+    assert resp is None
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = ResponseCache(root=str(tmp_path), max_size=25)
+    for i in range(3):
+        key, _, _ = cache.lookup(URL, {"i": i})
+        cache.store(key, _response("x" * 10))
+        time.sleep(0.01)
+
+    assert cache.lookup(URL, {"i": 0})[1] is None
+    assert cache.lookup(URL, {"i": 2})[1] is not None
+
+
+class EvictingHandler:
+    """
+    Answers a conditional request with 304 after the cache entry has been evicted
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.requests = []
+
+    def __call__(self, request):
+        conditional = "if-none-match" in request.headers
+        self.requests.append(conditional)
+        if conditional:
+            self.cache.clear()
+            return httpx.Response(304)
+        return httpx.Response(200, text="fresh", headers={"ETag": '"abc"'})
+
+
+def test_not_modified_without_entry(tmp_path):
+    config = Config()
+    config.use_cache = True
+    config.cache_dir = str(tmp_path)
+    cache = config.get_response_cache()
+    handler = EvictingHandler(cache)
+    config._client_pool = ClientPool(transport=httpx.MockTransport(handler))
+
+    source = BaseSource()
+    source.set_config(config)
+    source.cache_ttl = 0
+
+    key, _, _ = cache.lookup(URL)
+    cache.store(key, _response("stale", headers={"ETag": '"abc"'}))
+    time.sleep(0.01)
+
+    assert source._execute_text_request(URL) == "fresh"
+    assert handler.requests == [True, False]
+    assert cache.lookup(URL, ttl=60)[1].text == "fresh"
+
+    # streamed requests refetch the same way
+    handler.requests = []
+    time.sleep(0.01)
+    assert list(source._execute_lines_request(URL)) == ["fresh"]
+    assert handler.requests == [True, False]
+    config.close_client_pool()
+
+
+# ============= EOF =============================================
@@ -14,9 +14,10 @@
 # limitations under the License.
 # ===============================================================================
 import os
+import sys
 
 from click.testing import CliRunner
-from frontend.cli import analytes, waterlevels
+from frontend.cli import ImportTimer, analytes, cli, waterlevels
 
 
 def _tester(function, args, fail=False):
@@ -405,4 +406,25 @@ def test_waterlevels_invalid_end():
 
 
 # ====== End Water Level Tests =======================================================
+
+
+def test_import_timer():
+    sys.modules.pop("colorsys", None)
+    timer = ImportTimer(("colorsys", "click"))
+    assert timer.preloaded == ["click"]
+
+    timer.install()
+    try:
+        import colorsys  # noqa: F401
+    finally:
+        timer.uninstall()
+    assert list(timer.timings) == ["colorsys"]
+
+
+def test_timings():
+    result = CliRunner().invoke(cli, ["--timings", "waterlevels", "--dry"])
+    assert result.exit_code == 0
+    assert "weave startup" in result.output
+
+
 # ============= EOF =============================================
@@ -0,0 +1,156 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import gzip
+import os
+
+from backend.constants import DTW
+from backend.config import Config
+from backend.persister import (
+    CloudStoragePersister,
+    GZIP_SITE_INDEX_KEYS,
+    StreamingCloudStoragePersister,
+    read_site_timeseries,
+    read_sites_index,
+)
+from backend.record import SiteRecord, SummaryRecord, WaterLevelRecord
+from backend.unifier import _perister_factory
+
+
+def _timeseries(n):
+    return [
+        (
+            SiteRecord({"source": "A", "id": f"s{i}"}),
+            [
+                WaterLevelRecord({DTW: float(j), "date_measured": f"202{j}-01-01"})
+                for j in range(2)
+            ],
+        )
+        for i in range(n)
+    ]
+
+
+def test_save(tmp_path):
+    persister = CloudStoragePersister(f"file://{tmp_path}")
+    persister.load([SummaryRecord({"id": "A", "mean": 1.5})])
+    persister.save("output")
+
+    with open(tmp_path / "output.csv") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("source,id")
+
+
+def test_timeseries(tmp_path):
+    persister = CloudStoragePersister(f"file://{tmp_path}")
+    persister.timeseries = _timeseries(3)
+    persister.dump_timeseries("output_timeseries")
+    assert sorted(os.listdir(tmp_path / "output_timeseries")) == [
+        "s0.csv",
+        "s1.csv",
+        "s2.csv",
+        "sites.csv",
+    ]
+
+
+def test_consolidated_composite(tmp_path):
+    persister = CloudStoragePersister(f"file://{tmp_path}")
+    persister.consolidate_timeseries = True
+    # more than 32 parts, so the parts are composed in stages
+    persister.sites_per_part = 1
+    persister.timeseries = _timeseries(40)
+    persister.dump_timeseries("output_timeseries")
+
+    root = str(tmp_path / "output_timeseries")
+    assert sorted(os.listdir(root)) == ["sites.csv", "timeseries.csv"]
+    rows = read_site_timeseries(root, "s37")
+    assert [r["id"] for r in rows] == ["s37", "s37"]
+    assert rows[1][DTW] == "1.0"
+
+
+def test_gzip(tmp_path):
+    persister = CloudStoragePersister(f"file://{tmp_path}", gzip=True)
+    persister.consolidate_timeseries = True
+    persister.sites_per_part = 2
+    persister.timeseries = _timeseries(5)
+    persister.dump_timeseries("output_timeseries")
+
+    with gzip.open(tmp_path / "output_timeseries" / "timeseries.csv", "rt") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 11
+    assert lines[0].startswith("id,")
+
+    with gzip.open(tmp_path / "output_timeseries" / "sites.csv", "rt") as f:
+        header = f.readline().strip().split(",")
+    assert tuple(header[-3:]) == GZIP_SITE_INDEX_KEYS
+
+
+def test_streaming_save(tmp_path):
+    persister = StreamingCloudStoragePersister("output", f"file://{tmp_path}")
+    for i in range(3):
+        persister.load([SummaryRecord({"id": f"A{i}", "mean": 1.5})])
+        persister.flush()
+        # nothing is held between chunks
+        assert persister.records == []
+    persister.save("output")
+
+    with open(tmp_path / "output.csv") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 4
+
+
+def test_streaming_timeseries(tmp_path):
+    persister = StreamingCloudStoragePersister("output", f"file://{tmp_path}")
+    for site, records in _timeseries(3):
+        persister.add_timeseries(site, records)
+        persister.flush()
+    assert persister.timeseries == []
+    persister.dump_timeseries("output_timeseries")
+
+    assert sorted(os.listdir(tmp_path / "output_timeseries")) == [
+        "s0.csv",
+        "s1.csv",
+        "s2.csv",
+        "sites.csv",
+    ]
+
+
+def test_streaming_consolidated(tmp_path):
+    persister = StreamingCloudStoragePersister("output", f"file://{tmp_path}")
+    persister.consolidate_timeseries = True
+    for site, records in _timeseries(5):
+        persister.add_timeseries(site, records)
+        persister.flush()
+    persister.dump_timeseries("output_timeseries")
+
+    root = str(tmp_path / "output_timeseries")
+    assert sorted(os.listdir(root)) == ["sites.csv", "timeseries.csv"]
+    index = read_sites_index(root)
+    assert index["s3"][2] == 2
+    rows = read_site_timeseries(root, "s3", index)
+    assert [r["id"] for r in rows] == ["s3", "s3"]
+
+
+def test_streaming_factory(tmp_path):
+    config = Config()
+    config.use_cloud_storage = True
+    config.cloud_storage_url = f"file://{tmp_path}"
+    config.use_streaming = True
+    persister = _perister_factory(config)
+    assert isinstance(persister, StreamingCloudStoragePersister)
+    assert persister.url == config.cloud_storage_url
+
+
+# ============= EOF =============================================
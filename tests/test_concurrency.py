@@ -0,0 +1,238 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+from backend.config import Config
+from backend.http_client import AsyncClientPool, ClientPool
+from backend.source import BaseSource
+from backend.unifier import _site_wrapper, _site_wrapper_async, _unify_sources_async
+
+NSITES = 8
+
+
+class FakeSiteSource(BaseSource):
+    def __init__(self, nsites=NSITES, fail=False):
+        super().__init__()
+        self.nsites = nsites
+        self.fail = fail
+
+    def read_sites(self):
+        if self.fail:
+            raise ValueError("no sites")
+        return list(range(self.nsites))
+
+    async def read_sites_async(self):
+        return self.read_sites()
+
+    def chunks(self, sites):
+        return [[s] for s in sites]
+
+
+class FakeParameterSource(BaseSource):
+    """
+    Returns [host, site] for each chunk. Chunks in fail raise
+    """
+
+    def __init__(self, host, fail=()):
+        super().__init__()
+        self.url = f"https://{host}/chunk"
+        self.fail = fail
+
+    def load(self, chunk, use_summarize):
+        if chunk[0] in self.fail:
+            raise ValueError(f"failed chunk {chunk[0]}")
+        return self._execute_json_request(self.url, params={"site": chunk[0]})
+
+    async def load_async(self, chunk, use_summarize):
+        if chunk[0] in self.fail:
+            raise ValueError(f"failed chunk {chunk[0]}")
+        return await self._execute_json_request_async(
+            self.url, params={"site": chunk[0]}
+        )
+
+
+class AsyncHandler:
+    """
+    MockTransport handler that answers later sites sooner, so completion order is
+    the reverse of chunk order, and records the requests in flight
+    """
+
+    def __init__(self):
+        self.in_flight = Counter()
+        self.max_in_flight = Counter()
+        self.max_total = 0
+
+    async def __call__(self, request):
+        host = request.url.host
+        site = int(request.url.params["site"])
+        self.in_flight[host] += 1
+        self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        self.max_total = max(self.max_total, sum(self.in_flight.values()))
+        try:
+            await asyncio.sleep(0.002 * (NSITES - site))
+        finally:
+            self.in_flight[host] -= 1
+        return httpx.Response(200, json={"data": [host, site]})
+
+
+class ThreadedHandler:
+    """
+    Synchronous counterpart of AsyncHandler
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sites = []
+
+    def __call__(self, request):
+        site = int(request.url.params["site"])
+        with self.lock:
+            self.sites.append(site)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.005 * (NSITES - site))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return httpx.Response(200, json={"data": [request.url.host, site]})
+
+
+class RecordingPersister:
+    def __init__(self):
+        self.records = []
+
+    def load(self, records):
+        self.records.append(records)
+
+    def flush(self):
+        pass
+
+
+def _async_config(handler, **kw):
+    config = Config()
+    config.output_summary = True
+    config._async_client_pool = AsyncClientPool(transport=httpx.MockTransport(handler))
+    for k, v in kw.items():
+        setattr(config, k, v)
+    return config
+
+
+def _sources(config, hosts, **kw):
+    sources = []
+    for host in hosts:
+        site_source = FakeSiteSource()
+        parameter_source = FakeParameterSource(host, **kw)
+        site_source.set_config(config)
+        parameter_source.set_config(config)
+        sources.append((site_source, parameter_source))
+    return sources
+
+
+def test_async_results_in_chunk_order():
+    handler = AsyncHandler()
+    config = _async_config(handler)
+    ((site_source, parameter_source),) = _sources(config, ["a.example.com"])
+
+    async def run():
+        semaphore = asyncio.Semaphore(config.max_concurrent_requests)
+        return await _site_wrapper_async(
+            site_source, parameter_source, config, semaphore
+        )
+
+    results = asyncio.run(run())
+    assert results == [["a.example.com", i] for i in range(NSITES)]
+
+
+def test_async_semaphore_limits():
+    handler = AsyncHandler()
+    config = _async_config(
+        handler, max_concurrent_requests=3, max_concurrent_requests_per_source=2
+    )
+    hosts = ["a.example.com", "b.example.com"]
+    persister = RecordingPersister()
+
+    asyncio.run(_unify_sources_async(config, _sources(config, hosts), persister))
+
+    assert max(handler.max_in_flight.values()) == 2
+    assert handler.max_total == 3
+    # merged in source order, then chunk order
+    assert persister.records == [[h, i] for h in hosts for i in range(NSITES)]
+    # the pool is closed when the run ends
+    assert config._async_client_pool is None
+
+
+def test_async_failures_are_isolated():
+    handler = AsyncHandler()
+    config = _async_config(handler)
+    sources = _sources(config, ["a.example.com"], fail=(3,))
+    broken = FakeSiteSource(fail=True)
+    broken.set_config(config)
+    sources.append((broken, sources[0][1]))
+
+    async def run():
+        semaphore = asyncio.Semaphore(config.max_concurrent_requests)
+        return await asyncio.gather(
+            *[_site_wrapper_async(s, p, config, semaphore) for s, p in sources]
+        )
+
+    ok, failed = asyncio.run(run())
+    # the failed chunk does not cancel the others
+    assert ok[3] is None
+    assert [r for r in ok if r is not None] == [
+        ["a.example.com", i] for i in range(NSITES) if i != 3
+    ]
+    assert failed == []
+
+
+def _run_threaded(max_workers, site_limit=None):
+    handler = ThreadedHandler()
+    config = Config()
+    config.output_summary = True
+    config.max_workers = max_workers
+    config.site_limit = site_limit
+    config._client_pool = ClientPool(transport=httpx.MockTransport(handler))
+    ((site_source, parameter_source),) = _sources(config, ["a.example.com"])
+
+    persister = RecordingPersister()
+    _site_wrapper(site_source, parameter_source, persister, config)
+    config.close_client_pool()
+    return handler, persister.records
+
+
+def test_threaded_results_in_chunk_order():
+    handler, records = _run_threaded(4)
+    assert handler.max_in_flight > 1
+    assert records == [["a.example.com", i] for i in range(NSITES)]
+    assert records == _run_threaded(1)[1]
+
+
+def test_threaded_site_limit():
+    # site_limit counts chunks from 0, as the serial loop always has
+    handler, records = _run_threaded(4, site_limit=2)
+    assert sorted(handler.sites) == [0, 1, 2]
+    assert records == _run_threaded(1, site_limit=2)[1]
+    assert len(records) == 3
+
+
+# ============= EOF =============================================
@@ -0,0 +1,113 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.transformer import DatetimeParser, standardize_datetime
+
+
+@pytest.mark.parametrize(
+    "dt,expected",
+    [
+        ("2020-01-02", ("2020-01-02", "")),
+        ("2020/01/02", ("2020-01-02", "")),
+        ("2020-01", ("2020-01", "")),
+        ("2020-01-02T10:11:12", ("2020-01-02", "10:11:12")),
+        ("2020-01-02T10:11:12.000Z", ("2020-01-02", "10:11:12")),
+        ("2020-01-02T10:11:12Z", ("2020-01-02", "10:11:12")),
+        ("2020-01-02T10:11:12+00:00", ("2020-01-02", "10:11:12")),
+        ("2020-01-02T10:11:12.250-07:00", ("2020-01-02", "10:11:12")),
+        ("2020-01-02 10:11:12-0700", ("2020-01-02", "10:11:12")),
+        ("2020-01-02 00:00:00", ("2020-01-02", "")),
+        ("2020-01-02 10:11", ("2020-01-02", "10:11:00")),
+        ("2020/01/02 10:11", ("2020-01-02", "10:11:00")),
+        (("2020-01-02", "10:11"), ("2020-01-02", "10:11:00")),
+        (("2020-01-02", None), ("2020-01-02", "")),
+        (datetime(2020, 1, 2, 3, 4, 5), ("2020-01-02", "03:04:05")),
+        (1577934245000, ("2020-01-02", "03:04:05")),
+    ],
+)
+def test_standardize_datetime(dt, expected):
+    assert standardize_datetime(dt) == expected
+
+
+def test_standardize_datetime_invalid():
+    with pytest.raises(ValueError):
+        standardize_datetime("2020-13-45")
+    with pytest.raises(ValueError):
+        standardize_datetime("not a date")
+
+
+def test_parser_learns_format():
+    parser = DatetimeParser()
+    assert parser.parse("2020/01/02 10:11")[1] == "%Y/%m/%d %H:%M"
+    assert parser._fmt == "%Y/%m/%d %H:%M"
+    # a different shape still parses
+    assert parser.parse("2020-01")[1] == "%Y-%m"
+
+
+def test_parser_memo_is_bounded():
+    parser = DatetimeParser(memo_size=2)
+    for d in ("2020-01-01", "2020-01-02", "2020-01-03"):
+        parser.parse(d)
+    assert list(parser._memo) == ["2020-01-02", "2020-01-03"]
+
+
+def test_parser_threads():
+    # a small memo and frequent thread switches make evictions race inserts
+    parser = DatetimeParser(memo_size=16)
+    start = datetime(2000, 1, 1)
+    days = [(start + timedelta(days=i)).strftime("%Y/%m/%d") for i in range(2000)]
+    offsets = range(0, 800, 100)
+
+    def work(offset):
+        return [parser.standardize(d) for d in days[offset:] + days[:offset]]
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        # the race is timing dependent. a few rounds make it near certain to show
+        for _ in range(3):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(work, offsets))
+    finally:
+        sys.setswitchinterval(interval)
+
+    for offset, result in zip(offsets, results):
+        expected = [(d.replace("/", "-"), "") for d in days[offset:] + days[:offset]]
+        assert result == expected
+    assert len(parser._memo) <= 16
+
+
+def test_parser_memo_is_locked():
+    parser = DatetimeParser()
+    with parser._lock:
+        thread = threading.Thread(target=parser.parse, args=("2020-01-01",))
+        thread.start()
+        thread.join(0.05)
+        # waiting for the memo
+        assert thread.is_alive()
+        assert parser._memo == {}
+
+    thread.join()
+    assert "2020-01-01" in parser._memo
+
+
+# ============= EOF =============================================
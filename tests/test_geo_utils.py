@@ -0,0 +1,206 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import pytest
+
+from backend.config import Config
+from backend.connectors.isc_seven_rivers.transformer import (
+    ISCSevenRiversSiteTransformer,
+)
+from backend.geo_utils import (
+    datum_transform_batch,
+    normalize_datum,
+    AreaOfInterest,
+    SpatialFilter,
+)
+from backend.transformer import transform_horizontal_datum
+from frontend.cli import setup_config
+
+
+def test_normalize_datum():
+    assert normalize_datum("NAD27") == "EPSG:4267"
+    assert normalize_datum("epsg:4269") == "EPSG:4269"
+    assert normalize_datum("UNKWN") is None
+    assert normalize_datum(None) is None
+
+
+def test_datum_transform_batch():
+    xs, ys, datums = datum_transform_batch(
+        [-106.0, -105.0, -104.0, -103.0],
+        [35.0, 34.0, 33.0, 32.0],
+        ["NAD27", "WGS84", "UNKWN", None],
+        "WGS84",
+    )
+    # NAD27 moves by a few tens of meters, longitude stays longitude
+    assert xs[0] == pytest.approx(-106.0, abs=0.01) and xs[0] != -106.0
+    assert ys[0] == pytest.approx(35.0, abs=0.01)
+    assert xs[1:] == [-105.0, -104.0, -103.0]
+    assert datums == ["WGS84", "WGS84", "UNKWN", "WGS84"]
+
+
+def test_transform_horizontal_datum_order():
+    lng, lat, datum = transform_horizontal_datum(-106.0, 35.0, "NAD27", "WGS84")
+    assert lng == pytest.approx(-106.0, abs=0.01)
+    assert lat == pytest.approx(35.0, abs=0.01)
+    assert datum == "WGS84"
+
+
+SQUARE = "POLYGON((0 0,0 10,10 10,10 0,0 0))"
+
+
+def test_spatial_filter():
+    sf = SpatialFilter(SQUARE)
+    assert sf.contains(5, 5)
+    assert not sf.contains(15, 5)
+    assert sf.contains_xy([5, 15, 1, -1], [5, 5, 9, 9]).tolist() == [
+        True,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_site_transformer_batch_filter():
+    config = Config()
+    config.wkt = SQUARE
+    transformer = ISCSevenRiversSiteTransformer()
+    transformer.config = config
+
+    records = [
+        {
+            "id": i,
+            "name": str(i),
+            "latitude": lat,
+            "longitude": lng,
+            "groundSurfaceElevationFeet": 1,
+        }
+        for i, (lng, lat) in enumerate([(5, 5), (20, 5), (1, 1)])
+    ]
+    batch = transformer.do_transform_batch(records)
+    assert batch.column("id") == [0, 2]
+    assert transformer.do_transform(records[1]) is None
+
+
+class PartialSiteTransformer(ISCSevenRiversSiteTransformer):
+    def _get_lnglat(self, record):
+        if record.get("latitude") is not None:
+            return super()._get_lnglat(record)
+
+
+def test_filter_contained_mixed_batch():
+    config = Config()
+    config.wkt = SQUARE
+    transformer = PartialSiteTransformer()
+    transformer.config = config
+
+    records = [
+        {"id": 0, "longitude": 5, "latitude": 5},
+        {"id": 1, "longitude": 20, "latitude": 5},
+        {"id": 2},
+        {"id": 3, "longitude": -1, "latitude": 1},
+    ]
+    # one record without coordinates must not let the others through unfiltered
+    kept = transformer._filter_contained(records)
+    assert [r["id"] for r in kept] == [0, 2]
+    assert [r["id"] for r in records if transformer._is_contained(r)] == [0, 2]
+
+
+def test_area_of_interest():
+    area = AreaOfInterest(SQUARE)
+    assert area.bounds == (0, 0, 10, 10)
+    assert area.contains(5, 5)
+    assert area.simplified() is area.simplified()
+    with pytest.raises(AttributeError):
+        area.wkt = ""
+
+
+def test_area_pushdown():
+    # a square with a jagged edge of many vertices
+    n = 400
+    edge = ",".join(f"{10 + (i % 2) * 0.001} {10 * i / n}" for i in range(n + 1))
+    area = AreaOfInterest(f"POLYGON((0 0,{edge},0 10,0 0))")
+
+    pushdown = area.pushdown(0.01)
+    assert pushdown is area.pushdown(0.01)
+    assert pushdown.covers(area.geometry)
+    assert len(pushdown.exterior.coords) < 10
+    assert len(area.pushdown_wkt(0.01)) < len(area.wkt) / 10
+    assert 0 < area.false_positive_rate(0.01) < 0.01
+
+    assert area.pushdown_wkt(0) == area.wkt
+    assert area.false_positive_rate(0) == 0
+
+    # nothing to gain from simplifying a square
+    square = AreaOfInterest(SQUARE)
+    assert square.pushdown_wkt(0.01) == SQUARE
+    assert square.false_positive_rate(0.01) == 0
+
+
+def test_config_pushdown_wkt():
+    config = Config()
+    assert config.pushdown_wkt() is None
+
+    config.wkt = SQUARE
+    assert config.pushdown_wkt() == SQUARE
+    config.pushdown_tolerance = 0
+    assert config.pushdown_wkt() == SQUARE
+
+
+def test_spatial_filter_cli_bbox():
+    # the cli passes --bbox through as a string
+    config = setup_config(
+        "waterlevels", False, "-106.5 32.5, -106.0 33.0", "", None, True
+    )
+    sf = config.get_spatial_filter()
+    assert sf.contains(-106.25, 32.75)
+    assert not sf.contains(-105.5, 32.75)
+
+
+def test_config_area_memoised():
+    config = Config()
+    config.bbox = "-106.5 32.5, -106.0 33.0"
+    area = config.get_area()
+    assert config.get_area() is area
+    assert config.bbox_bounding_points() == (-106.5, 32.5, -106.0, 33.0)
+    assert config.get_spatial_filter() is area.filter
+    assert config.bounding_wkt() == area.wkt
+
+    config.bbox = {"minLng": 0, "maxLng": 10, "minLat": 0, "maxLat": 10}
+    assert config.get_area() is not area
+    assert config.bbox_bounding_points() == (0, 0, 10, 10)
+
+    config.wkt = SQUARE
+    assert config.bounding_wkt() == SQUARE
+
+
+def test_config_validate_county_with_bbox(monkeypatch):
+    counties = {"eddy": SQUARE}
+    monkeypatch.setattr(
+        "backend.config.get_county_polygon",
+        lambda name, as_wkt=True: counties.get(name.lower()),
+    )
+
+    config = Config()
+    config.bbox = "-106.5 32.5, -106.0 33.0"
+    config.county = "notacounty"
+    # bbox takes precedence for the area, but the county is still checked
+    assert config.get_area() is not None
+    assert not config._validate_county()
+
+    config.county = "eddy"
+    assert config._validate_county()
+
+
+# ============= EOF =============================================
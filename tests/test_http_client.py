@@ -0,0 +1,85 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import asyncio
+
+import httpx
+
+from backend.config import Config
+from backend.http_client import AsyncClientPool, ClientPool, get_host
+
+
+def _transport(requests):
+    def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(200, json={"host": request.url.host})
+
+    return httpx.MockTransport(handler)
+
+
+def test_get_host():
+    assert get_host("https://example.com/a/b?c=1") == "https://example.com"
+    assert get_host("http://localhost:8000/a") == "http://localhost:8000"
+
+
+def test_client_reused_per_host():
+    requests = []
+    pool = ClientPool(transport=_transport(requests))
+
+    a = pool.get_client("https://a.example.com/one")
+    assert pool.get_client("https://a.example.com/two") is a
+    b = pool.get_client("https://b.example.com/one")
+    assert b is not a
+
+    resp = pool.get("https://a.example.com/one", params={"x": 1})
+    assert resp.json() == {"host": "a.example.com"}
+    assert pool.get("https://b.example.com/one").json() == {"host": "b.example.com"}
+    assert requests == ["https://a.example.com/one?x=1", "https://b.example.com/one"]
+    pool.close()
+
+
+def test_close_client_pool():
+    config = Config()
+    pool = config._client_pool = ClientPool(transport=_transport([]))
+    client = pool.get_client("https://a.example.com")
+    assert config.get_client_pool() is pool
+
+    config.close_client_pool()
+    assert client.is_closed
+    assert pool._clients == {}
+    assert config._client_pool is None
+    assert config.get_client_pool() is not pool
+    config.close_client_pool()
+
+
+def test_async_client_reused_per_host():
+    requests = []
+    pool = AsyncClientPool(transport=_transport(requests))
+
+    async def run():
+        a = pool.get_client("https://a.example.com/one")
+        assert pool.get_client("https://a.example.com/two") is a
+        resp = await pool.get("https://a.example.com/one")
+        assert resp.json() == {"host": "a.example.com"}
+        await pool.aclose()
+        return a
+
+    client = asyncio.run(run())
+    assert client.is_closed
+    assert pool._clients == {}
+    assert requests == ["https://a.example.com/one"]
+
+
+# ============= EOF =============================================
@@ -0,0 +1,81 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+from backend.connectors.usgs.source import parse_rdb, iter_rdb, parse_rdb_frame
+from backend.connectors.wqp.source import parse_tsv, parse_tsv_frame
+from backend.http_client import LineSplitter
+
+RDB = """# comment
+# another comment
+agency_cd\tsite_no\tlev_dt\tlev_tm\tlev_va
+5s\t15s\t10d\t5d\t12s
+USGS\t001\t2020-01-01\t\t10.5
+USGS\t002\t2021-02-03\t10:30\t11.25
+"""
+
+
+def test_parse_rdb():
+    rows = parse_rdb(RDB)
+    assert len(rows) == 2
+    assert rows[0] == {
+        "agency_cd": "USGS",
+        "site_no": "001",
+        "lev_dt": "2020-01-01",
+        "lev_tm": "",
+        "lev_va": "10.5",
+    }
+
+
+def test_iter_rdb_columns():
+    rows = list(iter_rdb(RDB.split("\n"), columns=("site_no", "lev_va")))
+    assert rows == [
+        {"site_no": "001", "lev_va": "10.5"},
+        {"site_no": "002", "lev_va": "11.25"},
+    ]
+
+
+def test_line_splitter_chunks():
+    data = RDB.encode("utf-8")
+    splitter = LineSplitter()
+    lines = []
+    for i in range(0, len(data), 7):
+        lines.extend(splitter.feed(data[i : i + 7]))
+    lines.extend(splitter.flush())
+    assert lines == RDB.split("\n")[:-1]
+    assert parse_rdb(RDB) == list(iter_rdb(lines))
+
+
+def test_parse_rdb_frame():
+    df = parse_rdb_frame(RDB, columns=("site_no", "lev_dt", "lev_va"))
+    assert list(df.columns) == ["site_no", "lev_dt", "lev_va"]
+    assert df.to_dict("records") == [
+        {k: r[k] for k in df.columns} for r in parse_rdb(RDB)
+    ]
+
+
+TSV = """MonitoringLocationIdentifier\tResultMeasureValue\tActivityStartDate
+A\t1.5\t2020-01-01
+B\t\t2020-01-02
+"""
+
+
+def test_parse_tsv():
+    rows = parse_tsv(TSV)
+    assert len(rows) == 2
+    assert rows[1]["ResultMeasureValue"] == ""
+    assert parse_tsv_frame(TSV).to_dict("records") == rows
+
+
+# ============= EOF =============================================
@@ -0,0 +1,205 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import csv
+import json
+import os
+
+import pytest
+
+from backend.constants import DTW
+from backend.persister import (
+    CSVPersister,
+    StreamingCSVPersister,
+    ParquetPersister,
+    GeoJSONPersister,
+    GeoJSONSeqPersister,
+    read_sites_index,
+    read_site_timeseries,
+)
+from backend.record import WaterLevelRecord, SiteRecord, SummaryRecord
+
+
+def _read(path):
+    with open(path) as f:
+        return list(csv.reader(f))
+
+
+def _summaries():
+    return [
+        SummaryRecord({"id": "A", "nrecords": 2, "mean": 1.5}),
+        SummaryRecord({"id": "B", "nrecords": 1, "mean": 3.0}),
+    ]
+
+
+def test_streaming_save_matches_csv(tmp_path):
+    records = _summaries()
+    expected = tmp_path / "expected"
+    persister = CSVPersister()
+    persister.load(records)
+    persister.save(str(expected))
+
+    output = str(tmp_path / "output")
+    persister = StreamingCSVPersister(output)
+    persister.load(records[:1])
+    persister.flush()
+    persister.load(records[1:])
+    assert os.path.isfile(f"{output}.csv.partial")
+    assert not os.path.isfile(f"{output}.csv")
+
+    persister.save(output)
+    assert not os.path.isfile(f"{output}.csv.partial")
+    assert _read(f"{output}.csv") == _read(f"{expected}.csv")
+
+
+def test_streaming_timeseries(tmp_path):
+    output = str(tmp_path / "output")
+    persister = StreamingCSVPersister(output)
+    site = SiteRecord({"id": "site 1"})
+    records = [
+        WaterLevelRecord({DTW: 1.0, "date_measured": "2020-01-01"}),
+        WaterLevelRecord({DTW: 2.0, "date_measured": "2021-01-01"}),
+    ]
+    persister.add_timeseries(site, records)
+    persister.add_combined(SiteRecord({"id": "site 2"}), records[0])
+
+    persister.dump_combined(f"{output}.combined")
+    persister.dump_timeseries(f"{output}_timeseries")
+
+    root = f"{output}_timeseries"
+    assert sorted(os.listdir(root)) == ["site_1.csv", "sites.csv"]
+    assert len(_read(os.path.join(root, "site_1.csv"))) == 3
+    assert _read(os.path.join(root, "sites.csv"))[1][1] == "site 1"
+    assert len(_read(f"{output}.combined.csv")) == 2
+    assert not os.path.isdir(f"{root}.partial")
+
+
+def test_parquet_timeseries(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    persister = ParquetPersister()
+    for source, sid in (("B", "b1"), ("A", "a1"), ("B", "b2")):
+        site = SiteRecord({"source": source, "id": sid, "latitude": 34.5})
+        records = [
+            WaterLevelRecord({DTW: 1.0, "date_measured": "2020-01-01"}),
+            WaterLevelRecord({DTW: 2.5, "date_measured": "2021-01-01"}),
+        ]
+        persister.add_timeseries(site, records)
+
+    path = str(tmp_path / "output_timeseries")
+    persister.dump_timeseries(path)
+
+    f = pq.ParquetFile(f"{path}.parquet")
+    # one row group per source
+    assert f.metadata.num_row_groups == 2
+
+    table = f.read()
+    assert table.column("source").to_pylist() == ["A", "A", "B", "B", "B", "B"]
+    assert str(table.schema.field("source").type).startswith("dictionary")
+    assert table.schema.field("latitude").type == "double"
+    assert table.schema.field("date_measured").type == "date32[day]"
+    assert table.column(DTW).to_pylist()[:2] == [1.0, 2.5]
+
+
+def _add_sites(persister):
+    for source, sid in (("B", "b1"), ("A", "a 1"), ("B", "b2")):
+        site = SiteRecord({"source": source, "id": sid})
+        records = [
+            WaterLevelRecord({DTW: float(i), "date_measured": f"202{i}-01-01"})
+            for i in range(3)
+        ]
+        persister.add_timeseries(site, records)
+
+
+def test_consolidated_timeseries(tmp_path):
+    output = str(tmp_path / "output")
+    for persister in (CSVPersister(), StreamingCSVPersister(output)):
+        persister.consolidate_timeseries = True
+        _add_sites(persister)
+
+        root = f"{output}_timeseries"
+        persister.dump_timeseries(root)
+        assert sorted(os.listdir(root)) == ["sites.csv", "timeseries.csv"]
+
+        index = read_sites_index(root)
+        assert [v[2] for v in index.values()] == [3, 3, 3]
+
+        rows = read_site_timeseries(root, "a 1", index)
+        assert [r["id"] for r in rows] == ["a 1"] * 3
+        assert [r["date_measured"] for r in rows] == [
+            "2020-01-01",
+            "2021-01-01",
+            "2022-01-01",
+        ]
+        assert read_site_timeseries(root, "missing") == []
+
+
+def test_parquet_read_site(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    persister = ParquetPersister()
+    _add_sites(persister)
+    root = str(tmp_path / "output_timeseries")
+    persister.dump_timeseries(root)
+
+    rows = read_site_timeseries(f"{root}.parquet", "b2")
+    assert len(rows) == 3
+    assert {r["source"] for r in rows} == {"B"}
+
+
+def test_geojson(tmp_path):
+    output = str(tmp_path / "output")
+    persister = GeoJSONPersister()
+    persister.load(
+        [
+            SummaryRecord({"id": "A", "latitude": 34.5, "longitude": -106.5}),
+            SummaryRecord({"id": "B"}),
+        ]
+    )
+    persister.save(output)
+
+    with open(f"{output}.geojson") as f:
+        fc = json.load(f)
+
+    assert fc["type"] == "FeatureCollection"
+    a, b = fc["features"]
+    assert a["geometry"] == {"type": "Point", "coordinates": [-106.5, 34.5]}
+    assert a["properties"]["id"] == "A"
+    assert b["geometry"] is None
+
+
+def test_geojsonseq_timeseries(tmp_path):
+    root = str(tmp_path / "output_timeseries")
+    persister = GeoJSONSeqPersister()
+    persister.consolidate_timeseries = True
+    site = SiteRecord({"id": "A", "latitude": 34.5, "longitude": -106.5})
+    persister.add_timeseries(
+        site,
+        [
+            WaterLevelRecord({DTW: 1.0, "date_measured": "2020-01-01"}),
+            WaterLevelRecord({DTW: 2.0, "date_measured": "2021-01-01"}),
+        ],
+    )
+    persister.dump_timeseries(root)
+
+    with open(os.path.join(root, "timeseries.geojsonl")) as f:
+        features = [json.loads(line) for line in f]
+
+    assert len(features) == 2
+    assert features[1]["geometry"]["coordinates"] == [-106.5, 34.5]
+    assert features[1]["properties"][DTW] == 2.0
+
+
+# ============= EOF =============================================
@@ -0,0 +1,64 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import pytest
+
+from backend.constants import DTW, FEET
+from backend.record import SiteRecord, WaterLevelRecord
+
+
+def test_site_record_defaults_and_rounding():
+    record = SiteRecord(
+        {"id": "A", "latitude": 35.123456789, "longitude": -106.1, "elevation": None}
+    )
+    assert record.id == "A"
+    assert record.elevation_units == FEET
+    assert record.name == ""
+    row = record.to_row()
+    assert row[SiteRecord.keys.index("latitude")] == 35.123457
+    assert row[SiteRecord.keys.index("horizontal_datum")] == "WGS84"
+
+
+def test_site_record_extras():
+    record = SiteRecord({"id": "A", "catalogItems": [1, 2]})
+    record.chunk_size = 10
+    record.update(elevation=10.126)
+    assert record.catalogItems == [1, 2]
+    assert record.chunk_size == 10
+    assert record.elevation == 10.126
+    assert record.to_row()[SiteRecord.keys.index("elevation")] == 10.13
+    assert record.missing is None
+
+
+def test_water_level_record_drops_extras():
+    record = WaterLevelRecord(
+        {DTW: 1.234, "date_measured": "2020-01-01", "lev_va": "1.234"}
+    )
+    assert record.to_row() == [1.23, "2020-01-01", None]
+    assert record.lev_va is None
+    assert not hasattr(record, "__dict__")
+
+
+def test_water_level_record_rejects_unknown_fields():
+    record = WaterLevelRecord({DTW: 1.234})
+    record.date_measured = "2020-01-01"
+    assert record.date_measured == "2020-01-01"
+    with pytest.raises(AttributeError):
+        record.foo = 1
+    with pytest.raises(AttributeError):
+        record.update(lev_va="1.234")
+
+
+# ============= EOF =============================================
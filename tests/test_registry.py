@@ -0,0 +1,55 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import subprocess
+import sys
+
+from backend.config import Config
+from backend.connectors.registry import SOURCE_KEYS, get_entries, load_class
+
+
+def test_entries_load():
+    for kind in ("sites", "waterlevels", "analytes"):
+        for e in get_entries(kind):
+            assert e.key in SOURCE_KEYS
+            assert load_class(e.site)
+            if e.parameter:
+                assert load_class(e.parameter)
+
+
+def test_disabled_sources():
+    config = Config()
+    for key in SOURCE_KEYS:
+        setattr(config, f"use_source_{key}", False)
+    config.use_source_nwis = True
+
+    sources = config.water_level_sources()
+    assert [type(s).__name__ for s, _ in sources] == ["USGSSiteSource"]
+    assert sources[0][1].config is config
+
+
+def test_config_import_is_lazy():
+    code = (
+        "import sys, backend.config;"
+        "print(any(m.startswith(('backend.connectors.usgs', 'shapely', 'pyproj',"
+        " 'frost_sta_client', 'pandas')) for m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "False"
+
+
+# ============= EOF =============================================
@@ -0,0 +1,133 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import asyncio
+
+import httpx
+import pytest
+
+from backend.request_policy import (
+    RequestPolicy,
+    CircuitOpenError,
+    TokenBucket,
+    parse_retry_after,
+)
+
+URL = "https://example.com/data"
+
+
+def _client(statuses):
+    statuses = list(statuses)
+
+    def handler(request):
+        status = statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, headers={"Retry-After": "0"})
+
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def _policy(**kw):
+    return RequestPolicy(rate_limits={}, backoff_factor=0, **kw)
+
+
+def test_retry_then_success():
+    client = _client([503, 502, 200])
+    resp = _policy().execute(URL, lambda: client.get(URL))
+    assert resp.status_code == 200
+
+
+def test_retry_exhausted_returns_last_response():
+    client = _client([500] * 4)
+    resp = _policy(max_retries=3).execute(URL, lambda: client.get(URL))
+    assert resp.status_code == 500
+
+
+def test_retry_transport_error():
+    client = _client([httpx.ConnectError("boom"), 200])
+    resp = _policy().execute(URL, lambda: client.get(URL))
+    assert resp.status_code == 200
+
+
+def test_circuit_opens():
+    policy = _policy(max_retries=0, failure_threshold=2, reset_timeout=60)
+    client = _client([503, 503, 200])
+    policy.execute(URL, lambda: client.get(URL))
+    policy.execute(URL, lambda: client.get(URL))
+    with pytest.raises(CircuitOpenError):
+        policy.execute(URL, lambda: client.get(URL))
+
+
+def _open_policy():
+    # one failure opens the circuit and the next request is its trial
+    policy = _policy(max_retries=0, failure_threshold=1, reset_timeout=0)
+    client = _client([503])
+    policy.execute(URL, lambda: client.get(URL))
+    assert policy.get_breaker("example.com").is_open
+    return policy
+
+
+def test_circuit_trial_throttled():
+    policy = _open_policy()
+    client = _client([429, 200])
+    resp = policy.execute(URL, lambda: client.get(URL))
+    assert resp.status_code == 429
+    assert not policy.get_breaker("example.com").is_open
+    assert policy.execute(URL, lambda: client.get(URL)).status_code == 200
+
+
+def test_circuit_trial_error():
+    policy = _open_policy()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        policy.execute(URL, fail)
+
+    # the trial was handed back, so the circuit can still close
+    client = _client([200])
+    assert policy.execute(URL, lambda: client.get(URL)).status_code == 200
+    assert not policy.get_breaker("example.com").is_open
+
+
+def test_circuit_trial_cancelled():
+    policy = _open_policy()
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(policy.execute_async(URL, cancelled))
+
+    client = _client([200])
+    assert policy.execute(URL, lambda: client.get(URL)).status_code == 200
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("") is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() > 0
+
+
+# ============= EOF =============================================
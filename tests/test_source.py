@@ -0,0 +1,177 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import asyncio
+from datetime import date, datetime
+
+import httpx
+
+from backend.config import Config
+from backend.connectors.usgs.source import USGSWaterLevelSource
+from backend.http_client import AsyncClientPool, ClientPool
+from backend.record import SiteRecord
+from backend.source import (
+    RecordStream,
+    datetime_sort_key,
+    group_records,
+    get_most_recent,
+)
+
+
+def test_group_records_dotted_key():
+    records = [
+        {"Well": {"PointID": "A"}, "v": 1},
+        {"Well": {"PointID": "B"}, "v": 2},
+        {"Well": {"PointID": "A"}, "v": 3},
+        {"Well": None, "v": 4},
+        {"v": 5},
+    ]
+    groups = group_records(records, "Well.PointID")
+    assert list(groups) == ["A", "B"]
+    assert [r["v"] for r in groups["A"]] == [1, 3]
+
+
+def test_get_most_recent():
+    records = [{"d": "2020-01-01"}, {"d": "2022-01-01"}, {"d": "2021-01-01"}]
+    assert get_most_recent(records, "d") == {"d": "2022-01-01"}
+
+
+def test_get_most_recent_mixed_formats():
+    records = [{"d": "2021/06/01"}, {"d": "2021-01-01 12:00"}, {"d": "2020-12-31"}]
+    # a plain string sort would pick 2021/01/01
+    assert get_most_recent(records, "d") == {"d": "2021/06/01"}
+
+
+def test_get_most_recent_date_time():
+    records = [
+        {"dt": "2020-01-01", "tm": "10:30"},
+        {"dt": "2020-01-01", "tm": "23:15"},
+        {"dt": "2020-01-01", "tm": None},
+    ]
+    assert get_most_recent(records, ("dt", "tm")) == records[1]
+
+
+def test_get_most_recent_offsets():
+    # BOR attributes.dateTime carries a numeric offset
+    records = [
+        {"attributes": {"dateTime": "2020-01-01T10:00:00+00:00"}},
+        {"attributes": {"dateTime": "2020-01-01T04:00:00-07:00"}},
+        {"attributes": {"dateTime": "2020-01-01T09:00:00Z"}},
+    ]
+    assert get_most_recent(records, "attributes.dateTime") == records[1]
+
+
+def test_datetime_sort_key():
+    assert datetime_sort_key("2020-01-01T10:00:00+00:00") == (
+        datetime(2020, 1, 1, 10),
+        "",
+    )
+    assert datetime_sort_key("2020-01-01T10:00:00.5-0130") == (
+        datetime(2020, 1, 1, 11, 30),
+        "",
+    )
+    assert datetime_sort_key(date(2020, 1, 1)) == (datetime(2020, 1, 1), "")
+    assert datetime_sort_key(object) == (datetime.min, str(object))
+    assert datetime_sort_key("not a date") == (datetime.min, "not a date")
+
+
+def test_get_most_recent_top_k():
+    records = [{"t": 1000}, {"t": 3000}, {"t": 2000}]
+    assert get_most_recent(records, "t", k=2) == [{"t": 3000}, {"t": 2000}]
+
+
+GWLEVELS = """# comment
+agency_cd\tsite_no\tlev_dt\tlev_tm\tlev_va
+5s\t15s\t10d\t5d\t12s
+USGS\t001\t2020-01-01\t\t10.5
+USGS\t001\t2021-02-03\t10:30\t11.5
+USGS\t002\t2019-05-01\t\t
+USGS\t002\t2019-06-01\t\t20
+USGS\t001\t2020-06-01\t\t12.5
+"""
+
+
+def _gwlevels_source(monkeypatch):
+    # one row per block so every record is folded in separately
+    monkeypatch.setattr(RecordStream, "block_size", 1)
+
+    def handler(request):
+        return httpx.Response(200, text=GWLEVELS)
+
+    config = Config()
+    config._client_pool = ClientPool(transport=httpx.MockTransport(handler))
+    config._async_client_pool = AsyncClientPool(transport=httpx.MockTransport(handler))
+    source = USGSWaterLevelSource()
+    source.set_config(config)
+
+    sites = []
+    for sid in ("001", "002", "003"):
+        site = SiteRecord(
+            {
+                "id": sid,
+                "name": sid,
+                "source": "USGS",
+                "latitude": 34,
+                "longitude": -106,
+                "horizontal_datum": "WGS84",
+            }
+        )
+        site.chunk_size = 3
+        sites.append(site)
+    return source, sites
+
+
+def test_streamed_summary(monkeypatch):
+    source, sites = _gwlevels_source(monkeypatch)
+    source.config.output_summary = True
+    assert not isinstance(source.get_records(sites), list)
+
+    for results in (
+        source.load(sites, True),
+        asyncio.run(source.load_async(sites, True)),
+    ):
+        a, b = results
+        assert (a.nrecords, a.min, a.max, a.mean) == (3, 10.5, 12.5, 11.5)
+        assert a.most_recent_value == 11.5
+        assert (b.nrecords, b.most_recent_value) == (1, 20)
+
+
+def test_streamed_timeseries(monkeypatch):
+    source, sites = _gwlevels_source(monkeypatch)
+    (a, batch), (b, _) = source.load(sites, False)
+    assert a is sites[0] and b is sites[1]
+    assert len(batch) == 3
+
+
+def test_columnar_most_recent_mixed_formats(monkeypatch):
+    source, sites = _gwlevels_source(monkeypatch)
+    source.config.output_summary = True
+    source.config.use_columnar = True
+
+    rows = [
+        ("001", "2021-06-01", "12:00", "1"),
+        ("001", "2021/01/01", "", "2"),
+        ("001", "2020-12-31", "", "3"),
+    ]
+    header = "agency_cd\tsite_no\tlev_dt\tlev_tm\tlev_va\n5s\t15s\t10d\t5d\t12s\n"
+    text = header + "".join("USGS\t" + "\t".join(r) + "\n" for r in rows)
+    monkeypatch.setattr(source, "_execute_text_request", lambda *a, **kw: text)
+
+    (summary,) = source.load(sites[:1], True)
+    # a plain string sort would pick 2021/01/01
+    assert summary.most_recent_value == 1
+
+
+# ============= EOF =============================================
@@ -0,0 +1,66 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import statistics
+
+import pytest
+
+from backend.summary import SummaryAccumulator
+
+
+def test_summary_accumulator():
+    values = [3.0, 1.0, 4.0, 1.5, 9.0]
+    acc = SummaryAccumulator()
+    acc.update(values)
+    assert acc.n == 5
+    assert acc.min == 1.0
+    assert acc.max == 9.0
+    assert acc.mean == pytest.approx(statistics.mean(values))
+    assert acc.variance == pytest.approx(statistics.variance(values))
+
+
+def test_summary_accumulator_most_recent():
+    records = [{"d": "2020"}, {"d": "2022"}, {"d": "2021"}, {"d": "2022", "x": 1}]
+    acc = SummaryAccumulator(key=lambda r: r["d"])
+    acc.update(range(4), records)
+    assert acc.most_recent == {"d": "2022", "x": 1}
+
+
+def test_summary_accumulator_merge():
+    a = SummaryAccumulator()
+    a.update([1.0, 2.0, 3.0])
+    b = SummaryAccumulator()
+    b.update([10.0, 20.0])
+    a.merge(b)
+    values = [1.0, 2.0, 3.0, 10.0, 20.0]
+    assert a.n == 5
+    assert (a.min, a.max) == (1.0, 20.0)
+    assert a.mean == pytest.approx(statistics.mean(values))
+    assert a.variance == pytest.approx(statistics.variance(values))
+
+
+def test_summary_accumulator_update_array():
+    values = [3.0, 1.0, 4.0, 1.5, 9.0]
+    a = SummaryAccumulator()
+    a.update(values[:2])
+    a.update_array(values[2:])
+    b = SummaryAccumulator()
+    b.update(values)
+    assert (a.n, a.min, a.max) == (b.n, b.min, b.max)
+    assert a.mean == pytest.approx(b.mean)
+    assert a.variance == pytest.approx(b.variance)
+
+
+# ============= EOF =============================================
@@ -0,0 +1,50 @@
+# ===============================================================================
+# Copyright 2024 Jake Ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import numpy as np
+import pytest
+
+from backend.constants import FEET, METERS, MILLIGRAMS_PER_LITER
+from backend.units import UnitRegistry, convert_units
+
+
+def test_convert_aliases():
+    assert convert_units(10, "feet", METERS) == pytest.approx(3.048)
+    assert convert_units(10, " Ft ", "m") == pytest.approx(3.048)
+    assert convert_units(1, "mg/l", MILLIGRAMS_PER_LITER) == 1
+    assert convert_units(1000, "ug/L", "mg/L") == pytest.approx(1)
+    assert convert_units(1, "tons/ac ft", "mg/L") == pytest.approx(735.47)
+    assert convert_units(2, "ppm", "mg/L") == 2
+
+
+def test_unknown_units_counted():
+    registry = UnitRegistry()
+    assert registry.convert(5, "furlongs", FEET) == 5
+    registry.convert(6, "furlongs", FEET)
+    assert registry.unknown == {("furlongs", FEET): 2}
+    registry.report()
+    assert registry.unknown == {}
+
+
+def test_convert_array():
+    registry = UnitRegistry()
+    values = registry.convert_array(
+        ["1", 2.0, 3, 4], ["ft", "m", "ft", "parsecs"], FEET
+    )
+    np.testing.assert_allclose(values, [1, 2 * 3.28084, 3, 4])
+    assert registry.unknown == {("parsecs", FEET): 1}
+
+
+# ============= EOF =============================================